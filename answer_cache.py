@@ -0,0 +1,89 @@
+import hashlib
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Dict, Any
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Lowercase, drop punctuation and collapse whitespace so near-identical questions share a key"""
+    prompt = re.sub(r"[^\w\s]", " ", prompt.lower())
+    return " ".join(prompt.split())
+
+
+class AnswerCache:
+    """
+    Answer Cache Module
+    Stores complete RAG+LLM answers keyed by normalized prompt, model tier,
+    corpus version and the conversation context folded into retrieval, with
+    a TTL and LRU eviction past max_entries.
+    With a store, answers live in a SQLite table shared by every server process.
+    """
+
+    def __init__(self, ttl: float = 3600.0, max_entries: int = 512, store=None):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.store = store
+        self.entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def make_key(self, prompt: str, model_name: str, corpus_version: str, context: str = "") -> str:
+        raw = f"{model_name}\n{corpus_version}\n{normalize_prompt(prompt)}"
+        if context:
+            raw += f"\n{normalize_prompt(context)}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return the cached answer or None if missing or expired"""
+        if self.store is not None:
+            value = self.store.get(key)
+            with self._lock:
+                if value is None:
+                    self.misses += 1
+                else:
+                    self.hits += 1
+            return value
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self.entries[key]
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: str, value: Dict[str, Any]):
+        if self.store is not None:
+            self.store.put(key, value, ttl=self.ttl)
+            return
+        with self._lock:
+            self.entries[key] = (time.monotonic() + self.ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        if self.store is not None:
+            self.store.clear()
+        with self._lock:
+            self.entries.clear()
+
+    def get_metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": self.store.count() if self.store is not None else len(self.entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
@@ -0,0 +1,209 @@
+"""
+Async serving mode for IBAT.
+
+Chat, listen and TTS run as async endpoints: blocking work (retrieval, the
+microphone, pyttsx3) is moved to worker threads and Ollama is called with an
+async streaming client, so many chats can be in flight on a few threads. If
+the browser disconnects, or the same session asks a new question, the
+in-flight retrieval and Ollama request are cancelled.
+Every other route (frontend files, reports, metrics, uploads) is served by the
+existing Flask app.
+
+Run with:
+    uvicorn asgi_app:app --port 5000
+"""
+import asyncio
+import json
+import base64
+
+from a2wsgi import WSGIMiddleware
+from starlette.applications import Starlette
+from starlette.concurrency import iterate_in_threadpool
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route, Mount
+
+import tracing
+from cancellation import RequestCancelled
+from transcription_service import TranscriptionQueueFull
+from tts_service import NothingToSpeak
+from generation_scheduler import GenerationQueueFull
+from web_client import (app as flask_app, ibat_instance, tts_service, active_requests,
+                        format_response_text, clean_tts_text, tts_settings)
+
+
+class ClientDisconnected(Exception):
+    """Raised when the HTTP client goes away before generation finishes"""
+
+
+async def run_until_disconnect(request, coro, token, poll_interval: float = 0.5):
+    """
+    Await coro, stopping it as soon as the client disconnects or the token is cancelled
+
+    Work running on a thread cannot be interrupted directly, so the token is
+    cancelled as well and the thread stops at its next check.
+    """
+    task = asyncio.ensure_future(coro)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=poll_interval)
+            if done:
+                return task.result()
+            if await request.is_disconnected():
+                token.cancel("client disconnected")
+                task.cancel()
+                raise ClientDisconnected()
+            if token.cancelled:
+                task.cancel()
+                raise RequestCancelled(token.reason)
+    finally:
+        if not task.done():
+            task.cancel()
+
+
+def prepare_traced(user_prompt: str, size: str, token, session_id=None):
+    """Run IBAT.prepare on a worker thread with its own trace"""
+    trace = tracing.start_trace("IBAT.run")
+    try:
+        return ibat_instance.prepare(user_prompt, weight=size, token=token, session_id=session_id), trace
+    finally:
+        tracing.end_trace()
+
+
+def busy_response(error):
+    print(f"Transcription rejected: {error}")
+    retry_after = max(1, int(ibat_instance.transcription_service.estimated_wait()) + 1)
+    return JSONResponse({"error": "Transcription service busy, try again shortly"},
+                        status_code=503, headers={"Retry-After": str(retry_after)})
+
+
+# --- API Routes ---
+async def chat(request):
+    data = await request.json()
+    user_prompt = data.get('message')
+    size = data.get('size', 'medium')
+    session_id = data.get('session_id')
+
+    if not user_prompt:
+        return JSONResponse({"error": "No message provided"}, status_code=400)
+
+    print(f"Received user prompt: {user_prompt}")
+
+    token = active_requests.start(session_id)
+    try:
+        prepared, trace = await run_until_disconnect(
+            request, asyncio.to_thread(prepare_traced, user_prompt, size, token, session_id), token
+        )
+        if prepared["cached"]:
+            response_data = prepared["cached"]
+        else:
+            print("Sending prompt to Ollama...")
+            result = await run_until_disconnect(
+                request,
+                ibat_instance.ollama_client.async_generate(
+                    model_name=prepared["model_name"], prompt=prepared["prompt"], trace=trace, token=token,
+                    context=prepared["context"]
+                ),
+                token
+            )
+            if result is None:
+                token.check()
+            # Post-processing writes the answer cache and session store, which may be SQLite
+            response_data = await asyncio.to_thread(ibat_instance.finish, prepared,
+                                                    result["response"] if result else None,
+                                                    context=result["context"] if result else None)
+        print(f"Generated response: {response_data['response']}")
+    except ClientDisconnected:
+        print("Client disconnected, generation cancelled")
+        return Response(status_code=499)
+    except RequestCancelled as e:
+        print(f"Request stopped: {e.reason}")
+        status = 504 if e.reason == "deadline exceeded" else 409
+        return JSONResponse({"error": f"Request {e.reason}", "reason": e.reason}, status_code=status)
+    except GenerationQueueFull as e:
+        print(f"Generation rejected: {e}")
+        return JSONResponse({"error": "The model is busy, try again shortly"},
+                            status_code=503, headers={"Retry-After": str(int(e.retry_after) + 1)})
+    except Exception as e:
+        print(f"Error during processing: {e}")
+        return JSONResponse({"error": "Internal server error"}, status_code=500)
+    finally:
+        active_requests.finish(session_id, token)
+
+    body = {"response": format_response_text(response_data["response"]), "sources": response_data["sources"],
+            "model": response_data["model"], "downgraded": response_data["model"] != response_data["requested_model"]}
+    if data.get('debug'):
+        body["debug"] = trace.to_dict()
+    return JSONResponse(body)
+
+
+async def listen(request):
+    print("Received request to listen for speech...")
+    if not ibat_instance.voice:
+        return JSONResponse({"error": "Voice input is disabled on this server"}, status_code=501)
+    if ibat_instance.vad is None:
+        return JSONResponse({"error": "Microphone input is not available on this server, "
+                                      "upload audio to /api/transcribe"}, status_code=501)
+    try:
+        transcribed_text = await asyncio.to_thread(ibat_instance.listen_for_speech)
+        if transcribed_text:
+            return JSONResponse({"text": transcribed_text})
+        return JSONResponse({"error": "No speech detected or understood"}, status_code=400)
+    except TranscriptionQueueFull as e:
+        return busy_response(e)
+    except Exception as e:
+        print(f"Error during speech recognition: {e}")
+        return JSONResponse({"error": "Failed to process audio"}, status_code=500)
+
+
+async def tts(request):
+    data = await request.json()
+    text = data.get('text')
+
+    if not text:
+        return JSONResponse({"error": "No text provided"}, status_code=400)
+
+    try:
+        audio_data = await asyncio.to_thread(tts_service.synthesize, clean_tts_text(text), **tts_settings(data))
+        return Response(audio_data, media_type='audio/wav')
+    except NothingToSpeak as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+    except Exception as e:
+        print(f"TTS error: {e}")
+        return JSONResponse({"error": f"TTS failed: {str(e)}"}, status_code=500)
+
+
+async def tts_stream(request):
+    data = await request.json()
+    text = data.get('text')
+
+    if not text:
+        return JSONResponse({"error": "No text provided"}, status_code=400)
+
+    clean_text = clean_tts_text(text)
+    settings = tts_settings(data)
+
+    async def generate():
+        index = 0
+        try:
+            async for audio_data in iterate_in_threadpool(tts_service.synthesize_stream(clean_text, **settings)):
+                chunk = base64.b64encode(audio_data).decode('ascii')
+                yield json.dumps({"index": index, "audio": chunk}) + "\n"
+                index += 1
+        except Exception as e:
+            print(f"TTS error: {e}")
+            yield json.dumps({"error": f"TTS failed: {str(e)}"}) + "\n"
+
+    return StreamingResponse(generate(), media_type='application/x-ndjson')
+
+
+app = Starlette(routes=[
+    Route('/api/chat', chat, methods=['POST']),
+    Route('/api/listen', listen, methods=['POST']),
+    Route('/api/tts', tts, methods=['POST']),
+    Route('/api/tts/stream', tts_stream, methods=['POST']),
+    Mount('/', WSGIMiddleware(flask_app)),
+], middleware=[
+    Middleware(CORSMiddleware, allow_origins=['*'], allow_methods=['*'], allow_headers=['*'])
+])
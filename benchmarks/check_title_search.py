@@ -0,0 +1,122 @@
+"""
+Title search parity check
+
+Compares NCBISearch.search against the original per-row csv.DictReader +
+difflib.SequenceMatcher implementation on the fixture corpus and on a
+randomized corpus full of near-miss spellings. Exits non-zero on any
+difference.
+
+    python benchmarks/check_title_search.py --rows 1000 --queries 50
+"""
+import argparse
+import csv
+import difflib
+import os
+import random
+import re
+import string
+import sys
+import tempfile
+from typing import List, Dict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from scraper.ncbi_search import NCBISearch  # noqa: E402
+
+FIXTURE_CSV = os.path.join(ROOT, "benchmarks", "fixtures", "publications.csv")
+
+
+def reference_search(keywords: List[str], csv_path: str, max_results: int = 10) -> List[Dict]:
+    """The original row-by-row implementation"""
+    results = []
+    keywords = [k.lower() for k in keywords]
+    with open(csv_path, newline='', encoding='utf-8-sig') as f:
+        reader = csv.DictReader(f)
+        field_map = {name.strip().lower(): name for name in reader.fieldnames or []}
+        for row in reader:
+            title = row[field_map["title"]].strip()
+            link = row[field_map["link"]].strip()
+            title_lower = title.lower()
+            match_count = 0
+            for kw in keywords:
+                if kw in title_lower:
+                    match_count += 1
+                else:
+                    words = re.findall(r"\w+", title_lower)
+                    best_ratio = max(
+                        (difflib.SequenceMatcher(None, kw, w).ratio() for w in words),
+                        default=0,
+                    )
+                    if best_ratio > 0.75:
+                        match_count += 1
+            if match_count > 0:
+                results.append({"title": title, "link": link, "match_score": match_count})
+    results.sort(key=lambda x: (-x["match_score"], x["title"]))
+    return results[:max_results]
+
+
+def mutate(word: str, rng: random.Random) -> str:
+    """Drop, swap, insert or replace one character"""
+    if len(word) < 2:
+        return word + rng.choice(string.ascii_lowercase)
+    i = rng.randrange(len(word) - 1)
+    op = rng.choice("dsir")
+    if op == "d":
+        return word[:i] + word[i + 1:]
+    if op == "s":
+        return word[:i] + word[i + 1] + word[i] + word[i + 2:]
+    if op == "i":
+        return word[:i] + rng.choice(string.ascii_lowercase) + word[i:]
+    return word[:i] + rng.choice(string.ascii_lowercase) + word[i + 1:]
+
+
+def write_random_corpus(path: str, rows: int, rng: random.Random) -> List[str]:
+    with open(FIXTURE_CSV, newline='', encoding='utf-8-sig') as f:
+        base_words = sorted({w for row in csv.DictReader(f) for w in re.findall(r"\w+", row["Title"].lower())})
+    vocab = base_words + [mutate(rng.choice(base_words), rng) for _ in range(len(base_words) * 20)]
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["Title", "Link"])
+        for i in range(rows):
+            title = " ".join(rng.choice(vocab) for _ in range(rng.randint(3, 14))).capitalize()
+            writer.writerow([title, f"https://www.ncbi.nlm.nih.gov/pmc/articles/PMC{9100000 + i}/"])
+    return vocab
+
+
+def check(csv_path: str, queries: List[List[str]]) -> int:
+    searcher = NCBISearch()
+    failures = 0
+    for keywords in queries:
+        expected = reference_search(keywords, csv_path, max_results=1000)
+        actual = searcher.search(keywords, csv_path, max_results=1000)
+        if expected != actual:
+            failures += 1
+            print(f"MISMATCH for {keywords}: expected {len(expected)} results, got {len(actual)}")
+    print(f"{os.path.basename(csv_path)}: {len(queries) - failures}/{len(queries)} queries match")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1000, help="Rows in the randomized corpus")
+    parser.add_argument("--queries", type=int, default=50, help="Randomized queries to compare")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = os.path.join(tmp, "random_publications.csv")
+        vocab = write_random_corpus(csv_path, args.rows, rng)
+
+        def random_keyword():
+            words = [mutate(rng.choice(vocab), rng) for _ in range(rng.choice((1, 1, 2)))]
+            return " ".join(words)
+
+        queries = [[random_keyword() for _ in range(rng.randint(1, 4))] for _ in range(args.queries)]
+        failures = check(FIXTURE_CSV, queries) + check(csv_path, queries)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,294 @@
+"""
+Offline benchmark for the retrieval and generation pipeline.
+
+Replays benchmarks/prompts.json through RAGProcessor.search and IBAT.run with
+NCBI, OSDR and Ollama replaced by recorded responses, then reports per-stage
+p50/p95 latency, throughput at each concurrency level and peak memory.
+
+    python benchmarks/run_benchmarks.py
+    python benchmarks/run_benchmarks.py --concurrency 1 4 --latency-scale 1
+    python benchmarks/run_benchmarks.py --save-baseline
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from typing import Dict, List, Any, Optional
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+import tracing
+from stand_ins import FIXTURES_DIR, load_recordings, recorded_network
+
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, "baseline.json")
+DEFAULT_CSV = os.path.join(FIXTURES_DIR, "publications.csv")
+
+
+# ----------------------------- Pipeline setup -----------------------------
+
+def build_rag_processor(csv_path: str):
+    from rag_processor import RAGProcessor
+    return use_recorded_corpus(RAGProcessor(), csv_path)
+
+
+def use_recorded_corpus(rag, csv_path: str):
+    from scraper.corpus import CorpusRegistry
+    rag.csv_path = csv_path
+    rag.corpus = CorpusRegistry()
+    rag.corpus.register("benchmark", csv_path)
+    # Upstream pacing is replayed through --latency-scale, not the client-side rate limiter
+    rag.ncbi.transport.clear_rate_limits()
+    return rag
+
+
+def build_ibat(csv_path: str, report_path: str, weight: str):
+    """IBAT wired to the recorded network, without microphone, Whisper, TTS or CSV download"""
+    from main import IBAT, SourceManager
+
+    ibat = IBAT(voice=False, sync_data=False, osdr_mirror=False, prefetch=False, session_context=False)
+    use_recorded_corpus(ibat.rag_processor, csv_path)
+    # Generation is replayed from recordings, so there is no model to pull
+    ibat.ollama_client.pull_model = lambda model, token=None: True
+    ibat.source_manager = SourceManager(report_html_path=report_path)
+    ibat.weight = weight
+    return ibat
+
+
+def max_rss_mb() -> Optional[float]:
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return round(rss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def load_sessions(path: str) -> List[List[Dict[str, Any]]]:
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)["sessions"]
+
+
+# ----------------------------- Measurement -----------------------------
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = (len(ordered) - 1) * q
+    lower = int(index)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (index - lower)
+
+
+def summarize(samples: Dict[str, List[float]]) -> Dict[str, Dict[str, float]]:
+    return {
+        name: {
+            "count": len(values),
+            "p50_ms": round(percentile(values, 0.5) * 1000, 3),
+            "p95_ms": round(percentile(values, 0.95) * 1000, 3),
+        }
+        for name, values in sorted(samples.items())
+    }
+
+
+def collect_spans(trace: Dict[str, Any], samples: Dict[str, List[float]]):
+    # Several spans of the same name in one request (e.g. section_fetch) are summed per request
+    per_request: Dict[str, float] = {}
+    for s in trace["spans"]:
+        per_request[s["name"]] = per_request.get(s["name"], 0.0) + s["duration_ms"] / 1000.0
+    for name, seconds in per_request.items():
+        samples.setdefault(name, []).append(seconds)
+
+
+def replay_rag(rag, sessions, samples, lock):
+    for session in sessions:
+        rag.clear_context()
+        for turn in session:
+            trace = tracing.start_trace("RAGProcessor.search")
+            start = time.perf_counter()
+            try:
+                rag.search(turn["prompt"], force_new_topic=turn.get("force_new_topic", False))
+            finally:
+                tracing.end_trace()
+            elapsed = time.perf_counter() - start
+            with lock:
+                samples.setdefault("total", []).append(elapsed)
+                collect_spans(trace.to_dict(), samples)
+
+
+def replay_ibat(ibat, sessions, samples, lock):
+    for session in sessions:
+        ibat.rag_processor.clear_context()
+        for turn in session:
+            if turn.get("force_new_topic"):
+                ibat.rag_processor.clear_context()
+            start = time.perf_counter()
+            result = ibat.run(turn["prompt"])
+            elapsed = time.perf_counter() - start
+            with lock:
+                samples.setdefault("total", []).append(elapsed)
+                collect_spans(result["trace"], samples)
+
+
+def run_phase(name: str, concurrency: int, iterations: int, sessions, make_worker, replay) -> Dict[str, Any]:
+    """Replay every session `iterations` times on each of `concurrency` threads"""
+    workers = [make_worker() for _ in range(concurrency)]
+    samples: Dict[str, List[float]] = {}
+    lock = threading.Lock()
+
+    # Warm-up pass so one-time imports and file reads are not measured
+    replay(workers[0], sessions[:1], {}, lock)
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    threads = [
+        threading.Thread(target=lambda w=w: [replay(w, sessions, samples, lock) for _ in range(iterations)])
+        for w in workers
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    requests_done = len(samples.get("total", []))
+    return {
+        "phase": name,
+        "concurrency": concurrency,
+        "requests": requests_done,
+        "wall_seconds": round(wall, 3),
+        "throughput_rps": round(requests_done / wall, 3) if wall else None,
+        "peak_traced_mb": round(peak / (1024 * 1024), 2),
+        "stages": summarize(samples),
+    }
+
+
+# ----------------------------- Baseline comparison -----------------------------
+
+def compare(results: List[Dict[str, Any]], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """Return a description of every metric that regressed beyond tolerance"""
+    regressions = []
+    previous = {(r["phase"], r["concurrency"]): r for r in baseline.get("results", [])}
+    for current in results:
+        key = (current["phase"], current["concurrency"])
+        base = previous.get(key)
+        if not base:
+            continue
+        label = f"{current['phase']}@{current['concurrency']}"
+        if base["throughput_rps"] and current["throughput_rps"] < base["throughput_rps"] * (1 - tolerance):
+            regressions.append(f"{label} throughput {base['throughput_rps']} -> {current['throughput_rps']} req/s")
+        for stage, stats in current["stages"].items():
+            base_stats = base["stages"].get(stage)
+            if not base_stats:
+                continue
+            # Ignore sub-millisecond noise
+            limit = max(base_stats["p95_ms"] * (1 + tolerance), base_stats["p95_ms"] + 1.0)
+            if stats["p95_ms"] > limit:
+                regressions.append(f"{label} {stage} p95 {base_stats['p95_ms']} -> {stats['p95_ms']} ms")
+    return regressions
+
+
+def print_report(results: List[Dict[str, Any]]):
+    for r in results:
+        print(f"\n== {r['phase']} | concurrency {r['concurrency']} | {r['requests']} requests "
+              f"| {r['throughput_rps']} req/s | peak {r['peak_traced_mb']} MB traced ==")
+        print(f"   {'stage':<24}{'count':>7}{'p50 ms':>12}{'p95 ms':>12}")
+        for stage, stats in r["stages"].items():
+            print(f"   {stage:<24}{stats['count']:>7}{stats['p50_ms']:>12}{stats['p95_ms']:>12}")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Offline IBAT pipeline benchmark")
+    parser.add_argument("--prompts", default=os.path.join(BENCH_DIR, "prompts.json"))
+    parser.add_argument("--csv", default=DEFAULT_CSV, help="Publication CSV to search")
+    parser.add_argument("--phases", nargs="+", default=["rag_search", "ibat_run"], choices=["rag_search", "ibat_run"])
+    parser.add_argument("--concurrency", nargs="+", type=int, default=[1, 4])
+    parser.add_argument("--iterations", type=int, default=3, help="Replays of the prompt set per worker")
+    parser.add_argument("--weight", default="medium", choices=["light", "medium", "heavy"])
+    parser.add_argument("--latency-scale", type=float, default=0.0,
+                        help="Multiplier for recorded upstream latency (0 measures local CPU cost only)")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="Store these results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed fractional regression")
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    args = parser.parse_args(argv)
+
+    sessions = load_sessions(args.prompts)
+    recordings = load_recordings()
+    report_dir = tempfile.mkdtemp(prefix="ibat_bench_")
+
+    results = []
+    with recorded_network(recordings, args.latency_scale) as http:
+        for phase in args.phases:
+            for concurrency in args.concurrency:
+                if phase == "rag_search":
+                    make_worker = lambda: build_rag_processor(args.csv)
+                    replay = replay_rag
+                else:
+                    def make_worker():
+                        report_path = tempfile.mktemp(suffix=".html", dir=report_dir)
+                        with open(report_path, "w", encoding="utf-8") as f:
+                            f.write("<html><body>\n</body></html>")
+                        return build_ibat(args.csv, report_path, args.weight)
+                    replay = replay_ibat
+                results.append(run_phase(phase, concurrency, args.iterations, sessions, make_worker, replay))
+        upstream_calls = dict(http.calls)
+
+    report = {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "latency_scale": args.latency_scale,
+        "iterations": args.iterations,
+        "max_rss_mb": max_rss_mb(),
+        "upstream_calls": upstream_calls,
+        "results": results,
+    }
+
+    print_report(results)
+    print(f"\nUpstream calls replayed: {upstream_calls}")
+    if report["max_rss_mb"] is not None:
+        print(f"Max RSS: {report['max_rss_mb']} MB")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Saved baseline to {args.baseline}")
+        return 0
+
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("latency_scale") != args.latency_scale:
+            print("Baseline was recorded with a different --latency-scale; skipping comparison")
+            return 0
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print("\nRegressions against baseline:")
+            for line in regressions:
+                print(f" - {line}")
+            return 1
+        print("\nNo regressions against baseline.")
+    else:
+        print(f"\nNo baseline at {args.baseline}; run with --save-baseline to create one.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
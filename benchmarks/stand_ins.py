@@ -0,0 +1,112 @@
+import io
+import json
+import os
+import re
+import time
+from contextlib import contextmanager
+from typing import Dict, Any, List
+from unittest import mock
+from xml.sax.saxutils import escape
+
+import requests
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), "fixtures")
+
+
+def load_recordings(path: str = os.path.join(FIXTURES_DIR, "recorded_responses.json")) -> Dict[str, Any]:
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+class RecordedHTTP:
+    """
+    Replays recorded NCBI, OSDR and Ollama responses in place of the network
+
+    Every requests.Session.request call is routed here, which covers both the
+    module-level requests.get used by the scrapers and OllamaClient's session.
+    """
+
+    def __init__(self, recordings: Dict[str, Any], latency_scale: float = 0.0):
+        self.recordings = recordings
+        self.latency_scale = latency_scale
+        self.calls: Dict[str, int] = {}
+
+    def _sleep(self, endpoint: str):
+        self.calls[endpoint] = self.calls.get(endpoint, 0) + 1
+        delay = self.recordings["latency_ms"].get(endpoint, 0) / 1000.0
+        if self.latency_scale > 0 and delay > 0:
+            time.sleep(delay * self.latency_scale)
+
+    def _response(self, url: str, body: Any, content_type: str) -> requests.Response:
+        response = requests.Response()
+        response.status_code = 200
+        response.url = url
+        response.headers["Content-Type"] = content_type
+        response.raw = io.BytesIO((body if isinstance(body, str) else json.dumps(body)).encode("utf-8"))
+        response.encoding = "utf-8"
+        return response
+
+    def _ids(self, params: Dict[str, Any]) -> List[str]:
+        return [i for i in str((params or {}).get("id", "")).split(",") if i]
+
+    def _esummary(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        ids = self._ids(params)
+        result: Dict[str, Any] = {"uids": ids}
+        for pmcid in ids:
+            result[pmcid] = {**self.recordings["esummary"], "uid": pmcid}
+        return {"result": result}
+
+    def _efetch(self, params: Dict[str, Any]) -> str:
+        recorded = self.recordings["efetch"]
+
+        def paragraphs(key):
+            return "".join(f"<p>{escape(p)}</p>" for p in recorded[key])
+
+        articles = []
+        for pmcid in self._ids(params):
+            articles.append(
+                "<article><front><article-meta>"
+                f"<article-id pub-id-type=\"pmc\">PMC{pmcid}</article-id>"
+                f"<article-id pub-id-type=\"pmcid\">PMC{pmcid}</article-id>"
+                f"<abstract>{paragraphs('abstract')}</abstract>"
+                "</article-meta></front><body>"
+                f"<sec><title>Methods</title>{paragraphs('methods')}</sec>"
+                f"<sec><title>Results</title>{paragraphs('results')}</sec>"
+                "</body></article>"
+            )
+        return f"<pmc-articleset>{''.join(articles)}</pmc-articleset>"
+
+    def request(self, method: str, url: str, params=None, json=None, **kwargs) -> requests.Response:
+        if "esummary.fcgi" in url:
+            self._sleep("esummary")
+            return self._response(url, self._esummary(params), "application/json")
+        if "efetch.fcgi" in url:
+            self._sleep("efetch")
+            return self._response(url, self._efetch(params), "text/xml")
+        if "osdr.nasa.gov" in url:
+            self._sleep("osdr")
+            start = int((params or {}).get("from", 0))
+            size = int((params or {}).get("size", 10))
+            hits = self.recordings["osdr_hits"]
+            return self._response(url, {"hits": {"total": len(hits), "hits": hits[start:start + size]}},
+                                  "application/json")
+        if url.endswith("/api/tags"):
+            self._sleep("ollama_tags")
+            return self._response(url, {"models": []}, "application/json")
+        if url.endswith("/api/generate"):
+            self._sleep("ollama_generate")
+            model = (json or {}).get("model")
+            return self._response(url, {**self.recordings["ollama_generate"], "model": model}, "application/json")
+        raise requests.exceptions.ConnectionError(f"No recorded response for {method} {url}")
+
+
+@contextmanager
+def recorded_network(recordings: Dict[str, Any], latency_scale: float = 0.0):
+    """Route all requests traffic to RecordedHTTP for the duration of the block"""
+    http = RecordedHTTP(recordings, latency_scale)
+
+    def fake_request(session, method, url, params=None, json=None, **kwargs):
+        return http.request(method, re.sub(r"\?.*$", "", url), params=params, json=json, **kwargs)
+
+    with mock.patch.object(requests.Session, "request", fake_request):
+        yield http
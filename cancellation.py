@@ -0,0 +1,121 @@
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional, Dict, Callable, List
+
+
+class RequestCancelled(Exception):
+    """Raised inside a request once its token is cancelled or its deadline passes"""
+
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+
+class CancellationToken:
+    """
+    Cancellation Token Module
+    Carries a request's deadline and cancel flag through retrieval and generation.
+    """
+
+    def __init__(self, deadline: Optional[float] = None):
+        # deadline is a number of seconds from now
+        self.expires_at = time.monotonic() + deadline if deadline else None
+        self.reason: Optional[str] = None
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._callbacks: List[Callable[[], None]] = []
+
+    def cancel(self, reason: str = "cancelled"):
+        with self._lock:
+            if self._event.is_set():
+                return
+            self.reason = reason
+            self._event.set()
+            callbacks = list(self._callbacks)
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                print(f"[CancellationToken] Cancel callback failed: {e}")
+
+    @contextmanager
+    def on_cancel(self, callback: Callable[[], None]):
+        """
+        Call callback, from the cancelling thread, if the request is cancelled or its deadline passes inside the block
+
+        For work that blocks without checking the token, such as waiting on a socket.
+        """
+        with self._lock:
+            self._callbacks.append(callback)
+        timer = None
+        if self.expires_at is not None:
+            timer = threading.Timer(max(0.0, self.expires_at - time.monotonic()), self.cancel,
+                                    args=("deadline exceeded",))
+            timer.daemon = True
+            timer.start()
+        try:
+            if self._event.is_set():
+                callback()
+            yield
+        finally:
+            if timer:
+                timer.cancel()
+            with self._lock:
+                self._callbacks.remove(callback)
+
+    @property
+    def cancelled(self) -> bool:
+        if not self._event.is_set() and self.expires_at is not None and time.monotonic() >= self.expires_at:
+            self.cancel("deadline exceeded")
+        return self._event.is_set()
+
+    def remaining(self) -> Optional[float]:
+        """Seconds left before the deadline, or None without one"""
+        if self.expires_at is None:
+            return None
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def timeout(self, default: Optional[float] = None) -> Optional[float]:
+        """An HTTP timeout that never outlives the deadline"""
+        remaining = self.remaining()
+        if remaining is None:
+            return default
+        if default is None:
+            return remaining
+        return min(default, remaining)
+
+    def check(self):
+        """Raise RequestCancelled if the request should stop"""
+        if self.cancelled:
+            raise RequestCancelled(self.reason)
+
+
+class RequestRegistry:
+    """Tracks the in-flight request per chat session so a new question supersedes the old one"""
+
+    def __init__(self, deadline: Optional[float] = None):
+        self.deadline = deadline
+        self.active: Dict[str, CancellationToken] = {}
+        self._lock = threading.Lock()
+
+    def start(self, session_id: Optional[str]) -> CancellationToken:
+        token = CancellationToken(self.deadline)
+        if session_id:
+            with self._lock:
+                previous = self.active.get(session_id)
+                self.active[session_id] = token
+            if previous:
+                print(f"[RequestRegistry] Superseding previous request for {session_id}")
+                previous.cancel("superseded")
+        return token
+
+    def finish(self, session_id: Optional[str], token: CancellationToken):
+        if session_id:
+            with self._lock:
+                if self.active.get(session_id) is token:
+                    del self.active[session_id]
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self.active)
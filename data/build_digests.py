@@ -0,0 +1,79 @@
+import argparse
+import os
+import re
+from typing import List
+
+from ollama_client import OllamaClient
+from scraper.digest_store import DigestStore, DEFAULT_DIGEST_MODEL, DEFAULT_DIGEST_DB
+from scraper.ncbi_search import NCBISearch
+from scraper.publication_table import PublicationTable
+
+# This file builds the offline paper digests used by RAGProcessor's digest mode.
+# Run with: python -m data.build_digests --model llama3.2:3b
+
+DIGEST_PROMPT = """Summarize this space biology paper for a retrieval index in at most 120 words.
+Use exactly this format:
+Key findings: <the main results, with numbers where given>
+Organism: <species or cell type studied>
+Conditions: <spaceflight, microgravity, radiation or other conditions and durations>
+
+Title: {title}
+Abstract: {abstract}
+Results: {results}
+"""
+
+
+def clean_digest(text: str) -> str:
+    """Drop any reasoning block and surrounding whitespace from a model's digest"""
+    return re.sub(r'<think>.*?</think>', '', text, flags=re.DOTALL).strip()
+
+
+def build_digests(csv_paths: List[str], model: str = DEFAULT_DIGEST_MODEL, db_path: str = DEFAULT_DIGEST_DB,
+                  batch_size: int = 20, limit: int = 0):
+    """Digest every paper in the corpora that has no digest for this model yet"""
+    store = DigestStore(db_path, model=model)
+    ncbi = NCBISearch()
+    ollama = OllamaClient()
+    ollama.pull_model(model)
+
+    papers = {}
+    for csv_path in csv_paths:
+        titles, links = PublicationTable.read_csv(csv_path)
+        papers.update(zip(links, titles))
+    todo = store.missing(list(papers))
+    if limit:
+        todo = todo[:limit]
+    print(f"[build_digests] {len(papers) - len(store.missing(list(papers)))} of {len(papers)} papers "
+          f"already digested with {model}, digesting {len(todo)}")
+
+    done = 0
+    for start in range(0, len(todo), batch_size):
+        batch = todo[start:start + batch_size]
+        try:
+            texts = ncbi.get_sections_many(batch, ["Abstract", "Results"])
+        except Exception as e:
+            print(f"[build_digests] Could not fetch papers {start}-{start + len(batch)}: {e}")
+            continue
+        for link in batch:
+            abstract = texts[link]["Abstract"]
+            if not abstract or abstract.startswith("No section found"):
+                continue
+            prompt = DIGEST_PROMPT.format(title=papers[link], abstract=abstract, results=texts[link]["Results"])
+            response = ollama.send_prompt(model, prompt, temperature=0.2, num_predict=300)
+            if not response:
+                continue
+            store.put(link, clean_digest(response))
+            done += 1
+        print(f"[build_digests] {min(start + batch_size, len(todo))}/{len(todo)} processed, {done} digested")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Precompute compact paper digests with a local Ollama model")
+    parser.add_argument("--model", default=DEFAULT_DIGEST_MODEL)
+    parser.add_argument("--csv", action="append",
+                        help="Publication CSV with Title and Link columns (repeatable)")
+    parser.add_argument("--db", default=DEFAULT_DIGEST_DB)
+    parser.add_argument("--limit", type=int, default=0, help="Digest at most this many papers (0 for all)")
+    args = parser.parse_args()
+    build_digests(args.csv or [os.path.join("data", "csv", "SB_publication_PMC.csv")], model=args.model,
+                  db_path=args.db, limit=args.limit)
@@ -0,0 +1,32 @@
+import threading
+
+from scraper.osdr_mirror import OSDRMirror
+
+# This file keeps the local OSDR study mirror up to date
+
+
+def sync_osdr_mirror(mirror: OSDRMirror, max_age_hours: float = 24.0):
+    """Load the existing mirror, then refresh it if it is missing or older than max_age_hours"""
+    if not mirror.ready:
+        mirror.load()
+
+    age = mirror.age()
+    if age is not None and age < max_age_hours * 3600:
+        return
+
+    try:
+        mirror.sync()
+    except Exception as e:
+        print(f"Error syncing OSDR mirror: {e}")
+
+
+def start_osdr_sync(mirror: OSDRMirror, max_age_hours: float = 24.0) -> threading.Thread:
+    """Sync in the background; live OSDR queries are used until the mirror is ready"""
+    thread = threading.Thread(target=sync_osdr_mirror, args=(mirror, max_age_hours),
+                              name="osdr-sync", daemon=True)
+    thread.start()
+    return thread
+
+
+if __name__ == "__main__":
+    sync_osdr_mirror(OSDRMirror(), max_age_hours=0)
@@ -155,6 +155,57 @@ function selectOption(element) {
     dropdown.classList.remove('open');
 }
 
+// Play per-sentence TTS clips in order as the server streams them
+async function playStreamedSpeech(text) {
+    const ttsResponse = await fetch('/api/tts/stream', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ text: text })
+    });
+
+    if (!ttsResponse.ok) {
+        throw new Error(`TTS HTTP error! status: ${ttsResponse.status}`);
+    }
+
+    const clips = [];
+    let playing = false;
+
+    function playNext() {
+        if (clips.length === 0) {
+            playing = false;
+            return;
+        }
+        playing = true;
+        const audio = new Audio(clips.shift());
+        audio.onended = playNext;
+        audio.onerror = playNext;
+        audio.play();
+    }
+
+    const reader = ttsResponse.body.getReader();
+    const decoder = new TextDecoder();
+    let buffered = '';
+
+    while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        buffered += decoder.decode(value, { stream: true });
+
+        const lines = buffered.split('\n');
+        buffered = lines.pop();
+        for (const line of lines) {
+            if (!line.trim()) continue;
+            const chunk = JSON.parse(line);
+            if (chunk.error) {
+                console.error('TTS error:', chunk.error);
+                continue;
+            }
+            clips.push(`data:audio/wav;base64,${chunk.audio}`);
+            if (!playing) playNext();
+        }
+    }
+}
+
 // Make functions globally accessible
 window.restoreMessagesUI = restoreMessagesUI;
 window.createUserMessage = createUserMessage;
@@ -183,6 +234,16 @@ document.addEventListener('DOMContentLoaded', function() {
         return;
     }
 
+    // Whisper may be unloaded after a quiet spell; start reloading it as the user reaches for the mic
+    let lastPreload = 0;
+    const preloadWhisper = () => {
+        if (Date.now() - lastPreload < 30000) return;
+        lastPreload = Date.now();
+        fetch('/api/whisper/preload', { method: 'POST' }).catch(() => {});
+    };
+    micButton.addEventListener('pointerenter', preloadWhisper);
+    micButton.addEventListener('focus', preloadWhisper);
+
     micButton.addEventListener('click', async () => {
         if (isListening) return;
 
@@ -262,9 +323,23 @@ document.addEventListener('DOMContentLoaded', function() {
             const chatResponse = await fetch('/api/chat', {
                 method: 'POST',
                 headers: { 'Content-Type': 'application/json' },
-                body: JSON.stringify({ message: text, size: selectedSize })
+                body: JSON.stringify({ message: text, size: selectedSize, session_id: chatHistory.sessionId })
             });
 
+            if (chatResponse.status === 409) {
+                // A newer question from this session replaced this one on the server
+                thinkingMessage.querySelector('.message-bubble').innerHTML = 'Cancelled in favor of your newer question.';
+                return;
+            }
+
+            if (chatResponse.status === 503) {
+                // The model queue is full; the server says when to try again
+                const retryAfter = chatResponse.headers.get('Retry-After') || 'a few';
+                thinkingMessage.querySelector('.message-bubble').innerHTML =
+                    `The model is busy right now, please try again in ${retryAfter} seconds.`;
+                return;
+            }
+
             if (!chatResponse.ok) {
                 throw new Error(`HTTP error! status: ${chatResponse.status}`);
             }
@@ -274,23 +349,17 @@ document.addEventListener('DOMContentLoaded', function() {
 
             // Update thinking message with actual response
             thinkingMessage.querySelector('.message-bubble').innerHTML = botResponseText;
-            chatHistory.addMessage('assistant', botResponseText);
-
-            // Get TTS audio and play it
-            const ttsResponse = await fetch('/api/tts', {
-                method: 'POST',
-                headers: { 'Content-Type': 'application/json' },
-                body: JSON.stringify({ text: botResponseText })
-            });
-
-            if (!ttsResponse.ok) {
-                throw new Error(`TTS HTTP error! status: ${ttsResponse.status}`);
+            if (chatData.downgraded) {
+                // The server answered with a lighter model to keep up with load
+                const note = document.createElement('div');
+                note.className = 'model-note';
+                note.textContent = `Answered by ${chatData.model} due to high load.`;
+                thinkingMessage.querySelector('.message-bubble').appendChild(note);
             }
+            chatHistory.addMessage('assistant', botResponseText);
 
-            const audioBlob = await ttsResponse.blob();
-            const audioUrl = URL.createObjectURL(audioBlob);
-            const audio = new Audio(audioUrl);
-            audio.play();
+            // Stream TTS audio sentence by sentence and play it
+            await playStreamedSpeech(botResponseText);
 
         } catch (error) {
             console.error('Error during bot communication:', error);
@@ -0,0 +1,262 @@
+import asyncio
+import heapq
+import itertools
+import threading
+import time
+from contextlib import contextmanager, asynccontextmanager
+from typing import Optional, Dict, List, Any
+
+
+class GenerationQueueFull(Exception):
+    """Raised when a generation request is not admitted; retry_after is a hint in seconds"""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class _Ticket:
+    """One request waiting for a generation slot"""
+
+    def __init__(self, model: str, priority: int, seq: int):
+        self.model = model
+        self.priority = priority
+        self.seq = seq
+        self.enqueued_at = time.monotonic()
+        self.granted = False
+        self._event = threading.Event()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._future: Optional[asyncio.Future] = None
+
+    def __lt__(self, other: "_Ticket") -> bool:
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+    def grant(self):
+        self.granted = True
+        self._event.set()
+        if self._future is not None:
+            self._loop.call_soon_threadsafe(lambda: self._future.done() or self._future.set_result(True))
+
+
+class GenerationScheduler:
+    """
+    Generation Scheduler Module
+    Admission control in front of Ollama: one priority queue per model tier,
+    a concurrency cap per model and a limit on how many different models run
+    at once, so Ollama is not made to swap tiers on every request. Requests
+    are rejected up front when the queue is full or the expected wait would
+    outlive the request's deadline.
+    """
+
+    def __init__(self, default_concurrency: int = 1, concurrency: Optional[Dict[str, int]] = None,
+                 max_queue: int = 16, max_active_models: int = 1, switch_after: float = 10.0):
+        self.default_concurrency = max(1, default_concurrency)
+        self.concurrency = dict(concurrency or {})
+        self.max_queue = max_queue
+        self.max_active_models = max(1, max_active_models)
+        # A waiting tier takes over once its oldest request has waited this long
+        self.switch_after = switch_after
+
+        self.queues: Dict[str, List[_Ticket]] = {}
+        self.running: Dict[str, int] = {}
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+
+        self._stats: Dict[str, Dict[str, float]] = {}
+        self._avg_run: Dict[str, float] = {}
+
+    def cap(self, model: str) -> int:
+        return max(1, self.concurrency.get(model, self.default_concurrency))
+
+    def _model_stats(self, model: str) -> Dict[str, float]:
+        return self._stats.setdefault(model, {"completed": 0, "rejected": 0, "cancelled": 0,
+                                              "total_wait": 0.0, "total_run": 0.0})
+
+    # ---------------------------Estimates---------------------------
+    def _backlog_seconds(self, model: str) -> float:
+        """Seconds of work already queued or running for one model (lock held)"""
+        pending = len(self.queues.get(model, [])) + self.running.get(model, 0)
+        return pending / self.cap(model) * self._avg_run.get(model, 0.0)
+
+    def _estimate(self, model: str) -> float:
+        wait = self._backlog_seconds(model)
+        # Other tiers holding the active-model slots must drain before this one can load;
+        # after switch_after they stop taking new work, so only their running requests count
+        others = [m for m, n in self.running.items() if n and m != model]
+        if others and not self.running.get(model) and len(others) >= self.max_active_models:
+            wait += min(min(self._backlog_seconds(m), self.switch_after + self._avg_run.get(m, 0.0))
+                        for m in others)
+        return wait
+
+    def estimated_wait(self, model: str) -> float:
+        """Rough seconds a new request for model would wait before generation starts"""
+        with self._lock:
+            return self._estimate(model)
+
+    def expected_latency(self, model: str) -> float:
+        """Rough seconds until a new request for model would finish: queue wait plus recent run time"""
+        with self._lock:
+            return self._estimate(model) + self._avg_run.get(model, 0.0)
+
+    # ---------------------------Dispatch---------------------------
+    def _can_start(self, model: str) -> bool:
+        if self.running.get(model, 0) >= self.cap(model):
+            return False
+        if self.running.get(model):
+            return True
+        active = sum(1 for n in self.running.values() if n)
+        return active < self.max_active_models
+
+    def _dispatch(self):
+        """Grant slots to waiting requests (lock held)"""
+        while True:
+            waiting = [m for m, q in self.queues.items() if q]
+            if not waiting:
+                return
+            now = time.monotonic()
+
+            def oldest(m):
+                return self.queues[m][0].enqueued_at
+
+            starving = [m for m in waiting
+                        if not self.running.get(m) and now - oldest(m) >= self.switch_after]
+            if starving:
+                # A tier that waited too long gets the next free model slot; the
+                # running tiers are no longer topped up, so they drain for it
+                model = min(starving, key=oldest)
+                if not self._can_start(model):
+                    return
+            else:
+                candidates = [m for m in waiting if self._can_start(m)]
+                if not candidates:
+                    return
+                # Prefer a model that is already loaded over making Ollama swap
+                loaded = [m for m in candidates if self.running.get(m)]
+                model = min(loaded or candidates, key=oldest)
+
+            ticket = heapq.heappop(self.queues[model])
+            self.running[model] = self.running.get(model, 0) + 1
+            ticket.grant()
+
+    def _enqueue(self, model: str, priority: int, token) -> _Ticket:
+        with self._lock:
+            queued = sum(len(q) for q in self.queues.values())
+            estimate = self._estimate(model)
+            reason = None
+            if queued >= self.max_queue:
+                reason = f"Generation queue is full ({queued} requests waiting)"
+            elif token is not None and token.remaining() is not None and estimate > token.remaining():
+                reason = f"Expected wait of {estimate:.0f}s exceeds the request deadline"
+            if reason:
+                self._model_stats(model)["rejected"] += 1
+                raise GenerationQueueFull(reason, retry_after=max(1.0, estimate))
+
+            ticket = _Ticket(model, priority, next(self._seq))
+            heapq.heappush(self.queues.setdefault(model, []), ticket)
+            self._dispatch()
+            return ticket
+
+    def _abandon(self, ticket: _Ticket):
+        with self._lock:
+            if ticket.granted:
+                self._release(ticket, run_seconds=None)
+                return
+            queue = self.queues.get(ticket.model, [])
+            if ticket in queue:
+                queue.remove(ticket)
+                heapq.heapify(queue)
+            self._model_stats(ticket.model)["cancelled"] += 1
+
+    def _release(self, ticket: _Ticket, run_seconds: Optional[float]):
+        """Free a granted slot (lock held)"""
+        self.running[ticket.model] -= 1
+        if run_seconds is not None:
+            stats = self._model_stats(ticket.model)
+            stats["completed"] += 1
+            stats["total_run"] += run_seconds
+            previous = self._avg_run.get(ticket.model)
+            self._avg_run[ticket.model] = run_seconds if previous is None else 0.8 * previous + 0.2 * run_seconds
+        self._dispatch()
+
+    def _started(self, ticket: _Ticket) -> float:
+        started = time.monotonic()
+        with self._lock:
+            self._model_stats(ticket.model)["total_wait"] += started - ticket.enqueued_at
+        return started
+
+    def _finish(self, ticket: _Ticket, started: float):
+        with self._lock:
+            self._release(ticket, time.monotonic() - started)
+
+    @contextmanager
+    def slot(self, model: str, token=None, priority: int = 0):
+        """
+        Hold a generation slot for model for the duration of the block
+
+        Lower priority values are served first within a tier.
+
+        Raises:
+            GenerationQueueFull: If the request is not admitted
+            RequestCancelled: If the token is cancelled while waiting
+        """
+        ticket = self._enqueue(model, priority, token)
+        try:
+            while not ticket._event.wait(0.25):
+                if token:
+                    token.check()
+        except BaseException:
+            self._abandon(ticket)
+            raise
+        started = self._started(ticket)
+        try:
+            yield
+        finally:
+            self._finish(ticket, started)
+
+    @asynccontextmanager
+    async def async_slot(self, model: str, token=None, priority: int = 0):
+        """slot() for the ASGI server; cancelling the awaiting task leaves the queue"""
+        ticket = self._enqueue(model, priority, token)
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        ticket._loop, ticket._future = loop, future
+        if ticket.granted:
+            future.set_result(True)
+        try:
+            while not future.done():
+                await asyncio.wait({future}, timeout=0.25)
+                if token and not future.done():
+                    token.check()
+        except BaseException:
+            self._abandon(ticket)
+            raise
+        started = self._started(ticket)
+        try:
+            yield
+        finally:
+            self._finish(ticket, started)
+
+    # ---------------------------Metrics---------------------------
+    def get_metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            models = {}
+            for model in sorted(set(self.queues) | set(self.running) | set(self._stats)):
+                stats = self._model_stats(model)
+                started = stats["completed"]
+                models[model] = {
+                    "queue_depth": len(self.queues.get(model, [])),
+                    "running": self.running.get(model, 0),
+                    "concurrency": self.cap(model),
+                    "completed": int(stats["completed"]),
+                    "rejected": int(stats["rejected"]),
+                    "cancelled": int(stats["cancelled"]),
+                    "avg_wait_seconds": stats["total_wait"] / started if started else 0.0,
+                    "avg_run_seconds": self._avg_run.get(model, 0.0),
+                    "estimated_wait_seconds": self._estimate(model),
+                }
+            return {
+                "queue_depth": sum(len(q) for q in self.queues.values()),
+                "max_queue": self.max_queue,
+                "max_active_models": self.max_active_models,
+                "models": models,
+            }
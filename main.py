@@ -1,11 +1,19 @@
 import json
+import re
 import shutil
 import subprocess
 import sys
 import os
-from typing import Optional, List, Dict
+import threading
+from contextlib import nullcontext
+from typing import Optional, List, Dict, Tuple
 
-from whisper_vad import WhisperVoiceActivityDetector
+from whisper_vad import filter_transcription
+from transcription_service import TranscriptionService, RemoteTranscriptionService
+from answer_cache import AnswerCache
+from shared_store import SQLiteStore, SQLiteTokenBucket
+import tracing
+from cancellation import CancellationToken
 
 
 # ----------------------------- Requirements -----------------------------
@@ -105,33 +113,149 @@ class SourceManager:
 # ----------------------------- Main Program -----------------------------
 
 from ollama_client import OllamaClient
+from generation_scheduler import GenerationScheduler
+from tier_policy import TierPolicy
+from session_context import GenerationSessions
+from prefetcher import Prefetcher
 from rag_processor import RAGProcessor
 from data.sync_csv import save_dat_csv
-import pyttsx3
-import speech_recognition as sr
+from data.sync_osdr import start_osdr_sync
+from scraper.osdr_mirror import shared_mirror
+from scraper.article_cache import ArticleCache, set_shared_article_cache
+from scraper.query_cache import QueryCache, set_shared_query_cache
+from scraper.digest_store import DigestStore
+from scraper.http_transport import shared_transport
+
+
+# Sent instead of an answer when Ollama could not generate one
+NO_RESPONSE = "Sorry, I could not generate a response. Please try again."
 
 
 class IBAT:
-    def __init__(self, voice: bool = False, energy_threshold: int = 300, pause_threshold: float = 0.8):
+    def __init__(self, voice: bool = False, energy_threshold: int = 300, pause_threshold: float = 0.8,
+                 whisper_replicas: int = 1, transcription_queue: int = 8,
+                 answer_cache: bool = False, answer_cache_ttl: float = 3600.0,
+                 answer_cache_size: int = 512, osdr_mirror: bool = True,
+                 extra_corpora: Optional[List[str]] = None,
+                 sync_data: bool = True, shared_cache_db: Optional[str] = None,
+                 transcription_address: Optional[Tuple[str, int]] = None,
+                 transcription_authkey: Optional[bytes] = None,
+                 generation_concurrency: int = 1, generation_queue: int = 16,
+                 generation_models: int = 1, latency_slo: Optional[float] = None,
+                 session_context: bool = True, thinking: Optional[Dict] = None,
+                 digest_model: Optional[str] = None, prefetch: bool = True,
+                 ollama_urls: Optional[List[str]] = None, whisper_idle_unload: float = 0.0,
+                 microphone: bool = True):
 
         print("Initializing IBAT...")
 
-        print("Syncing CSV data...")
-        save_dat_csv()
+        # In multi-worker mode the launcher syncs data once before forking, so workers skip it
+        if sync_data:
+            print("Syncing CSV data...")
+            save_dat_csv()
+
+        # Scraper caches shared with the other server processes through one SQLite file
+        if shared_cache_db:
+            print(f"Using shared caches in {shared_cache_db}")
+            set_shared_article_cache(ArticleCache(store=SQLiteStore(shared_cache_db, "articles", max_entries=256)))
+            set_shared_query_cache(QueryCache(store=SQLiteStore(shared_cache_db, "osdr_queries", max_entries=1024)))
+            # Upstream limits such as NCBI's 3 requests/second are per client, not per process
+            shared_transport().use_bucket_factory(
+                lambda host, rate: SQLiteTokenBucket(shared_cache_db, host, rate))
+
+        self.osdr_mirror = None
+        if osdr_mirror:
+            self.osdr_mirror = shared_mirror()
+            if sync_data:
+                print("Syncing OSDR mirror in the background...")
+                start_osdr_sync(self.osdr_mirror)
+            elif not self.osdr_mirror.ready:
+                self.osdr_mirror.load()
 
         print("Setting up RAG Processor...")
-        self.rag_processor = RAGProcessor()
+        # Digest mode cites papers by their offline digests (python -m data.build_digests)
+        digests = DigestStore(model=digest_model) if digest_model else None
+        self.rag_processor = RAGProcessor(osdr_mirror=self.osdr_mirror, extra_corpora=extra_corpora,
+                                          digests=digests)
         print("RAG Processor set up.")
 
+        # Warms the caches for likely follow-ups while no request is retrieving
+        self.prefetcher = Prefetcher(self.rag_processor) if prefetch else None
+
         print("Setting up Ollama Client...")
-        self.ollama_client = OllamaClient()
+        # Admission control in front of Ollama: requests queue per model tier and
+        # are rejected early when the backlog would outlive their deadline.
+        # The limits are per Ollama server, so they scale with the backend pool.
+        backends = len(ollama_urls) if ollama_urls else 1
+        self.ollama_client = OllamaClient(scheduler=GenerationScheduler(
+            default_concurrency=generation_concurrency * backends,
+            max_queue=generation_queue,
+            max_active_models=generation_models * backends
+        ), thinking=thinking, backends=ollama_urls)
+        # Optional: answer with a lighter tier when the requested one would miss the latency SLO
+        self.tier_policy = None
+        if latency_slo:
+            self.tier_policy = TierPolicy(self.ollama_client.scheduler, latency_slo=latency_slo)
+            print(f"Adaptive tier downgrade enabled (SLO {latency_slo:.0f}s).")
+
+        # Follow-ups on unchanged papers continue from Ollama's context instead of re-prefilling
+        self.generation_sessions = GenerationSessions() if session_context else None
         print("Ollama Client set up.")
 
         print("Setting up Source Manager...")
         self.source_manager = SourceManager()
         print("Source Manager set up.")
 
+        # Opt-in cache of complete answers for repeated questions
+        self.answer_cache = None
+        if answer_cache:
+            store = SQLiteStore(shared_cache_db, "answers", max_entries=answer_cache_size) if shared_cache_db else None
+            self.answer_cache = AnswerCache(ttl=answer_cache_ttl, max_entries=answer_cache_size, store=store)
+            print("Answer cache enabled.")
+
         self.weight = "light"
+        self._rag_lock = threading.Lock()
+        # Text-only servers (voice=False) never import the speech, Whisper or torch stacks
+        self.voice = voice
+        self.engine = None
+        self.transcription_service = None
+        self.recognizer = None
+        self.microphone = None
+        self.vad = None
+        if voice:
+            self._setup_voice(energy_threshold, pause_threshold, whisper_replicas, transcription_queue,
+                              transcription_address, transcription_authkey, whisper_idle_unload, microphone)
+        else:
+            print("Voice input disabled, serving text only.")
+
+    def _setup_voice(self, energy_threshold: int, pause_threshold: float, whisper_replicas: int,
+                     transcription_queue: int, transcription_address: Optional[Tuple[str, int]],
+                     transcription_authkey: Optional[bytes], whisper_idle_unload: float, microphone: bool):
+        # Shared Whisper workers used by every voice request; in multi-worker mode
+        # they live in one dedicated process instead of in every worker
+        if transcription_address:
+            print(f"Connecting to Whisper process at {transcription_address}...")
+            self.transcription_service = RemoteTranscriptionService(transcription_address, transcription_authkey)
+        else:
+            print("Setting up Transcription Service...")
+            self.transcription_service = TranscriptionService(
+                whisper_model="tiny",
+                replicas=whisper_replicas,
+                max_queue=transcription_queue,
+                idle_unload=whisper_idle_unload
+            )
+        print("Transcription Service set up.")
+
+        # serve_workers.py workers only transcribe uploads: one microphone can't be
+        # shared by several processes, and calibrating it takes 2s per process
+        if not microphone:
+            print("Microphone input disabled, voice input is limited to uploaded audio.")
+            return
+
+        import pyttsx3
+        import speech_recognition as sr
+        from whisper_vad import WhisperVoiceActivityDetector
+
         self.engine = pyttsx3.init()
 
         # Initialize Whisper VAD and Speech components
@@ -145,7 +269,8 @@ class IBAT:
                 microphone=self.microphone,
                 whisper_model="tiny",
                 energy_threshold=energy_threshold,
-                pause_threshold=pause_threshold 
+                pause_threshold=pause_threshold,
+                transcription_service=self.transcription_service
             )
             self.vad.calibrate()
             print("Speech Recognition set up.")
@@ -157,51 +282,214 @@ class IBAT:
         if not self.vad:
             print("Voice Activity Detector not available.")
             return None
+        # An idle-unloaded Whisper reloads while the microphone is still recording
+        self.transcription_service.preload()
         return self.vad.listen_for_speech_vad(timeout=10)
+
+    def preload_whisper(self) -> int:
+        """Start reloading Whisper if it was unloaded while idle; returns the replicas loaded now"""
+        return self.transcription_service.preload()
+
+    def transcribe_file(self, audio_path: str) -> Optional[str]:
+        """Transcribe an uploaded audio file through the shared Whisper workers"""
+        result = self.transcription_service.transcribe(
+            audio_path,
+            language='en',
+            task='transcribe',
+            fp16=False,
+            verbose=False,
+            beam_size=5,
+            best_of=5,
+            temperature=0.0
+        )
+        return filter_transcription(result.get('text', '') if result else '')
     
-    def run(self, user_prompt):
+    def run(self, user_prompt, weight: Optional[str] = None, token: Optional[CancellationToken] = None,
+            session_id: Optional[str] = None):
+        """
+        Answer a prompt and attach a per-stage timing trace under 'trace'
+
+        Raises RequestCancelled if the token is cancelled or its deadline passes.
+        """
+        trace = tracing.start_trace("IBAT.run")
+        try:
+            with tracing.span("ibat_run"):
+                result = self._run(user_prompt, weight, token, session_id)
+        finally:
+            tracing.end_trace()
+        result["trace"] = trace.to_dict()
+        return result
+
+    def model_for_weight(self, weight: Optional[str] = None) -> str:
+        """Map a light/medium/heavy weight to its Ollama model"""
+        weight = weight or self.weight
+        if weight == "light":           #light
+            return "qwen3:1.7b"
+        elif weight == "medium":        #medium
+            return "llama3.2:3b"
+        else:                           #heavy
+            return "deepseek-r1:8b"
+
+    def prepare(self, user_prompt, weight: Optional[str] = None,
+                token: Optional[CancellationToken] = None, session_id: Optional[str] = None) -> Dict:
+        """
+        Everything before generation: answer cache lookup, model pull, RAG search and source injection
 
+        Returns a dict with the 'model_name' and 'prompt' to generate from, or
+        with 'cached' set to a finished result when the answer cache already has it.
+        With a tier policy, 'model_name' may be lighter than 'requested_model'.
+        When the session's last answer used the same model and papers, 'prompt'
+        is only the new question and 'context' holds Ollama's state to continue from.
+        """
         print("Running main program...")
 
         print("Connecting to Ollama model...")
 
-        model_name = "qwen3:1.7b"
+        requested_model = self.model_for_weight(weight)
 
-        if self.weight == "light":      #light
-            model_name = "qwen3:1.7b"
-        elif self.weight == "medium":   #medium
-            model_name = "llama3.2:3b"
-        else:                           #heavy
-            model_name = "deepseek-r1:8b"
+        # RAG and source state are shared, so only one request prepares at a time;
+        # background prefetching pauses from the moment a request starts waiting
+        with self.prefetcher.live() if self.prefetcher else nullcontext(), self._rag_lock:
+            if token:
+                token.check()
 
-        self.ollama_client.pull_model(model_name)
+            model_name = requested_model
+            if self.tier_policy:
+                model_name = self.tier_policy.choose(requested_model, token)
 
-        print("Processing RAG...")
-        prompt = self.rag_processor.search(user_prompt)
-        print(prompt)
+            # Follow-up questions depend on conversation history, so the context folded into
+            # retrieval is part of the key and a cached answer is only reused for the same context
+            cache_key = None
+            if self.answer_cache:
+                with tracing.span("answer_cache_lookup") as s:
+                    cache_key = self.answer_cache.make_key(user_prompt, model_name, self.rag_processor.corpus_version(),
+                                                           context=self.rag_processor.context_key(user_prompt))
+                    cached = self.answer_cache.get(cache_key)
+                    s.set(hit=cached is not None)
+                if cached:
+                    print("[IBAT] Answer cache hit")
+                    # Ollama never saw this turn, so the session's context no longer matches the chat
+                    if self.generation_sessions:
+                        self.generation_sessions.discard(session_id)
+                    self.rag_processor.record_cached_turn(user_prompt, cached["keywords"], cached["ncbi_queries"],
+                                                          cached.get("osdr_queries", []))
+                    unique_new_sources = self.source_manager.add_sources(cached["sources"])
+                    return {
+                        "model_name": model_name,
+                        "requested_model": requested_model,
+                        "cached": {
+                            "response": cached["response"],
+                            "sources": unique_new_sources,
+                            "model": model_name,
+                            "requested_model": requested_model
+                        }
+                    }
 
-        # Get new sources from RAG processor BEFORE sending to model
-        new_sources = self.rag_processor.get_ncbi_sources()
-        
-        # Filter and inject new sources directly into HTML
-        unique_new_sources = self.source_manager.add_sources(new_sources)
-        
-        print(f"[IBAT] Injected {len(unique_new_sources)} unique new source(s) into Report page")
+            with tracing.span("model_pull", model=model_name):
+                self.ollama_client.pull_model(model_name, token=token)
 
-        print("Sending prompt to Ollama...")
-        
-        response = self.ollama_client.send_prompt(model_name=model_name, prompt=prompt)
-        
+            print("Processing RAG...")
+            with tracing.span("rag_search") as s:
+                prompt = self.rag_processor.search(user_prompt, token=token)
+                s.set(prompt_bytes=len(prompt.encode('utf-8')))
+            print(prompt)
+
+            # Get new sources from RAG processor BEFORE sending to model
+            new_sources = self.rag_processor.get_ncbi_sources()
+
+            # Filter and inject new sources directly into HTML
+            with tracing.span("html_injection") as s:
+                unique_new_sources = self.source_manager.add_sources(new_sources)
+                s.set(sources=len(unique_new_sources))
+
+            print(f"[IBAT] Injected {len(unique_new_sources)} unique new source(s) into Report page")
+
+            sources_key = tuple(source["source"] for source in new_sources)
+            continued = None
+            if self.generation_sessions:
+                continued = self.generation_sessions.lookup(session_id, model_name, sources_key)
+            if continued:
+                # The papers are already in Ollama's context from the last answer; send only the question
+                print("[IBAT] Same papers as the last answer, continuing the session context")
+                prompt = user_prompt
+                cache_key = None
+
+            return {
+                "model_name": model_name,
+                "requested_model": requested_model,
+                "prompt": prompt,
+                "context": continued.context if continued else None,
+                "continued": continued,
+                "session_id": session_id,
+                "sources_key": sources_key,
+                "cache_key": cache_key,
+                "new_sources": new_sources,
+                "unique_new_sources": unique_new_sources,
+                "keywords": list(self.rag_processor.last_keywords),
+                "ncbi_queries": list(self.rag_processor.ncbi_queries),
+                "osdr_queries": list(self.rag_processor.osdr_queries),
+                "cached": None
+            }
+
+    def finish(self, prepared: Dict, response: Optional[str], context: Optional[List[int]] = None) -> Dict:
+        """Post-process a generated response, store it in the answer cache and keep the session context"""
         print(response)
 
-        # Remove the first line from the response
-        response_lines = response.split('\n', 1)
-        if len(response_lines) > 1:
-            response = response_lines[1]
-        else:
-            response = response_lines[0]
+        # No context drops the session, so a failed turn is never continued from
+        if self.generation_sessions:
+            self.generation_sessions.store(prepared["session_id"], prepared["model_name"],
+                                           prepared["sources_key"], context, continued=prepared["continued"])
+
+        # Ollama failed or returned nothing; answer with an apology and keep it out of the answer cache
+        if response is None:
+            print(f"[IBAT] No response from {prepared['model_name']}")
+            return {
+                "response": NO_RESPONSE,
+                "sources": prepared["unique_new_sources"],
+                "model": prepared["model_name"],
+                "requested_model": prepared["requested_model"]
+            }
+
+        # A follow-up is likely to touch the same topic, so warm the next-ranked papers now
+        if self.prefetcher:
+            self.prefetcher.schedule(prepared["keywords"], [source["source"] for source in prepared["new_sources"]])
+
+        # Reasoning arrives separately now, but models that ignore think=False still open
+        # with an empty <think></think> block or a stray tag line; the answer itself is kept whole
+        response = re.sub(r'^\s*<think>\s*</think>\s*', '', response)
+        first_line, _, rest = response.partition('\n')
+        if first_line.strip() in ("<think>", "</think>"):
+            response = rest
+
+        if prepared["cache_key"]:
+            self.answer_cache.put(prepared["cache_key"], {
+                "response": response,
+                "sources": prepared["new_sources"],
+                "keywords": prepared["keywords"],
+                "ncbi_queries": prepared["ncbi_queries"],
+                "osdr_queries": prepared["osdr_queries"]
+            })
 
         return {
             "response": response,
-            "sources": unique_new_sources
-        }
\ No newline at end of file
+            "sources": prepared["unique_new_sources"],
+            "model": prepared["model_name"],
+            "requested_model": prepared["requested_model"]
+        }
+
+    def _run(self, user_prompt, weight: Optional[str] = None, token: Optional[CancellationToken] = None,
+             session_id: Optional[str] = None):
+        prepared = self.prepare(user_prompt, weight, token, session_id)
+        if prepared["cached"]:
+            return prepared["cached"]
+
+        print("Sending prompt to Ollama...")
+        
+        result = self.ollama_client.generate(model_name=prepared["model_name"], prompt=prepared["prompt"],
+                                             token=token, context=prepared["context"])
+        if result is None and token:
+            # A read timeout capped by the deadline surfaces as a cancellation
+            token.check()
+
+        return self.finish(prepared, result["response"] if result else None,
+                           context=result["context"] if result else None)
@@ -1,8 +1,170 @@
 
+import asyncio
+import hashlib
 import json
+import socket
 import subprocess
+import threading
+import time
+from contextlib import contextmanager, nullcontext
 import requests
-from typing import Optional, List
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from typing import Optional, List, Dict, Any, Union
+
+import tracing
+from cancellation import RequestCancelled
+from generation_scheduler import GenerationScheduler, GenerationQueueFull
+from single_flight import SingleFlight
+from ollama_pool import OllamaPool
+
+# Per-model reasoning: False disables thinking, True allows it, a number caps it at that many tokens.
+# Models not listed (llama3.2) do not think and get no setting.
+DEFAULT_THINKING: Dict[str, Union[bool, int]] = {
+    "qwen3:1.7b": False,
+    "deepseek-r1:8b": 1024,
+}
+
+
+def parse_thinking(spec: str) -> Dict[str, Union[bool, int]]:
+    """Parse 'model=off,model=on,model=512' into per-model thinking settings"""
+    thinking = {}
+    for item in spec.split(','):
+        if not item.strip():
+            continue
+        model, _, value = item.strip().rpartition('=')
+        value = value.strip().lower()
+        thinking[model.strip()] = False if value == 'off' else True if value == 'on' else int(value)
+    return thinking
+
+
+def reasoning_cap(think: Union[bool, int, None]) -> Optional[int]:
+    # bool is an int subclass, so on/off must not be read as a cap of 1 or 0
+    return think if isinstance(think, int) and not isinstance(think, bool) else None
+
+
+# ---------------------------Cancellable requests---------------------------
+# Ollama sends no bytes until prefill is done, so a cancelled request can't be
+# noticed between streamed lines. Instead the connections a generation opens are
+# recorded here and their sockets shut from the cancelling thread, which makes
+# Ollama stop prefilling.
+_tracked = threading.local()
+
+
+class _TrackingPoolMixin:
+    def _get_conn(self, timeout=None):
+        conn = super()._get_conn(timeout)
+        connections = getattr(_tracked, "connections", None)
+        if connections is not None:
+            connections.append(conn)
+        return conn
+
+
+class _TrackingHTTPPool(_TrackingPoolMixin, HTTPConnectionPool):
+    pass
+
+
+class _TrackingHTTPSPool(_TrackingPoolMixin, HTTPSConnectionPool):
+    pass
+
+
+class _CancellableAdapter(HTTPAdapter):
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {"http": _TrackingHTTPPool, "https": _TrackingHTTPSPool}
+
+
+def _shutdown(connections: List[Any]):
+    for conn in list(connections):
+        sock = getattr(conn, "sock", None)
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+
+@contextmanager
+def _abort_on_cancel(token):
+    """Shut the sockets of requests made inside the block as soon as token is cancelled"""
+    if token is None:
+        yield
+        return
+    _tracked.connections = connections = []
+    try:
+        with token.on_cancel(lambda: _shutdown(connections)):
+            try:
+                yield
+            except (requests.exceptions.RequestException, OSError):
+                if token.cancelled:
+                    raise RequestCancelled(token.reason) from None
+                raise
+    finally:
+        _tracked.connections = None
+
+
+class _GenerationStream:
+    """
+    Accumulates one streamed generation, counting visible and reasoning tokens
+
+    Each streamed chunk is one token. Reasoning arrives in the 'thinking' field
+    when think is set, or inline between <think> tags for models that ignore it.
+    """
+
+    def __init__(self, cap: Optional[int] = None):
+        self.cap = cap
+        self.chunks: List[str] = []
+        self.thinking: List[str] = []
+        self.visible = 0
+        self.hidden = 0
+        self.capped = False
+        # Prompt tokens Ollama evaluated again for the answer-now request after the cap
+        self.continuation_prompt_tokens = 0
+        self._inline_think = False
+        self.result: Dict[str, Any] = {}
+
+    def feed(self, data: Dict[str, Any]) -> bool:
+        """Consume one chunk; False once the reasoning cap is reached and the stream should be closed"""
+        if data.get("thinking"):
+            self.thinking.append(data["thinking"])
+            self.hidden += 1
+        text = data.get("response", "")
+        if text:
+            self.chunks.append(text)
+            if "<think>" in text:
+                self._inline_think = True
+            if self._inline_think:
+                self.hidden += 1
+            else:
+                self.visible += 1
+            if "</think>" in text:
+                self._inline_think = False
+        if data.get("done"):
+            self.result = data
+            if self.capped:
+                self.continuation_prompt_tokens = data.get("prompt_eval_count") or 0
+        if self.cap is not None and not self.capped and self.hidden >= self.cap and not self.visible:
+            self.capped = True
+            return False
+        return True
+
+    def continuation(self, prompt: str) -> str:
+        """
+        Prompt for answering without further reasoning, given the reasoning cut off at the cap
+
+        Ollama only returns a generation's context in its final chunk, which a
+        stream closed at the cap never gets, so the answer-now request has to
+        send the prompt again. It starts with the original prompt unchanged so
+        Ollama's prompt cache on the same server can reuse that prefix; the
+        prompt tokens it still evaluates are counted in continuation_prompt_tokens.
+        """
+        notes = "".join(self.thinking) or "".join(self.chunks).replace("<think>", "")
+        self.chunks = []
+        self._inline_think = False
+        return f"{prompt}\n\nYour reasoning so far:\n{notes.strip()}\n\nNow answer directly, without further reasoning."
+
+    def text(self) -> str:
+        return "".join(self.chunks)
 
 
 class OllamaClient:
@@ -11,40 +173,149 @@ class OllamaClient:
     Handles communication with Ollama LLM server
     """
 
-    def __init__(self, ollama_url: str = "http://localhost:11434"):
-        self.ollama_url = ollama_url.rstrip('/')
+    def __init__(self, ollama_url: str = "http://localhost:11434",
+                 scheduler: Optional[GenerationScheduler] = None,
+                 thinking: Optional[Dict[str, Union[bool, int]]] = None,
+                 backends: Optional[List[str]] = None):
+        # Generations are spread over every backend; admin calls go to the first one
+        self.pool = OllamaPool(backends or [ollama_url])
+        self.ollama_url = self.pool.backends[0].url
         self.session = requests.Session()
+        adapter = _CancellableAdapter()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.async_client = None
+        # Every generation waits here for a slot on its model
+        self.scheduler = scheduler or GenerationScheduler()
+        self.thinking = DEFAULT_THINKING if thinking is None else thinking
+        self.token_stats: Dict[str, Dict[str, int]] = {}
+        self._stats_lock = threading.Lock()
+        # Identical prompts arriving together share one generation
+        self.inflight = SingleFlight("ollama_generate")
     
-    def send_prompt(self, model_name: str, prompt: str, **options) -> Optional[str]:
-        """Send prompt to Ollama"""
-        try:
-            url = f"{self.ollama_url}/api/generate"
-            
-            # Default options
-            default_options = {
-                "temperature": 0.7,
-                "top_p": 0.9,
-                "max_tokens": 2048,
-                "stop": ["Human:", "User:"]
-            }
-            
-            # merge with provided options
-            merged_options = {**default_options, **options}
-            
-            payload = {
-                "model": model_name,
-                "prompt": prompt,
-                "stream": False,
-                "options": merged_options
-            }
-            
-            print("Generating response...")
-            response = self.session.post(url, json=payload, timeout=120)
+    def _build_payload(self, model_name: str, prompt: str, stream: bool, options: dict,
+                       context: Optional[List[int]] = None, think: Union[bool, int, None] = None) -> dict:
+        # Default options
+        default_options = {
+            "temperature": 0.7,
+            "top_p": 0.9,
+            "max_tokens": 2048,
+            "stop": ["Human:", "User:"]
+        }
+        
+        # merge with provided options
+        merged_options = {**default_options, **options}
+        
+        payload = {
+            "model": model_name,
+            "prompt": prompt,
+            "stream": stream,
+            "options": merged_options
+        }
+        # Token state from a previous answer; the prompt continues that conversation
+        if context:
+            payload["context"] = context
+        # Only thinking models accept the flag; a cap still thinks, it is enforced while streaming
+        if think is not None:
+            payload["think"] = bool(think)
+        return payload
+
+    def _record_stats(self, result: dict, trace=None):
+        # Ollama reports its own stage durations in nanoseconds
+        if result.get("load_duration"):
+            tracing.record("ollama_load", result["load_duration"] / 1e9, trace=trace)
+        if result.get("prompt_eval_duration"):
+            tracing.record("ollama_prefill", result["prompt_eval_duration"] / 1e9, trace=trace,
+                           tokens=result.get("prompt_eval_count"))
+        if result.get("eval_duration"):
+            tracing.record("ollama_generation", result["eval_duration"] / 1e9, trace=trace,
+                           tokens=result.get("eval_count"))
+
+    def send_prompt(self, model_name: str, prompt: str, token=None, **options) -> Optional[str]:
+        """Send prompt to Ollama and return the response text"""
+        result = self.generate(model_name, prompt, token=token, **options)
+        return result["response"] if result else None
+
+    def _flight_key(self, model_name: str, prompt: str, context: Optional[List[int]], options: dict) -> str:
+        raw = json.dumps([model_name, prompt, context or [], options], sort_keys=True, default=str)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def generate(self, model_name: str, prompt: str, token=None, context: Optional[List[int]] = None,
+                 **options) -> Optional[Dict]:
+        """
+        Send prompt to Ollama, optionally continuing from a previous answer's context
+
+        Returns {'response': text, 'context': token state to continue from}, or None on error.
+        The response is streamed and the optional CancellationToken is checked
+        between chunks; closing the connection early makes Ollama stop generating.
+        An identical request already generating is waited for instead of repeated.
+        Raises GenerationQueueFull if the scheduler does not admit the request.
+        """
+        return self.inflight.do(self._flight_key(model_name, prompt, context, options),
+                                lambda: self._generate(model_name, prompt, token, context, options),
+                                token=token, copy=lambda result: dict(result) if result else result)
+
+    def _stream(self, url: str, payload: dict, stream: "_GenerationStream", token, timeout):
+        with _abort_on_cancel(token), self.session.post(url, json=payload, timeout=timeout,
+                                                        stream=True) as response:
             response.raise_for_status()
+            for line in response.iter_lines():
+                if token:
+                    token.check()
+                if line and not stream.feed(json.loads(line)):
+                    break
+
+    def _stream_with_failover(self, model_name: str, prompt: str, context: Optional[List[int]], options: dict,
+                              token, timeout):
+        """Stream one generation from a pool server, moving to the next one on connection errors"""
+        think = self.thinking.get(model_name)
+        payload = self._build_payload(model_name, prompt, True, options, context, think)
+        tried = set()
+        while True:
+            backend = self.pool.choose(model_name, exclude=tried)
+            if backend is None:
+                raise requests.exceptions.ConnectionError(f"No Ollama server reachable for {model_name}")
+            stream = _GenerationStream(reasoning_cap(think))
+            url = f"{backend.url}/api/generate"
+            try:
+                with self.pool.use(backend, model_name):
+                    self._stream(url, payload, stream, token, timeout)
+                    if stream.capped:
+                        # Closing the stream stopped the reasoning; ask for the answer from the notes so far
+                        print(f"Reasoning cap of {stream.cap} tokens reached, answering from the notes so far")
+                        self._stream(url, self._build_payload(model_name, stream.continuation(prompt), True,
+                                                              options, context, False), stream, token, timeout)
+                return stream, backend
+            except requests.exceptions.ConnectionError as e:
+                self.pool.mark_down(backend, e)
+                tried.add(backend.url)
+
+    def _generate(self, model_name: str, prompt: str, token, context: Optional[List[int]],
+                  options: dict) -> Optional[Dict]:
+        try:
+            with self.scheduler.slot(model_name, token=token):
+                print("Generating response...")
+                with tracing.span("ollama_generate", model=model_name, continued=bool(context),
+                                  prompt_bytes=len(prompt.encode("utf-8"))) as s:
+                    timeout = token.timeout(120) if token else 120
+                    stream, backend = self._stream_with_failover(model_name, prompt, context, options,
+                                                                 token, timeout)
+                    s.set(prompt_tokens=stream.result.get("prompt_eval_count"),
+                          output_tokens=stream.result.get("eval_count"),
+                          visible_tokens=stream.visible, hidden_tokens=stream.hidden,
+                          reasoning_capped=stream.capped,
+                          continuation_prompt_tokens=stream.continuation_prompt_tokens, backend=backend.url)
+
+            self._record_stats(stream.result)
+            self._record_tokens(model_name, stream)
+            return {"response": stream.text() or "No response from model", "context": stream.result.get("context")}
             
-            result = response.json()
-            return result.get("response", "No response from model")
-            
+        except RequestCancelled as e:
+            print(f"Ollama generation stopped: {e.reason}")
+            raise
+        except GenerationQueueFull as e:
+            print(f"Ollama request rejected: {e}")
+            raise
         except requests.exceptions.Timeout:
             print("Ollama request timed out")
             return None
@@ -54,7 +325,178 @@ class OllamaClient:
         except Exception as e:
             print(f"Ollama error: {e}")
             return None
+
+    async def async_send_prompt(self, model_name: str, prompt: str, trace=None, token=None,
+                                **options) -> Optional[str]:
+        """Async variant of send_prompt for the ASGI server"""
+        result = await self.async_generate(model_name, prompt, trace=trace, token=token, **options)
+        return result["response"] if result else None
+
+    async def async_generate(self, model_name: str, prompt: str, trace=None, token=None,
+                             context: Optional[List[int]] = None, **options) -> Optional[Dict]:
+        """
+        Async variant of generate for the ASGI server
+
+        The response is streamed, so cancelling the awaiting task closes the
+        connection and Ollama stops generating instead of finishing unseen work.
+        Raises GenerationQueueFull if the scheduler does not admit the request.
+        """
+        return await self.inflight.do_async(
+            self._flight_key(model_name, prompt, context, options),
+            lambda: self._async_generate(model_name, prompt, trace, token, context, options),
+            token=token, copy=lambda result: dict(result) if result else result
+        )
+
+    async def _async_stream(self, url: str, payload: dict, stream: "_GenerationStream", token, timeout):
+        # Cancelling the task closes the connection, also while Ollama is still prefilling
+        task, loop = asyncio.current_task(), asyncio.get_running_loop()
+        streaming, cancelled_by_token = True, False
+
+        def cancel_task():
+            # Runs on the loop, so it can't hit the task after the stream is finished
+            nonlocal cancelled_by_token
+            if streaming:
+                cancelled_by_token = True
+                task.cancel()
+
+        try:
+            with token.on_cancel(lambda: loop.call_soon_threadsafe(cancel_task)) if token else nullcontext():
+                async with self.async_client.stream("POST", url, json=payload, timeout=timeout) as response:
+                    response.raise_for_status()
+                    async for line in response.aiter_lines():
+                        if token:
+                            token.check()
+                        if line and not stream.feed(json.loads(line)):
+                            break
+        except asyncio.CancelledError:
+            if not cancelled_by_token:
+                raise
+            task.uncancel()
+            raise RequestCancelled(token.reason) from None
+        finally:
+            streaming = False
+
+    async def _async_stream_with_failover(self, model_name: str, prompt: str, context: Optional[List[int]],
+                                          options: dict, token, timeout):
+        import httpx
+
+        think = self.thinking.get(model_name)
+        payload = self._build_payload(model_name, prompt, True, options, context, think)
+        tried = set()
+        while True:
+            backend = self.pool.choose(model_name, exclude=tried)
+            if backend is None:
+                raise httpx.ConnectError(f"No Ollama server reachable for {model_name}")
+            stream = _GenerationStream(reasoning_cap(think))
+            url = f"{backend.url}/api/generate"
+            try:
+                with self.pool.use(backend, model_name):
+                    await self._async_stream(url, payload, stream, token, timeout)
+                    if stream.capped:
+                        print(f"Reasoning cap of {stream.cap} tokens reached, answering from the notes so far")
+                        await self._async_stream(url, self._build_payload(model_name, stream.continuation(prompt),
+                                                                          True, options, context, False),
+                                                 stream, token, timeout)
+                return stream, backend
+            except httpx.ConnectError as e:
+                self.pool.mark_down(backend, e)
+                tried.add(backend.url)
+
+    async def _async_generate(self, model_name: str, prompt: str, trace, token, context: Optional[List[int]],
+                              options: dict) -> Optional[Dict]:
+        import httpx
+
+        if self.async_client is None:
+            self.async_client = httpx.AsyncClient(timeout=httpx.Timeout(120, connect=5))
+
+        start = time.perf_counter()
+        try:
+            async with self.scheduler.async_slot(model_name, token=token):
+                print("Generating response...")
+                start = time.perf_counter()
+                timeout = token.timeout(120) if token else 120
+                stream, backend = await self._async_stream_with_failover(model_name, prompt, context, options,
+                                                                         token, timeout)
+
+            final = stream.result
+            tracing.record("ollama_generate", time.perf_counter() - start, trace=trace, model=model_name,
+                           continued=bool(context), prompt_bytes=len(prompt.encode("utf-8")),
+                           prompt_tokens=final.get("prompt_eval_count"),
+                           output_tokens=final.get("eval_count"),
+                           visible_tokens=stream.visible, hidden_tokens=stream.hidden,
+                           reasoning_capped=stream.capped,
+                           continuation_prompt_tokens=stream.continuation_prompt_tokens, backend=backend.url)
+            self._record_stats(final, trace=trace)
+            self._record_tokens(model_name, stream)
+            return {"response": stream.text() or "No response from model", "context": final.get("context")}
+
+        except (asyncio.CancelledError, RequestCancelled):
+            print("Ollama generation cancelled")
+            tracing.record("ollama_generate", time.perf_counter() - start, trace=trace,
+                           model=model_name, cancelled=True)
+            raise
+        except GenerationQueueFull as e:
+            print(f"Ollama request rejected: {e}")
+            raise
+        except httpx.TimeoutException:
+            print("Ollama request timed out")
+            return None
+        except httpx.ConnectError:
+            print("Could not connect to Ollama server")
+            return None
+        except Exception as e:
+            print(f"Ollama error: {e}")
+            return None
+
+    def _pull_on_backends(self, model: str, token=None) -> bool:
+        """
+        Pull model through the HTTP API on every pool server known not to have it
+
+        Each pull waits at most 10 minutes, or until the token's deadline; a
+        server whose pull fails is marked down so requests route around it.
+        """
+        ok = True
+        for backend in self.pool.missing_model(model):
+            if token:
+                token.check()
+            print(f"Pulling missing Ollama model {model} on {backend.url}")
+            try:
+                timeout = token.timeout(600) if token else 600
+                response = self.session.post(f"{backend.url}/api/pull", json={"model": model, "stream": False},
+                                             timeout=(5, max(timeout, 0.05)))
+                response.raise_for_status()
+                self.pool.mark_available(backend, model)
+            except requests.exceptions.RequestException as e:
+                # A pull cut short by the deadline is a cancellation, not a server failure
+                if token:
+                    token.check()
+                print(f"Failed to pull model {model} on {backend.url}: {e}")
+                self.pool.mark_down(backend, e)
+                ok = False
+        return ok
+
+    def _record_tokens(self, model_name: str, stream: "_GenerationStream"):
+        with self._stats_lock:
+            stats = self.token_stats.setdefault(model_name, {"requests": 0, "visible_tokens": 0,
+                                                             "hidden_tokens": 0, "reasoning_capped": 0,
+                                                             "continuation_prompt_tokens": 0})
+            stats["requests"] += 1
+            stats["visible_tokens"] += stream.visible
+            stats["hidden_tokens"] += stream.hidden
+            stats["reasoning_capped"] += int(stream.capped)
+            stats["continuation_prompt_tokens"] += stream.continuation_prompt_tokens
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Visible versus reasoning token counts per model"""
+        with self._stats_lock:
+            models = {}
+            for model, stats in self.token_stats.items():
+                total = stats["visible_tokens"] + stats["hidden_tokens"]
+                models[model] = {**stats, "thinking": self.thinking.get(model),
+                                 "hidden_share": stats["hidden_tokens"] / total if total else 0.0}
+            return {"models": models}
     
+
     def check_connection(self, model_name: str) -> bool:
         """Check Ollama and model is available."""
         try:
@@ -94,8 +536,10 @@ class OllamaClient:
         except Exception:
             return []
     
-    def pull_model(self, model: str) -> bool:
-        """Pull model from Ollama"""
+    def pull_model(self, model: str, token=None) -> bool:
+        """Pull model from Ollama; with a server pool, token bounds how long each pull may take"""
+        if len(self.pool) > 1:
+            return self._pull_on_backends(model, token)
         try:
             result = subprocess.run(["ollama", "list", "--json"], capture_output=True, text=True, check=True)
             installed = [m["model"] for m in json.loads(result.stdout)]
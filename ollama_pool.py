@@ -0,0 +1,147 @@
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional, List, Dict, Any, Set
+
+import requests
+
+
+class OllamaBackend:
+    """One Ollama server in the pool and what it is known to have loaded"""
+
+    def __init__(self, url: str):
+        self.url = url.rstrip('/')
+        self.healthy = True
+        self.outstanding = 0
+        self.completed = 0
+        self.failures = 0
+        self.loaded_models: Set[str] = set()
+        self.available_models: Optional[Set[str]] = None
+        self.checked_at: Optional[float] = None
+
+
+class OllamaPool:
+    """
+    Ollama Pool Module
+    Routes generations across several Ollama servers. A request goes to the
+    healthy server with the fewest outstanding requests, preferring servers
+    that already have the model loaded unless they are busier than a cold one
+    by more than affinity_slack. Servers are health-checked in the background
+    and taken out of rotation on connection errors until they answer again.
+    """
+
+    def __init__(self, urls: List[str], check_interval: float = 15.0, affinity_slack: int = 2):
+        if not urls:
+            raise ValueError("OllamaPool needs at least one URL")
+        self.backends = [OllamaBackend(url) for url in urls]
+        self.check_interval = check_interval
+        self.affinity_slack = affinity_slack
+        self.session = requests.Session()
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+        if len(self.backends) > 1:
+            self._thread = threading.Thread(target=self._health_loop, name="ollama-health", daemon=True)
+            self._thread.start()
+
+    def __len__(self) -> int:
+        return len(self.backends)
+
+    # ---------------------------Health---------------------------
+    def check(self, backend: OllamaBackend):
+        """Refresh one server's health and its loaded and available models"""
+        try:
+            running = self.session.get(f"{backend.url}/api/ps", timeout=2)
+            running.raise_for_status()
+            tags = self.session.get(f"{backend.url}/api/tags", timeout=2)
+            tags.raise_for_status()
+        except requests.exceptions.RequestException as e:
+            with self._lock:
+                if backend.healthy:
+                    print(f"[OllamaPool] {backend.url} is down: {e}")
+                backend.healthy = False
+                backend.checked_at = time.monotonic()
+            return
+        with self._lock:
+            if not backend.healthy:
+                print(f"[OllamaPool] {backend.url} is back")
+            backend.healthy = True
+            backend.loaded_models = {m.get("name") or m.get("model") for m in running.json().get("models", [])}
+            backend.available_models = {m.get("name") or m.get("model") for m in tags.json().get("models", [])}
+            backend.checked_at = time.monotonic()
+
+    def _health_loop(self):
+        while not self._stopped.is_set():
+            for backend in self.backends:
+                self.check(backend)
+            self._stopped.wait(self.check_interval)
+
+    def mark_down(self, backend: OllamaBackend, error: Exception):
+        with self._lock:
+            backend.failures += 1
+            if len(self.backends) > 1:
+                backend.healthy = False
+        print(f"[OllamaPool] {backend.url} failed, routing around it: {error}")
+
+    # ---------------------------Routing---------------------------
+    def choose(self, model: str, exclude: Optional[Set[str]] = None) -> Optional[OllamaBackend]:
+        """The server to send the next request for model to, or None if every server was tried"""
+        exclude = exclude or set()
+        with self._lock:
+            candidates = [b for b in self.backends if b.url not in exclude]
+            # With every server marked down, try them anyway rather than fail outright
+            healthy = [b for b in candidates if b.healthy] or candidates
+            if not healthy:
+                return None
+            coldest = min(healthy, key=lambda b: b.outstanding)
+            warm = [b for b in healthy if model in b.loaded_models]
+            if warm:
+                best_warm = min(warm, key=lambda b: b.outstanding)
+                if best_warm.outstanding <= coldest.outstanding + self.affinity_slack:
+                    return best_warm
+            return coldest
+
+    @contextmanager
+    def use(self, backend: OllamaBackend, model: str):
+        """Count an outstanding request on backend; the model is loaded there afterwards"""
+        with self._lock:
+            backend.outstanding += 1
+        ok = False
+        try:
+            yield backend
+            ok = True
+        finally:
+            with self._lock:
+                backend.outstanding -= 1
+                if ok:
+                    backend.completed += 1
+                    backend.loaded_models.add(model)
+
+    def missing_model(self, model: str) -> List[OllamaBackend]:
+        """Healthy servers known not to have model pulled"""
+        with self._lock:
+            return [b for b in self.backends
+                    if b.healthy and b.available_models is not None and model not in b.available_models]
+
+    def mark_available(self, backend: OllamaBackend, model: str):
+        with self._lock:
+            if backend.available_models is not None:
+                backend.available_models.add(model)
+
+    def get_metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "backends": {
+                    b.url: {
+                        "healthy": b.healthy,
+                        "outstanding": b.outstanding,
+                        "completed": b.completed,
+                        "failures": b.failures,
+                        "loaded_models": sorted(m for m in b.loaded_models if m),
+                    }
+                    for b in self.backends
+                }
+            }
+
+    def shutdown(self):
+        self._stopped.set()
@@ -0,0 +1,123 @@
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Optional, List, Dict, Any
+
+from cancellation import CancellationToken, RequestCancelled
+
+
+class Prefetcher:
+    """
+    Prefetcher Module
+    After an answer, warms the article and OSDR caches for the papers a
+    follow-up is likely to need: the next-ranked titles for the session's
+    keywords that were not already cited. Runs on one background thread
+    only while no live request is retrieving, is interrupted as soon as one
+    starts, and fetches at most max_articles_per_minute articles.
+    """
+
+    def __init__(self, rag_processor, max_papers: int = 4, max_articles_per_minute: int = 12):
+        self.rag = rag_processor
+        self.max_papers = max_papers
+        self.max_articles_per_minute = max_articles_per_minute
+
+        self._pending: Optional[Dict[str, Any]] = None
+        self._live = 0
+        self._token: Optional[CancellationToken] = None
+        self._fetched_at: deque = deque()
+        self._cond = threading.Condition()
+        self.stats = {"scheduled": 0, "runs": 0, "articles_prefetched": 0, "already_cached": 0,
+                      "interrupted": 0, "over_budget": 0}
+
+        self._thread = threading.Thread(target=self._loop, name="prefetcher", daemon=True)
+        self._thread.start()
+
+    def schedule(self, keywords: List[str], cited_links: List[str]):
+        """Queue a prefetch for these keywords; only the latest answer's prefetch is kept"""
+        if not keywords:
+            return
+        with self._cond:
+            self._pending = {"keywords": list(keywords), "cited": set(cited_links)}
+            self.stats["scheduled"] += 1
+            self._cond.notify()
+
+    @contextmanager
+    def live(self):
+        """Mark a live request's retrieval; any running prefetch stops at its next check"""
+        with self._cond:
+            self._live += 1
+            if self._token is not None:
+                self._token.cancel("live request")
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._live -= 1
+                self._cond.notify()
+
+    # ---------------------------Worker---------------------------
+    def _loop(self):
+        while True:
+            with self._cond:
+                while self._pending is None or self._live:
+                    self._cond.wait()
+                job, self._pending = self._pending, None
+                self._token = token = CancellationToken()
+            try:
+                self._run(job, token)
+            except RequestCancelled:
+                with self._cond:
+                    self.stats["interrupted"] += 1
+                    # Try again once the live request is done, unless a newer answer replaced it
+                    if self._pending is None:
+                        self._pending = job
+            except Exception as e:
+                print(f"[Prefetcher] Prefetch failed: {e}")
+            finally:
+                with self._cond:
+                    self._token = None
+
+    def _budget(self) -> int:
+        """Articles that may still be fetched in the current minute"""
+        now = time.monotonic()
+        while self._fetched_at and self._fetched_at[0] < now - 60:
+            self._fetched_at.popleft()
+        return self.max_articles_per_minute - len(self._fetched_at)
+
+    def _run(self, job: Dict[str, Any], token: CancellationToken):
+        with self._cond:
+            self.stats["runs"] += 1
+        keywords = job["keywords"]
+
+        # OSDR results are tiny and cached per keyword; the mirror answers them locally
+        for keyword in keywords:
+            token.check()
+            self.rag.osdr.search_studies(keyword=keyword, max_results=2, token=token)
+
+        ranked = self.rag.corpus.search(keywords, max_results=len(job["cited"]) + self.max_papers, token=token)
+        links = [item["link"] for item in ranked if item["link"] not in job["cited"]][:self.max_papers]
+        if self.rag.digests:
+            # Papers with a digest are never fetched for the prompt
+            digested = self.rag.digests.get_many(links)
+            links = [link for link in links if link not in digested]
+        missing = self.rag.ncbi.uncached(links)
+        with self._cond:
+            budget = self._budget()
+            self.stats["already_cached"] += len(links) - len(missing)
+            if len(missing) > budget:
+                self.stats["over_budget"] += len(missing) - max(0, budget)
+        missing = missing[:max(0, budget)]
+        if not missing:
+            return
+
+        self.rag.ncbi.prefetch(missing, token=token)
+        with self._cond:
+            now = time.monotonic()
+            self._fetched_at.extend(now for _ in missing)
+            self.stats["articles_prefetched"] += len(missing)
+        print(f"[Prefetcher] Warmed {len(missing)} article(s) for {keywords[:3]}")
+
+    def get_metrics(self) -> Dict[str, Any]:
+        with self._cond:
+            return {**self.stats, "pending": self._pending is not None, "articles_budget_left": self._budget()}
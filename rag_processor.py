@@ -5,18 +5,31 @@ from sklearn.metrics.pairwise import cosine_similarity
 from typing import List, Dict, Optional, Tuple
 from scraper.ncbi_search import NCBISearch
 from scraper.osdr_search import NASAOSDRSearch
+from scraper.osdr_mirror import OSDRMirror
+from scraper.corpus import CorpusRegistry
+from scraper.digest_store import DigestStore
 import numpy as np
-import execjs
+import os
+import tracing
 
 class RAGProcessor:
 
-    def __init__(self):
+    def __init__(self, osdr_mirror: Optional[OSDRMirror] = None, extra_corpora: Optional[List[str]] = None,
+                 digests: Optional[DigestStore] = None):
         nltk.download('stopwords')
         nltk.download('punkt_tab')
         self.ncbi = NCBISearch()
-        self.osdr = NASAOSDRSearch()
+        self.osdr = NASAOSDRSearch(mirror=osdr_mirror)
+        self.csv_path = os.path.join("data", "csv", "SB_publication_PMC.csv")
+        # Publication titles searched for each question; extra CSV exports are sharded alongside
+        self.corpus = CorpusRegistry()
+        self.corpus.register("SB_publication_PMC", self.csv_path)
+        for path in extra_corpora or []:
+            self.corpus.register(os.path.splitext(os.path.basename(path))[0], path)
         self.ncbi_queries: List[str] = []
         self.osdr_queries: List[str] = []
+        # Digest mode: papers with a precomputed digest are cited by it instead of raw sections
+        self.digests = digests
         
         # Conversation history tracking
         self.conversation_history: List[Dict[str, str]] = []
@@ -126,6 +139,32 @@ class RAGProcessor:
         self.conversation_history = []
         self.last_keywords = []
         self.last_topic = None
+
+    def context_key(self, prompt: str) -> str:
+        """
+        The conversation context search() would fold into this prompt's retrieval
+
+        Empty for a standalone question; otherwise the merged prompt and the
+        carried-over keywords, so cached answers are only reused for the same context.
+        """
+        use_context, processed_prompt = self._should_use_context(prompt)
+        if not use_context:
+            return ""
+        carried = ",".join(sorted(self.last_keywords[:3]))
+        return f"{processed_prompt}\n{carried}"
+
+    def record_cached_turn(self, prompt: str, keywords: List[str], ncbi_queries: List[Dict],
+                           osdr_queries: List[Dict]):
+        """Update history and report state for a turn served from the answer cache"""
+        self._update_conversation_history(prompt, keywords)
+        self.ncbi_queries = ncbi_queries
+        self.osdr_queries = osdr_queries
+
+    def corpus_version(self) -> str:
+        """Content hash of the registered publication corpora, and the digest model when digests are used"""
+        if self.digests:
+            return f"{self.corpus.version()}+digests:{self.digests.model}"
+        return self.corpus.version()
         
     ##---------------------------Keyword Processing---------------------------
     def _text_extraction(self, User_Input: str) -> List[str]:
@@ -182,11 +221,22 @@ class RAGProcessor:
     def _format(self, title, abstract, section_name, section_value) -> str:
         return f"\nPossible Relevant Paper: {title}\n{section_name}: {section_value}\nContent: {abstract}\n"
 
+    def _format_digest(self, title, digest) -> str:
+        return f"\nPossible Relevant Paper: {title}\n{digest}\n"
+
+    def _fetch_sections(self, links: List[str], sections: List[str], token=None) -> Dict[str, Dict[str, str]]:
+        with tracing.span("section_fetch", papers=len(links), sections=len(sections)) as s:
+            texts = self.ncbi.get_sections_many(links, sections, token=token)
+            s.set(bytes=sum(len(t.encode('utf-8')) for paper in texts.values() for t in paper.values() if t))
+        return texts
+
     ##---------------------------Query Search---------------------------
-    def query_search(self, keywords: List[str], category: Optional[str] = None):
+    def query_search(self, keywords: List[str], category: Optional[str] = None, token=None):
         
         #----------------NCBI Search----------------
-        q = self.ncbi.search(keywords=keywords, csv_path="data\csv\SB_publication_PMC.csv", max_results=10)
+        with tracing.span("ncbi_search", keywords=len(keywords)) as s:
+            q = self.corpus.search(keywords, max_results=10, token=token)
+            s.set(results=len(q))
         #queries with the highest match scores
         if q:
             max_score = max(item['match_score'] for item in q)
@@ -196,7 +246,9 @@ class RAGProcessor:
         
         #----------------NASA OSDR Search----------------
         for i in range(len(keywords)):
-            o_q = self.osdr.search_studies(keyword=keywords[i], max_results=2)
+            with tracing.span("osdr_search", keyword=keywords[i]) as s:
+                o_q = self.osdr.search_studies(keyword=keywords[i], max_results=2, token=token)
+                s.set(results=len(o_q))
             if o_q:
                 max_o_score = max(item['score'] for item in o_q)
                 top_o_queries = [item for item in o_q if item['score'] == max_o_score]
@@ -228,25 +280,40 @@ class RAGProcessor:
 
         #----------------Format for RAG----------------
         rag_output = "This is an English Text, reply in English. Use relevant papers to answer the question. If question is not in papers, then mention that your answer is general knowledge and may be incorrect. Be as detailed as you can when referencing or summarizing papers. If salutations and such, answer politely.\n"
+        # One batched fetch for every tied top-scoring paper
+        sections = ["Abstract", "Results"] + ([category] if category else [])
+        links = [query['link'] for query in self.ncbi_queries]
+        digests = {}
+        if self.digests and links and not category:
+            with tracing.span("digest_lookup", papers=len(links)) as s:
+                digests = self.digests.get_many(links)
+                s.set(hits=len(digests))
+        # Only papers without a digest need their sections fetched
+        links = [link for link in links if link not in digests]
+        texts = self._fetch_sections(links, sections, token) if links else {}
         for query in self.ncbi_queries:
-            abstract = self.ncbi.get_section(url=query['link'], section="Abstract")
-            results = self.ncbi.get_section(url=query['link'], section="Results")
+            if query['link'] in digests:
+                rag_output += self._format_digest(query['title'], digests[query['link']])
+                continue
+            abstract = texts[query['link']]["Abstract"]
+            results = texts[query['link']]["Results"]
             c = None
             if category:
-                c = self.ncbi.get_section(url=query['link'], section=category)
+                c = texts[query['link']][category]
             if abstract:
                 rag_output += self._format(query['title'], abstract, category, c)
                 rag_output += self._format(query['title'], results, category, c)
 
         return rag_output
 
-    def search(self, prompt: str, force_new_topic: bool = False):
+    def search(self, prompt: str, force_new_topic: bool = False, token=None):
         """
         Main search function with context awareness
         
         Args:
             prompt: User's query
             force_new_topic: If True, ignores context and starts fresh
+            token: Optional CancellationToken checked before every remote call
         """
         if force_new_topic:
             self.clear_context()
@@ -258,7 +325,8 @@ class RAGProcessor:
             print(f"[Context Mode] Detected follow-up question")
             print(f"[Context Mode] Merged prompt: {processed_prompt}")
             # Use previous keywords combined with new ones
-            keywords = self._text_extraction(processed_prompt)
+            with tracing.span("keyword_extraction", context=True):
+                keywords = self._text_extraction(processed_prompt)
             
             # Optionally blend with last keywords for continuity
             if self.last_keywords:
@@ -266,7 +334,8 @@ class RAGProcessor:
                 print(f"[Context Mode] Blended keywords: {keywords[:5]}")
         else:
             print(f"[New Topic Mode] Processing as new query")
-            keywords = self._text_extraction(prompt)
+            with tracing.span("keyword_extraction", context=False):
+                keywords = self._text_extraction(prompt)
         
         print(f"[Keywords] Extracted: {keywords[:5] if len(keywords) > 5 else keywords}")
         
@@ -274,7 +343,7 @@ class RAGProcessor:
         self._update_conversation_history(prompt, keywords)
         
         # Perform search
-        r = self.query_search(keywords)
+        r = self.query_search(keywords, token=token)
         
         # Return original prompt with RAG context
         # The LLM needs the original question, not the merged one
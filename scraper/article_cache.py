@@ -0,0 +1,81 @@
+import threading
+from collections import OrderedDict
+from typing import Optional, Dict, Iterable, Any
+
+
+class ArticleCache:
+    """
+    In-memory LRU cache of fetched PMC articles
+    Values are the article's XML text keyed by numeric PMCID, so one efetch
+    serves every later section lookup for that paper. With a store, articles
+    live in a SQLite table shared by every server process instead.
+    """
+
+    def __init__(self, max_articles: int = 256, store=None):
+        self.max_articles = max_articles
+        self.store = store
+        self.articles: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, pmcid_num: str) -> Optional[str]:
+        if self.store is not None:
+            return self.store.get(pmcid_num)
+        with self._lock:
+            xml = self.articles.get(pmcid_num)
+            if xml is not None:
+                self.articles.move_to_end(pmcid_num)
+            return xml
+
+    def put(self, pmcid_num: str, xml: str):
+        if self.store is not None:
+            self.store.put(pmcid_num, xml)
+            return
+        with self._lock:
+            self.articles[pmcid_num] = xml
+            self.articles.move_to_end(pmcid_num)
+            while len(self.articles) > self.max_articles:
+                self.articles.popitem(last=False)
+
+    def missing(self, pmcid_nums: Iterable[str], count: bool = True) -> list:
+        """PMCIDs not yet cached, in order and without duplicates; updates hit/miss counts unless count is False"""
+        unique = list(dict.fromkeys(pmcid_nums))
+        cached = self.store.existing(unique) if self.store is not None else None
+        with self._lock:
+            missing = [p for p in unique if p not in (cached if cached is not None else self.articles)]
+            if count:
+                self.hits += len(unique) - len(missing)
+                self.misses += len(missing)
+            return missing
+
+    def get_metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "articles": self.store.count() if self.store is not None else len(self.articles),
+                "max_articles": self.max_articles,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+_shared_cache: Optional[ArticleCache] = None
+_shared_lock = threading.Lock()
+
+
+def set_shared_article_cache(cache: ArticleCache):
+    """Replace the process-wide cache, e.g. with a SQLite-backed one before any scraper is built"""
+    global _shared_cache
+    with _shared_lock:
+        _shared_cache = cache
+
+
+def shared_article_cache() -> ArticleCache:
+    """The process-wide article cache used by every NCBISearch instance"""
+    global _shared_cache
+    with _shared_lock:
+        if _shared_cache is None:
+            _shared_cache = ArticleCache()
+        return _shared_cache
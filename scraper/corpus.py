@@ -0,0 +1,161 @@
+import hashlib
+import heapq
+import json
+import os
+import threading
+from typing import List, Dict, Optional, Tuple
+
+from scraper.publication_table import PublicationTable, FORMAT_VERSION
+from scraper.fuzzy_scoring import rank_titles
+
+# Tables already mapped by this process, keyed by shard directory
+_mapped_shards: Dict[str, PublicationTable] = {}
+_mapped_lock = threading.Lock()
+
+
+def search_shard(table_dir: str, source_stat: List[float], keywords: List[str], max_results: int) -> List[Dict]:
+    """
+    Rank one shard from its read-only mapping, loading it on first use
+
+    A paper listed twice in the CSV is returned once, before truncating, so
+    the shard still yields max_results distinct links when it has them.
+    """
+    with _mapped_lock:
+        table = _mapped_shards.get(table_dir)
+        if table is None or table.source_stat != source_stat:
+            table = PublicationTable.load(table_dir)
+            _mapped_shards[table_dir] = table
+    results, seen = [], set()
+    for item in rank_titles(table, keywords, len(table)):
+        if item["link"] in seen:
+            continue
+        seen.add(item["link"])
+        results.append(item)
+        if len(results) == max_results:
+            break
+    return results
+
+
+class CorpusSource:
+    """One publication CSV (Title and Link columns) and the shard tables built from it"""
+
+    def __init__(self, name: str, csv_path: str):
+        self.name = name
+        self.csv_path = csv_path
+        self.source_stat: Optional[List[float]] = None
+        self.shard_dirs: List[str] = []
+        self.digest: Optional[str] = None
+
+
+class CorpusRegistry:
+    """
+    Registry of publication corpora
+    Each registered CSV is split into memory-mapped shards of at most
+    shard_rows titles, rebuilt only when their CSV changes. A search ranks
+    every shard and merges the per-shard top results.
+    """
+
+    def __init__(self, shard_rows: int = 20000):
+        self.shard_rows = shard_rows
+        self.sources: Dict[str, CorpusSource] = {}
+        self._lock = threading.Lock()
+
+    def register(self, name: str, csv_path: str):
+        with self._lock:
+            self.sources[name] = CorpusSource(name, csv_path)
+        print(f"[CorpusRegistry] Registered corpus '{name}' at {csv_path}")
+
+    # ---------------------------Shards---------------------------
+    def _refresh(self, source: CorpusSource):
+        """(Re)build the source's shards if its CSV changed"""
+        try:
+            stat = os.stat(source.csv_path)
+        except OSError:
+            if source.shard_dirs or source.source_stat is None:
+                print(f"[CorpusRegistry] Corpus '{source.name}' not found at {source.csv_path}")
+            source.source_stat, source.shard_dirs, source.digest = [], [], None
+            return
+        source_stat = [stat.st_mtime, stat.st_size]
+        if source.source_stat == source_stat:
+            return
+
+        table_root = PublicationTable.table_dir_for(source.csv_path)
+        manifest_path = os.path.join(table_root, "shards.json")
+        try:
+            with open(manifest_path, encoding='utf-8') as f:
+                manifest = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            manifest = {}
+
+        if (manifest.get("source_stat") != source_stat or manifest.get("shard_rows") != self.shard_rows
+                or manifest.get("format") != FORMAT_VERSION):
+            titles, links = PublicationTable.read_csv(source.csv_path)
+            if len(titles) <= self.shard_rows:
+                shards = ["."]
+            else:
+                shards = [f"shard-{i:03d}" for i in range((len(titles) + self.shard_rows - 1) // self.shard_rows)]
+            for i, shard in enumerate(shards):
+                start = i * self.shard_rows
+                PublicationTable.write(os.path.join(table_root, shard), titles[start:start + self.shard_rows],
+                                       links[start:start + self.shard_rows], source_stat, source=source.csv_path)
+            manifest = {"format": FORMAT_VERSION, "source_stat": source_stat, "shard_rows": self.shard_rows,
+                        "shards": shards}
+            temp_path = f"{manifest_path}.tmp"
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(manifest, f)
+            os.replace(temp_path, manifest_path)
+
+        source.shard_dirs = [os.path.normpath(os.path.join(table_root, shard)) for shard in manifest["shards"]]
+        source.source_stat = source_stat
+        source.digest = None
+
+    def shards(self) -> List[Tuple[str, List[float]]]:
+        """(table_dir, source_stat) for every shard of every registered corpus"""
+        with self._lock:
+            shards = []
+            for source in self.sources.values():
+                self._refresh(source)
+                shards.extend((table_dir, source.source_stat) for table_dir in source.shard_dirs)
+            return shards
+
+    def version(self) -> str:
+        """Content hash over every registered CSV, recomputed only when a file changes"""
+        self.shards()
+        with self._lock:
+            combined = hashlib.sha256()
+            available = [self.sources[name] for name in sorted(self.sources) if self.sources[name].shard_dirs]
+            for source in available:
+                if source.digest is None:
+                    with open(source.csv_path, 'rb') as f:
+                        source.digest = hashlib.sha256(f.read()).hexdigest()
+                combined.update(f"{source.name}:{source.digest}\n".encode("utf-8"))
+            return combined.hexdigest()[:16] if available else "missing"
+
+    # ---------------------------Search---------------------------
+    def search(self, keywords: List[str], max_results: int = 10, token=None) -> List[Dict]:
+        """
+        Fuzzy title search across every shard
+
+        Each shard returns its own top max_results distinct links in
+        (score desc, title) order, so a k-way merge of those lists gives the global ranking.
+        Papers present in several corpora are returned once.
+        """
+        if token:
+            token.check()
+        # Scoring runs SequenceMatcher under the GIL, so shards are ranked inline;
+        # serve_workers.py processes are what spread searches over the cores
+        ranked = []
+        for table_dir, stat in self.shards():
+            ranked.append(search_shard(table_dir, stat, keywords, max_results))
+            if token:
+                token.check()
+
+        results, seen = [], set()
+        for item in heapq.merge(*ranked, key=lambda x: (-x["match_score"], x["title"])):
+            if item["link"] in seen:
+                continue
+            seen.add(item["link"])
+            results.append(item)
+            if len(results) == max_results:
+                break
+        return results
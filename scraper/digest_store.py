@@ -0,0 +1,53 @@
+import os
+import re
+from typing import Optional, Dict, List
+
+from shared_store import SQLiteStore
+
+# Bump when the digest prompt changes so old digests are not mixed with new ones
+DIGEST_VERSION = 1
+DEFAULT_DIGEST_MODEL = "llama3.2:3b"
+DEFAULT_DIGEST_DB = os.path.join("data", "digests", "digests.sqlite3")
+
+
+class DigestStore:
+    """
+    Digest Store Module
+    Compact per-paper digests (key findings, organism, conditions) built
+    offline by data/build_digests.py. Digests are keyed by PMCID and
+    versioned by the model and prompt version that produced them, so
+    switching the digest model never serves another model's summaries.
+    """
+
+    def __init__(self, path: str = DEFAULT_DIGEST_DB, model: str = DEFAULT_DIGEST_MODEL):
+        self.path = path
+        self.model = model
+        # Digests never expire and the corpus is bounded, so eviction is effectively off
+        self.store = SQLiteStore(path, "digests", max_entries=10_000_000)
+
+    def _key(self, link: str) -> str:
+        match = re.search(r"PMC(\d+)", link)
+        return f"{self.model}|v{DIGEST_VERSION}|{match.group(1) if match else link}"
+
+    def get(self, link: str) -> Optional[str]:
+        return self.store.get(self._key(link))
+
+    def get_many(self, links: List[str]) -> Dict[str, str]:
+        """{link: digest} for the papers that have one"""
+        keys = {link: self._key(link) for link in links}
+        present = self.store.existing(keys.values())
+        digests = {}
+        for link, key in keys.items():
+            if key in present:
+                digest = self.store.get(key)
+                if digest:
+                    digests[link] = digest
+        return digests
+
+    def missing(self, links: List[str]) -> List[str]:
+        keys = {link: self._key(link) for link in links}
+        present = self.store.existing(keys.values())
+        return [link for link, key in keys.items() if key not in present]
+
+    def put(self, link: str, digest: str):
+        self.store.put(self._key(link), digest)
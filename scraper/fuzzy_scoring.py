@@ -0,0 +1,64 @@
+import difflib
+from typing import List, Dict
+
+import numpy as np
+
+from scraper.publication_table import PublicationTable
+
+# A title word counts as a fuzzy hit when SequenceMatcher(None, keyword, word).ratio() exceeds this
+FUZZY_THRESHOLD = 0.75
+
+
+def similar_words(table: PublicationTable, keyword: str, threshold: float = FUZZY_THRESHOLD) -> np.ndarray:
+    """
+    Boolean mask over the table vocabulary of words whose SequenceMatcher
+    ratio against keyword exceeds threshold
+
+    ratio is 2 * matches / (len(keyword) + len(word)), and matches can exceed
+    neither the shorter length nor the shared character counts, so both
+    bounds prune the vocabulary with array ops. Only the survivors go through
+    SequenceMatcher, which keeps the result identical to comparing every word.
+    """
+    mask = np.zeros(len(table.vocab), dtype=bool)
+    if not keyword or not len(table.vocab):
+        return mask
+
+    lengths = table.vocab_lengths
+    totals = lengths + len(keyword)
+    candidates = np.flatnonzero(2.0 * np.minimum(lengths, len(keyword)) / totals > threshold)
+
+    keyword_counts = np.zeros(len(table.alphabet), dtype=np.uint16)
+    for c in keyword:
+        if c in table.alphabet:
+            keyword_counts[table.alphabet[c]] += 1
+    shared = np.minimum(table.char_counts[candidates], keyword_counts).sum(axis=1)
+    candidates = candidates[2.0 * shared / totals[candidates] > threshold]
+
+    matcher = difflib.SequenceMatcher(None, keyword, "")
+    for word_id in candidates:
+        matcher.set_seq2(str(table.vocab[word_id]))
+        mask[word_id] = matcher.ratio() > threshold
+    return mask
+
+
+def score_titles(table: PublicationTable, keywords: List[str], threshold: float = FUZZY_THRESHOLD) -> np.ndarray:
+    """Per-title count of keywords found as a substring or as a fuzzy word match"""
+    scores = np.zeros(len(table), dtype=np.int32)
+    for kw in keywords:
+        scores += table.contains(kw) | table.rows_with_tokens(similar_words(table, kw, threshold))
+    return scores
+
+
+def rank_titles(table: PublicationTable, keywords: List[str], max_results: int = 10) -> List[Dict]:
+    """Matching titles ordered by match score, then title"""
+    scores = score_titles(table, [k.lower() for k in keywords])
+    results = [
+        {
+            "title": str(table.titles[row]),
+            "link": str(table.links[row]),
+            "match_score": int(scores[row]),
+        }
+        for row in np.flatnonzero(scores)
+    ]
+    results.sort(key=lambda x: (-x["match_score"], x["title"]))
+    return results[:max_results]
@@ -0,0 +1,183 @@
+import random
+import threading
+import time
+from typing import Optional, Dict, Tuple, Union, Callable
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+# requests rejects a zero timeout, so a request right at its deadline still gets this long
+MIN_TIMEOUT = 0.05
+
+
+class TokenBucket:
+    """Client-side rate limiter: at most `rate` requests per second with bursts up to `capacity`"""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, token=None):
+        """Block until a request may be sent"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            if token:
+                token.check()
+            time.sleep(wait)
+
+
+class HTTPTransport:
+    """
+    Shared HTTP transport for the scrapers
+    Keep-alive connection pooling with a per-host connection cap, default
+    timeouts, jittered exponential backoff on 429/5xx and per-host rate limits.
+    """
+
+    def __init__(self, max_per_host: int = 4, timeout: Tuple[float, float] = (5.0, 30.0),
+                 max_retries: int = 3, backoff_base: float = 0.5, backoff_max: float = 8.0,
+                 pool_timeout: float = 30.0):
+        self.max_per_host = max_per_host
+        self.timeout = timeout
+        self.pool_timeout = pool_timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.rate_limits: Dict[str, TokenBucket] = {}
+        self._bucket_factory: Callable[[str, float], TokenBucket] = lambda host, rate: TokenBucket(rate)
+        # Per-host connection cap; unlike urllib3's pool_block, waiting for a slot is bounded
+        self._host_slots: Dict[str, threading.BoundedSemaphore] = {}
+        self._slots_lock = threading.Lock()
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=8, pool_maxsize=max_per_host)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def set_rate_limit(self, host: str, requests_per_second: float):
+        """Limit requests to host; setting the same rate again keeps the existing bucket and its accounting"""
+        bucket = self.rate_limits.get(host)
+        if bucket is None or bucket.rate != requests_per_second:
+            self.rate_limits[host] = self._bucket_factory(host, requests_per_second)
+
+    def use_bucket_factory(self, factory: Callable[[str, float], TokenBucket]):
+        """
+        Build rate limiters with factory(host, rate) from now on, e.g. buckets
+        shared by every server process; limits already set are rebuilt
+        """
+        self._bucket_factory = factory
+        for host, bucket in list(self.rate_limits.items()):
+            self.rate_limits[host] = factory(host, bucket.rate)
+
+    def clear_rate_limits(self):
+        self.rate_limits.clear()
+
+    def close(self):
+        """Close the pooled keep-alive connections"""
+        self.session.close()
+
+    def _backoff(self, attempt: int, response: Optional[requests.Response]) -> float:
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after and retry_after.isdigit():
+            return min(float(retry_after), self.backoff_max)
+        # Full jitter keeps many workers from retrying in lockstep
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def _acquire_slot(self, host: str, token=None) -> threading.BoundedSemaphore:
+        """Wait for one of host's max_per_host connections, up to pool_timeout or the token's deadline"""
+        with self._slots_lock:
+            slot = self._host_slots.setdefault(host, threading.BoundedSemaphore(self.max_per_host))
+        waited = 0.0
+        while not slot.acquire(timeout=0.25):
+            waited += 0.25
+            if token:
+                token.check()
+            if waited >= self.pool_timeout:
+                raise requests.exceptions.ConnectionError(
+                    f"No free connection to {host} after {self.pool_timeout:.0f}s")
+        return slot
+
+    @staticmethod
+    def _request_timeout(timeout: Union[float, Tuple[float, float]], token=None):
+        """timeout capped at the token's deadline, never below MIN_TIMEOUT"""
+        remaining = token.remaining() if token else None
+        if remaining is None:
+            return timeout
+        remaining = max(MIN_TIMEOUT, remaining)
+        if isinstance(timeout, tuple):
+            return min(timeout[0], remaining), min(timeout[1], remaining)
+        return min(timeout, remaining)
+
+    def get(self, url: str, params=None, timeout: Union[float, Tuple[float, float], None] = None,
+            token=None) -> requests.Response:
+        """
+        GET with pooling, rate limiting and retries
+
+        Args:
+            timeout: Overrides the default (connect, read) timeout
+            token: Optional CancellationToken; caps timeouts and backoff at its deadline
+
+        Returns the final response (callers still call raise_for_status), or
+        raises the last connection error once retries are exhausted.
+        """
+        host = urlparse(url).hostname
+        bucket = self.rate_limits.get(host)
+        timeout = timeout or self.timeout
+
+        for attempt in range(self.max_retries + 1):
+            if token:
+                token.check()
+            if bucket:
+                bucket.acquire(token)
+                # The bucket may have slept past the deadline
+                if token:
+                    token.check()
+
+            response = None
+            try:
+                slot = self._acquire_slot(host, token)
+                try:
+                    response = self.session.get(url, params=params, timeout=self._request_timeout(timeout, token))
+                finally:
+                    slot.release()
+                if response.status_code not in RETRY_STATUSES or attempt == self.max_retries:
+                    return response
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                # A timeout cut short by the deadline is a cancellation, not a network failure
+                if token:
+                    token.check()
+                if attempt == self.max_retries:
+                    raise
+                print(f"[HTTPTransport] {type(e).__name__} for {url}, retrying")
+
+            delay = self._backoff(attempt, response)
+            if response is not None:
+                print(f"[HTTPTransport] HTTP {response.status_code} from {url}, retrying in {delay:.2f}s")
+                response.close()
+            if token and token.remaining() is not None:
+                delay = min(delay, token.remaining())
+            time.sleep(delay)
+
+
+_shared_transport: Optional[HTTPTransport] = None
+_shared_lock = threading.Lock()
+
+
+def shared_transport() -> HTTPTransport:
+    """The process-wide transport used by every scraper instance"""
+    global _shared_transport
+    with _shared_lock:
+        if _shared_transport is None:
+            _shared_transport = HTTPTransport()
+        return _shared_transport
@@ -1,16 +1,28 @@
-import requests
+import os
 import re
-import csv
-import difflib
 import xml.etree.ElementTree as ET
 from typing import List, Dict, Optional
 
+from scraper.http_transport import HTTPTransport, shared_transport
+from scraper.article_cache import ArticleCache, shared_article_cache
+from scraper.publication_table import shared_table
+from scraper.fuzzy_scoring import rank_titles
+from single_flight import SingleFlight
+
 
 class NCBISearch:
-    def __init__(self, email=None, api_key=None):
+    def __init__(self, email=None, api_key=None, transport: Optional[HTTPTransport] = None,
+                 article_cache: Optional[ArticleCache] = None, batch_size: int = 100):
         self.base_url = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils/"
         self.email = email
         self.api_key = api_key
+        self.batch_size = batch_size
+        self.article_cache = article_cache or shared_article_cache()
+        self.transport = transport or shared_transport()
+        # Articles being fetched right now, so concurrent requests for the same paper share one efetch
+        self.inflight = SingleFlight("ncbi_articles")
+        # NCBI allows 3 requests/second per client, or 10 with an API key
+        self.transport.set_rate_limit("eutils.ncbi.nlm.nih.gov", 10 if api_key else 3)
 
     def _extract_pmcid_number(self, url: str) -> str:
         """Extract numeric part of PMCID from URL"""
@@ -19,22 +31,15 @@ class NCBISearch:
             raise ValueError(f"Could not extract PMCID from URL: {url}")
         return match.group(1)
 
-    def get_info(self, url: str) -> dict:
-        """Fetch metadata (title, authors, journal, etc.)"""
-        pmcid_num = self._extract_pmcid_number(url)
-        params = {"db": "pmc", "id": pmcid_num, "retmode": "json"}
+    def _base_params(self, ids: List[str], retmode: str) -> dict:
+        params = {"db": "pmc", "id": ",".join(ids), "retmode": retmode}
         if self.api_key:
             params["api_key"] = self.api_key
         if self.email:
             params["email"] = self.email
+        return params
 
-        response = requests.get(f"{self.base_url}esummary.fcgi", params=params)
-        response.raise_for_status()
-        data = response.json()
-
-        result_key = next(iter(data["result"].keys() - {"uids"}))
-        result = data["result"][result_key]
-
+    def _parse_summary(self, result: dict, pmcid_num: str) -> dict:
         return {
             "title": result.get("title"),
             "authors": [a.get("name") for a in result.get("authors", [])],
@@ -47,19 +52,83 @@ class NCBISearch:
             "pmcid": f"PMC{pmcid_num}",
         }
 
-    def get_section(self, url: str, section="Abstract") -> str:
-        """Fetch and return the best-matching section text from the paper."""
-
-        pmcid_num = self._extract_pmcid_number(url)
-        params = {"db": "pmc", "id": pmcid_num, "retmode": "xml"}
-        if self.api_key:
-            params["api_key"] = self.api_key
-
-        response = requests.get(f"{self.base_url}efetch.fcgi", params=params)
-        response.raise_for_status()
-
-        root = ET.fromstring(response.text)
-        
+    def get_info(self, url: str, token=None) -> dict:
+        """Fetch metadata (title, authors, journal, etc.)"""
+        return self.get_info_many([url], token=token)[url]
+
+    def get_info_many(self, urls: List[str], token=None) -> Dict[str, dict]:
+        """Fetch metadata for several papers with one esummary call per batch, keyed by URL"""
+        ids = {url: self._extract_pmcid_number(url) for url in urls}
+        unique_ids = list(dict.fromkeys(ids.values()))
+        summaries = {}
+
+        for i in range(0, len(unique_ids), self.batch_size):
+            if token:
+                token.check()
+            batch = unique_ids[i:i + self.batch_size]
+            response = self.transport.get(f"{self.base_url}esummary.fcgi",
+                                          params=self._base_params(batch, "json"), token=token)
+            response.raise_for_status()
+            result = response.json()["result"]
+            for pmcid_num in batch:
+                if pmcid_num in result:
+                    summaries[pmcid_num] = self._parse_summary(result[pmcid_num], pmcid_num)
+                elif len(batch) == 1 and len(result.keys() - {"uids"}) == 1:
+                    # Some responses key the single result by a different uid
+                    summaries[pmcid_num] = self._parse_summary(result[next(iter(result.keys() - {"uids"}))], pmcid_num)
+
+        return {url: summaries[pmcid_num] for url, pmcid_num in ids.items() if pmcid_num in summaries}
+
+    def _article_pmcid(self, article: ET.Element) -> Optional[str]:
+        for article_id in article.iter("article-id"):
+            if article_id.get("pub-id-type") in ("pmc", "pmcid", "pmcaid") and article_id.text:
+                match = re.search(r"(\d+)", article_id.text)
+                if match:
+                    return match.group(1)
+        return None
+
+    def _fetch_articles(self, pmcid_nums: List[str], token=None):
+        """
+        Fetch uncached articles and store each in the article cache
+
+        Articles another request is already fetching are waited for rather than
+        requested again; this request fetches the rest, one efetch call per batch.
+        """
+        missing, in_progress = self.inflight.claim(self.article_cache.missing(pmcid_nums))
+        try:
+            self._fetch_batches(missing, token)
+        except BaseException as e:
+            self.inflight.complete(missing, error=e)
+            raise
+        self.inflight.complete(missing)
+
+        for call in in_progress.values():
+            call.wait(token)
+        # Whatever the other request did not get (it was cancelled or failed) is fetched here
+        retry = self.article_cache.missing(list(in_progress))
+        if retry:
+            self._fetch_batches(retry, token)
+
+    def _fetch_batches(self, missing: List[str], token=None):
+        for i in range(0, len(missing), self.batch_size):
+            if token:
+                token.check()
+            batch = missing[i:i + self.batch_size]
+            response = self.transport.get(f"{self.base_url}efetch.fcgi",
+                                          params=self._base_params(batch, "xml"), token=token)
+            response.raise_for_status()
+
+            root = ET.fromstring(response.text)
+            articles = root.findall("article") if root.tag != "article" else [root]
+            for article in articles:
+                pmcid_num = self._article_pmcid(article)
+                # A single requested article is unambiguous even without an id element
+                if pmcid_num is None and len(batch) == 1:
+                    pmcid_num = batch[0]
+                if pmcid_num:
+                    self.article_cache.put(pmcid_num, ET.tostring(article, encoding="unicode"))
+
+    def _extract_section(self, root: ET.Element, section: str) -> str:
         # Helper function to get all text from an element including nested tags
         def get_all_text(element):
             return ''.join(element.itertext()).strip()
@@ -92,60 +161,48 @@ class NCBISearch:
         paragraphs = best_match.findall(".//p")
         sec_text = "\n".join(get_all_text(p) for p in paragraphs if get_all_text(p))
         return sec_text or f"No text found in section '{section}'."
+
+    def uncached(self, urls: List[str]) -> List[str]:
+        """The URLs whose article is not in the article cache yet"""
+        ids = {url: self._extract_pmcid_number(url) for url in urls}
+        missing = set(self.article_cache.missing(list(ids.values()), count=False))
+        return [url for url, pmcid_num in ids.items() if pmcid_num in missing]
+
+    def prefetch(self, urls: List[str], token=None):
+        """Fetch articles into the article cache without extracting any section"""
+        self._fetch_articles([self._extract_pmcid_number(url) for url in urls], token=token)
+
+    def get_section(self, url: str, section="Abstract", token=None) -> str:
+        """Fetch and return the best-matching section text from the paper."""
+        return self.get_sections_many([url], [section], token=token)[url][section]
+
+    def get_sections_many(self, urls: List[str], sections: List[str], token=None) -> Dict[str, Dict[str, str]]:
+        """
+        Fetch several sections from several papers in as few efetch calls as possible
+
+        Returns {url: {section: text}}. Articles are served from the article
+        cache when present; the rest are fetched together in batches.
+        """
+        ids = {url: self._extract_pmcid_number(url) for url in urls}
+        self._fetch_articles(list(ids.values()), token=token)
+
+        results = {}
+        for url, pmcid_num in ids.items():
+            xml = self.article_cache.get(pmcid_num)
+            root = ET.fromstring(xml) if xml else ET.Element("article")
+            results[url] = {section: self._extract_section(root, section) for section in sections}
+        return results
     
     def search(self, keywords: List[str], csv_path: str, max_results: int = 10) -> List[Dict]:
         """fuzzy search titles in CSV"""
-        results = []
-        keywords = [k.lower() for k in keywords]
-
-        with open(csv_path, newline='', encoding='utf-8-sig') as f:
-            reader = csv.DictReader(f)
-            # Normalize column names
-            field_map = {name.strip().lower(): name for name in reader.fieldnames or []}
-
-            if "title" not in field_map or "link" not in field_map:
-                raise KeyError(
-                    f"CSV must have 'Title' and 'Link' headers. Found: {reader.fieldnames}"
-                )
-
-            title_col = field_map["title"]
-            link_col = field_map["link"]
-
-            for row in reader:
-                title = row[title_col].strip()
-                link = row[link_col].strip()
-                title_lower = title.lower()
-
-                match_count = 0
-                for kw in keywords:
-                    if kw in title_lower:
-                        match_count += 1
-                    else:
-                        words = re.findall(r"\w+", title_lower)
-                        best_ratio = max(
-                            (difflib.SequenceMatcher(None, kw, w).ratio() for w in words),
-                            default=0,
-                        )
-                        if best_ratio > 0.75:
-                            match_count += 1
-
-                if match_count > 0:
-                    results.append({
-                        "title": title,
-                        "link": link,
-                        "match_score": match_count,
-                    })
-
-        results.sort(key=lambda x: (-x["match_score"], x["title"]))
-        return results[:max_results]
-
+        return rank_titles(shared_table(csv_path), keywords, max_results)
 
 
 def test():
     fetcher = NCBISearch()
     results = fetcher.search(
         ["mice", "gene"],
-        csv_path="data\csv\SB_publication_PMC.csv",  # path to your CSV
+        csv_path=os.path.join("data", "csv", "SB_publication_PMC.csv"),  # path to your CSV
         max_results=5
     )
     for r in results:
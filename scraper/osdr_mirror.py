@@ -0,0 +1,197 @@
+import json
+import math
+import os
+import re
+import threading
+import time
+from collections import defaultdict
+from typing import List, Dict, Optional, Set, Any
+
+from scraper.http_transport import HTTPTransport, shared_transport
+
+# Field weights for relevance scoring; titles matter most
+FIELD_WEIGHTS = {
+    "title": 3.0,
+    "factor_name": 2.0,
+    "organism": 2.0,
+    "assay_type": 1.5,
+    "description": 1.0,
+}
+FACETS = ("organism", "assay_type", "project_type")
+
+
+def _tokenize(text: str) -> List[str]:
+    return [t for t in re.findall(r"\w+", text.lower()) if len(t) > 1]
+
+
+def _as_list(value) -> List[str]:
+    if value is None or value == "N/A":
+        return []
+    if isinstance(value, list):
+        return [str(v) for v in value if v]
+    return [str(value)]
+
+
+class OSDRMirror:
+    """
+    Local mirror of OSDR study metadata
+    Studies are synced into a JSON file and served from an in-memory inverted
+    index plus facet indexes, so searches never leave the host.
+    """
+
+    def __init__(self, path: str = os.path.join("data", "osdr", "studies.json"),
+                 transport: Optional[HTTPTransport] = None):
+        self.path = path
+        self.transport = transport or shared_transport()
+        self.base_url = "https://osdr.nasa.gov/osdr/data/search"
+        self.studies: List[Dict[str, Any]] = []
+        self.synced_at: Optional[float] = None
+        self.postings: Dict[str, Dict[int, float]] = {}
+        self.facets: Dict[str, Dict[str, Set[int]]] = {}
+        self.doc_lengths: List[float] = []
+        self.avg_length = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def ready(self) -> bool:
+        return bool(self.studies)
+
+    # ---------------------------Sync---------------------------
+    def sync(self, page_size: int = 100, max_studies: Optional[int] = None) -> int:
+        """Page through every OSDR study, write the mirror file and rebuild the indexes"""
+        from scraper.osdr_search import parse_hit
+
+        studies = []
+        offset = 0
+        while True:
+            params = {'from': offset, 'size': page_size, 'type': 'cgene'}
+            response = self.transport.get(self.base_url, params=params)
+            response.raise_for_status()
+            hits = response.json().get('hits', {})
+            page = hits.get('hits', [])
+            for hit in page:
+                study = parse_hit(hit)
+                study.pop('score', None)
+                studies.append(study)
+
+            total = hits.get('total', 0)
+            total = total.get('value', 0) if isinstance(total, dict) else total
+            offset += len(page)
+            if not page or offset >= total or (max_studies and offset >= max_studies):
+                break
+
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump({"synced_at": time.time(), "studies": studies}, f)
+        os.replace(temp_path, self.path)
+
+        print(f"[OSDRMirror] Synced {len(studies)} studies to {self.path}")
+        self.load()
+        return len(studies)
+
+    def age(self) -> Optional[float]:
+        """Seconds since the mirror file was written, or None if it does not exist"""
+        if not os.path.exists(self.path):
+            return None
+        return time.time() - os.path.getmtime(self.path)
+
+    # ---------------------------Indexing---------------------------
+    def load(self) -> bool:
+        """Load the mirror file and build the inverted and facet indexes"""
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"[OSDRMirror] Could not load mirror: {e}")
+            return False
+
+        studies = data.get("studies", [])
+        postings: Dict[str, Dict[int, float]] = defaultdict(dict)
+        facets: Dict[str, Dict[str, Set[int]]] = {name: defaultdict(set) for name in FACETS}
+        doc_lengths = []
+
+        for doc_id, study in enumerate(studies):
+            length = 0.0
+            for field, weight in FIELD_WEIGHTS.items():
+                for term in _tokenize(" ".join(_as_list(study.get(field)))):
+                    postings[term][doc_id] = postings[term].get(doc_id, 0.0) + weight
+                    length += weight
+            doc_lengths.append(length)
+            for name in FACETS:
+                for value in _as_list(study.get(name)):
+                    facets[name][value.lower()].add(doc_id)
+
+        with self._lock:
+            self.studies = studies
+            self.synced_at = data.get("synced_at")
+            self.postings = dict(postings)
+            self.facets = {name: dict(values) for name, values in facets.items()}
+            self.doc_lengths = doc_lengths
+            self.avg_length = sum(doc_lengths) / len(doc_lengths) if doc_lengths else 0.0
+
+        print(f"[OSDRMirror] Indexed {len(studies)} studies, {len(self.postings)} terms")
+        return True
+
+    # ---------------------------Search---------------------------
+    def search(self, keyword: str = "", max_results: int = 10, organism: str = None,
+               assay_type: str = None, project_type: str = None) -> List[Dict]:
+        """
+        BM25-style search over the mirror with optional facet filters
+
+        Returns the same study dicts as NASAOSDRSearch, with 'score' set to the
+        local relevance score.
+        """
+        # Indexes are replaced wholesale by load(), so a snapshot is safe to read unlocked
+        with self._lock:
+            studies, postings, facets = self.studies, self.postings, self.facets
+            doc_lengths, avg_length = self.doc_lengths, self.avg_length
+
+        # Facet filters become set intersections
+        allowed = None
+        for name, value in (("organism", organism), ("assay_type", assay_type), ("project_type", project_type)):
+            if value:
+                matches = facets.get(name, {}).get(value.lower(), set())
+                allowed = matches if allowed is None else allowed & matches
+
+        terms = _tokenize(keyword)
+        if not terms:
+            doc_ids = sorted(allowed) if allowed is not None else range(len(studies))
+            return [{**studies[i], 'score': 0.0} for i in list(doc_ids)[:max_results]]
+
+        k1, b = 1.2, 0.75
+        total_docs = len(studies)
+        scores: Dict[int, float] = defaultdict(float)
+        for term in set(terms):
+            docs = postings.get(term)
+            if not docs:
+                continue
+            idf = math.log(1 + (total_docs - len(docs) + 0.5) / (len(docs) + 0.5))
+            for doc_id, tf in docs.items():
+                if allowed is not None and doc_id not in allowed:
+                    continue
+                norm = k1 * (1 - b + b * doc_lengths[doc_id] / (avg_length or 1))
+                scores[doc_id] += idf * tf * (k1 + 1) / (tf + norm)
+
+        # Whole-phrase title matches outrank scattered term matches
+        phrase = keyword.lower().strip()
+        if len(terms) > 1:
+            for doc_id in scores:
+                if phrase in studies[doc_id].get('title', '').lower():
+                    scores[doc_id] *= 1.5
+
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:max_results]
+        return [{**studies[doc_id], 'score': round(score, 4)} for doc_id, score in ranked]
+
+
+_shared_mirror: Optional[OSDRMirror] = None
+_shared_lock = threading.Lock()
+
+
+def shared_mirror() -> OSDRMirror:
+    """The process-wide mirror; loaded once and inherited by forked server workers"""
+    global _shared_mirror
+    with _shared_lock:
+        if _shared_mirror is None:
+            _shared_mirror = OSDRMirror()
+        return _shared_mirror
@@ -2,28 +2,77 @@ import requests
 import json
 from typing import List, Dict, Optional
 
+from scraper.http_transport import HTTPTransport, shared_transport
+from scraper.osdr_mirror import OSDRMirror
+from scraper.query_cache import QueryCache, shared_query_cache
+from single_flight import SingleFlight
+
+
+def parse_hit(hit: Dict) -> Dict:
+    """Convert an OSDR search hit into IBAT's study dict"""
+    source = hit.get('_source', {})
+    return {
+        'id': hit.get('_id'),
+        'accession': source.get('Accession', 'N/A'),
+        'title': source.get('Study Title', 'N/A'),
+        'description': source.get('Study Description', 'N/A'),
+        'organism': source.get('organism', []),
+        'project_type': source.get('Project Type', 'N/A'),
+        'assay_type': source.get('Study Assay Technology Type', []),
+        'factor_name': source.get('Study Factor Name', []),
+        'managing_center': source.get('Managing NASA Center', 'N/A'),
+        'release_date': source.get('Study Public Release Date', 'N/A'),
+        'score': hit.get('_score', 0)
+    }
+
+
+def copy_studies(studies: List[Dict]) -> List[Dict]:
+    """Callers annotate the study dicts, so waiters on a shared query get their own copies"""
+    return [dict(study) for study in studies]
+
+
 class NASAOSDRSearch:
     """Search NASA's Open Science Data Repository for studies."""
     
-    def __init__(self):
+    def __init__(self, transport: Optional[HTTPTransport] = None, mirror: Optional[OSDRMirror] = None,
+                 cache: Optional[QueryCache] = None):
         self.base_url = "https://osdr.nasa.gov/osdr/data/search"
+        self.transport = transport or shared_transport()
+        # Live results are memoized per keyword; failed requests are never cached
+        self.cache = cache or shared_query_cache()
+        # When a loaded local mirror is available, queries are answered from it
+        self.mirror = mirror
+        # Concurrent identical live queries share one request
+        self.inflight = SingleFlight("osdr_search")
         
     def search_studies(self, keyword: str, max_results: int = 10, 
-                      data_source: str = "cgene") -> List[Dict]:
+                      data_source: str = "cgene", token=None) -> List[Dict]:
         """
         Search for studies by keyword in NASA OSDR.
         """
+        if token:
+            token.check()
+        if self.mirror and self.mirror.ready and data_source == "cgene":
+            return self.mirror.search(keyword, max_results=max_results)
+        cache_key = self.cache.make_key(keyword, size=max_results, type=data_source)
+        cached = self.cache.get(cache_key)
+        if cached is not None:
+            return cached
+        # search parameters
+        params = {
+            'term': keyword,
+            'from': 0,
+            'size': max_results,
+            'type': data_source
+        }
+        return self.inflight.do(cache_key, lambda: self._search_live(params, cache_key, token), token=token,
+                                copy=copy_studies)
+
+    def _search_live(self, params: Dict, cache_key, token=None) -> List[Dict]:
+        """Query osdr.nasa.gov and cache the parsed studies"""
         try:
-            # search parameters
-            params = {
-                'term': keyword,
-                'from': 0,
-                'size': max_results,
-                'type': data_source
-            }
-            
             #API request
-            response = requests.get(self.base_url, params=params)
+            response = self.transport.get(self.base_url, params=params, token=token)
             response.raise_for_status()
             
             # Parse 
@@ -33,22 +82,9 @@ class NASAOSDRSearch:
             studies = []
             if 'hits' in data and 'hits' in data['hits']:
                 for hit in data['hits']['hits']:
-                    source = hit.get('_source', {})
-                    study = {
-                        'id': hit.get('_id'),
-                        'accession': source.get('Accession', 'N/A'),
-                        'title': source.get('Study Title', 'N/A'),
-                        'description': source.get('Study Description', 'N/A'),
-                        'organism': source.get('organism', []),
-                        'project_type': source.get('Project Type', 'N/A'),
-                        'assay_type': source.get('Study Assay Technology Type', []),
-                        'factor_name': source.get('Study Factor Name', []),
-                        'managing_center': source.get('Managing NASA Center', 'N/A'),
-                        'release_date': source.get('Study Public Release Date', 'N/A'),
-                        'score': hit.get('_score', 0)
-                    }
-                    studies.append(study)
+                    studies.append(parse_hit(hit))
             
+            self.cache.put(cache_key, studies)
             return studies
             
         except requests.exceptions.RequestException as e:
@@ -60,75 +96,54 @@ class NASAOSDRSearch:
     
     def search_with_filters(self, keyword: str = "", max_results: int = 10,
                            organism: str = None, assay_type: str = None,
-                           project_type: str = None) -> List[Dict]:
-        try:
-            params = {
-                'from': 0,
-                'size': max_results,
-                'type': 'cgene'
-            }
-            
-            if keyword:
-                params['term'] = keyword
-            
-            # Add filters using ffield and fvalue pairs
-            if organism:
-                params['ffield'] = 'organism'
-                params['fvalue'] = organism
-            
-            if assay_type:
-                if 'ffield' in params:
-                    #Convert to lists
-                    params['ffield'] = [params['ffield'], 'Study Assay Technology Type']
-                    params['fvalue'] = [params['fvalue'], assay_type]
-                else:
-                    params['ffield'] = 'Study Assay Technology Type'
-                    params['fvalue'] = assay_type
-            
-            if project_type:
-                if 'ffield' in params:
-                    if isinstance(params['ffield'], list):
-                        params['ffield'].append('Project Type')
-                        params['fvalue'].append(project_type)
-                    else:
-                        params['ffield'] = [params['ffield'], 'Project Type']
-                        params['fvalue'] = [params['fvalue'], project_type]
+                           project_type: str = None, token=None) -> List[Dict]:
+        if token:
+            token.check()
+        if self.mirror and self.mirror.ready:
+            return self.mirror.search(keyword, max_results=max_results, organism=organism,
+                                      assay_type=assay_type, project_type=project_type)
+        cache_key = self.cache.make_key(keyword, size=max_results, organism=organism,
+                                        assay_type=assay_type, project_type=project_type)
+        cached = self.cache.get(cache_key)
+        if cached is not None:
+            return cached
+        params = {
+            'from': 0,
+            'size': max_results,
+            'type': 'cgene'
+        }
+        
+        if keyword:
+            params['term'] = keyword
+        
+        # Add filters using ffield and fvalue pairs
+        if organism:
+            params['ffield'] = 'organism'
+            params['fvalue'] = organism
+        
+        if assay_type:
+            if 'ffield' in params:
+                #Convert to lists
+                params['ffield'] = [params['ffield'], 'Study Assay Technology Type']
+                params['fvalue'] = [params['fvalue'], assay_type]
+            else:
+                params['ffield'] = 'Study Assay Technology Type'
+                params['fvalue'] = assay_type
+        
+        if project_type:
+            if 'ffield' in params:
+                if isinstance(params['ffield'], list):
+                    params['ffield'].append('Project Type')
+                    params['fvalue'].append(project_type)
                 else:
-                    params['ffield'] = 'Project Type'
-                    params['fvalue'] = project_type
-            
-            response = requests.get(self.base_url, params=params)
-            response.raise_for_status()
-            
-            data = response.json()
-            
-            studies = []
-            if 'hits' in data and 'hits' in data['hits']:
-                for hit in data['hits']['hits']:
-                    source = hit.get('_source', {})
-                    study = {
-                        'id': hit.get('_id'),
-                        'accession': source.get('Accession', 'N/A'),
-                        'title': source.get('Study Title', 'N/A'),
-                        'description': source.get('Study Description', 'N/A'),
-                        'organism': source.get('organism', []),
-                        'project_type': source.get('Project Type', 'N/A'),
-                        'assay_type': source.get('Study Assay Technology Type', []),
-                        'factor_name': source.get('Study Factor Name', []),
-                        'managing_center': source.get('Managing NASA Center', 'N/A'),
-                        'release_date': source.get('Study Public Release Date', 'N/A'),
-                        'score': hit.get('_score', 0)
-                    }
-                    studies.append(study)
-            
-            return studies
-            
-        except requests.exceptions.RequestException as e:
-            print(f"Error making API request: {e}")
-            return []
-        except json.JSONDecodeError as e:
-            print(f"Error parsing JSON response: {e}")
-            return []
+                    params['ffield'] = [params['ffield'], 'Project Type']
+                    params['fvalue'] = [params['fvalue'], project_type]
+            else:
+                params['ffield'] = 'Project Type'
+                params['fvalue'] = project_type
+        
+        return self.inflight.do(cache_key, lambda: self._search_live(params, cache_key, token), token=token,
+                                copy=copy_studies)
 
 
 def test():
@@ -0,0 +1,226 @@
+import csv
+import json
+import mmap
+import os
+import re
+import threading
+from typing import List, Dict, Optional, Tuple, Union
+
+import numpy as np
+
+COLUMNS = ("titles", "titles_lower", "links", "pmcids", "vocab", "vocab_lengths", "alphabet", "char_counts",
+           "token_ids", "token_rows", "token_offsets", "text_offsets")
+# Bumped whenever the column layout changes, so older tables are rebuilt
+FORMAT_VERSION = 1
+# Lowercased titles joined by NUL as UTF-8, so substring search is a single scan of one buffer
+TEXT_FILE = "titles_lower.bin"
+SEPARATOR = "\x00"
+
+
+def tokenize_title(title_lower: str) -> List[str]:
+    return re.findall(r"\w+", title_lower)
+
+
+class PublicationTable:
+    """
+    Columnar view of a publication CSV
+    The CSV is converted once into NumPy arrays (titles, lowercased titles,
+    links, PMCIDs and a flattened title-token matrix) saved next to it, then
+    memory-mapped read-only so every worker shares the same pages.
+    """
+
+    def __init__(self, table_dir: str, arrays: Dict[str, np.ndarray], text: Union[mmap.mmap, bytes],
+                 source_stat: Optional[List[float]] = None):
+        self.table_dir = table_dir
+        self.source_stat = source_stat
+        self.titles = arrays["titles"]
+        self.titles_lower = arrays["titles_lower"]
+        self.links = arrays["links"]
+        self.pmcids = arrays["pmcids"]
+        # Title tokens, flattened: token_ids[token_offsets[i]:token_offsets[i + 1]] are row i's words
+        self.vocab = arrays["vocab"]
+        # Per-word length and character histogram over `alphabet`, used to bound fuzzy match ratios
+        self.vocab_lengths = arrays["vocab_lengths"]
+        self.alphabet = {str(c): i for i, c in enumerate(arrays["alphabet"])}
+        self.char_counts = arrays["char_counts"]
+        self.token_ids = arrays["token_ids"]
+        self.token_rows = arrays["token_rows"]
+        self.token_offsets = arrays["token_offsets"]
+        # Byte offset of each title in `text`, plus the end of the buffer
+        self.text_offsets = arrays["text_offsets"]
+        self.text = text
+
+    def __len__(self) -> int:
+        return len(self.titles)
+
+    @staticmethod
+    def table_dir_for(csv_path: str) -> str:
+        return os.path.splitext(csv_path)[0] + ".table"
+
+    # ---------------------------Build and load---------------------------
+    @staticmethod
+    def read_csv(csv_path: str) -> Tuple[List[str], List[str]]:
+        """Titles and links from a CSV with Title and Link columns"""
+        titles, links = [], []
+        with open(csv_path, newline='', encoding='utf-8-sig') as f:
+            reader = csv.DictReader(f)
+            # Normalize column names
+            field_map = {name.strip().lower(): name for name in reader.fieldnames or []}
+            if "title" not in field_map or "link" not in field_map:
+                raise KeyError(
+                    f"CSV must have 'Title' and 'Link' headers. Found: {reader.fieldnames}"
+                )
+            for row in reader:
+                titles.append(row[field_map["title"]].strip())
+                links.append(row[field_map["link"]].strip())
+        return titles, links
+
+    @classmethod
+    def build(cls, csv_path: str, table_dir: Optional[str] = None) -> "PublicationTable":
+        """Parse the CSV and write the column files"""
+        stat = os.stat(csv_path)
+        titles, links = cls.read_csv(csv_path)
+        return cls.write(table_dir or cls.table_dir_for(csv_path), titles, links,
+                         [stat.st_mtime, stat.st_size], source=csv_path)
+
+    @classmethod
+    def write(cls, table_dir: str, titles: List[str], links: List[str], source_stat: List[float],
+              source: str = "") -> "PublicationTable":
+        """Write the column files for the given rows and load them back"""
+        titles_lower = [t.lower() for t in titles]
+        pmcids = []
+        for link in links:
+            match = re.search(r"PMC\d+", link)
+            pmcids.append(match.group(0) if match else "")
+
+        vocab_index: Dict[str, int] = {}
+        token_ids, token_rows, token_offsets = [], [], [0]
+        for row, title in enumerate(titles_lower):
+            for word in tokenize_title(title):
+                token_ids.append(vocab_index.setdefault(word, len(vocab_index)))
+                token_rows.append(row)
+            token_offsets.append(len(token_ids))
+
+        text_offsets = [0]
+        encoded = []
+        for title in titles_lower:
+            encoded.append(title.encode("utf-8") + SEPARATOR.encode("utf-8"))
+            text_offsets.append(text_offsets[-1] + len(encoded[-1]))
+
+        vocab = list(vocab_index)
+        alphabet = sorted({c for word in vocab for c in word})
+        char_index = {c: i for i, c in enumerate(alphabet)}
+        char_counts = np.zeros((len(vocab), len(alphabet)), dtype=np.uint16)
+        for word_id, word in enumerate(vocab):
+            for c in word:
+                char_counts[word_id, char_index[c]] += 1
+
+        arrays = {
+            "titles": np.array(titles, dtype=str),
+            "titles_lower": np.array(titles_lower, dtype=str),
+            "links": np.array(links, dtype=str),
+            "pmcids": np.array(pmcids, dtype=str),
+            "vocab": np.array(vocab, dtype=str),
+            "vocab_lengths": np.array([len(w) for w in vocab], dtype=np.int32),
+            "alphabet": np.array(alphabet, dtype=str),
+            "char_counts": char_counts,
+            "token_ids": np.array(token_ids, dtype=np.int32),
+            "token_rows": np.array(token_rows, dtype=np.int32),
+            "token_offsets": np.array(token_offsets, dtype=np.int64),
+            "text_offsets": np.array(text_offsets, dtype=np.int64),
+        }
+
+        os.makedirs(table_dir, exist_ok=True)
+        for name, array in arrays.items():
+            temp_path = os.path.join(table_dir, f"{name}.tmp.npy")
+            np.save(temp_path, array)
+            os.replace(temp_path, os.path.join(table_dir, f"{name}.npy"))
+        temp_path = os.path.join(table_dir, f"{TEXT_FILE}.tmp")
+        with open(temp_path, 'wb') as f:
+            f.write(b"".join(encoded))
+        os.replace(temp_path, os.path.join(table_dir, TEXT_FILE))
+        # meta.json is written last, so readers never see a half-written table as current
+        temp_path = os.path.join(table_dir, "meta.json.tmp")
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump({"format": FORMAT_VERSION, "source": os.path.abspath(source) if source else "",
+                       "source_stat": source_stat, "rows": len(titles)}, f)
+        os.replace(temp_path, os.path.join(table_dir, "meta.json"))
+
+        print(f"[PublicationTable] Built {len(titles)} rows, {len(vocab_index)} title words in {table_dir}")
+        return cls.load(table_dir)
+
+    @classmethod
+    def load(cls, table_dir: str) -> "PublicationTable":
+        """Memory-map an existing table read-only"""
+        with open(os.path.join(table_dir, "meta.json"), encoding='utf-8') as f:
+            meta = json.load(f)
+        if meta.get("format") != FORMAT_VERSION:
+            raise ValueError(f"{table_dir} was written in an older table format")
+        arrays = {name: np.load(os.path.join(table_dir, f"{name}.npy"), mmap_mode='r') for name in COLUMNS}
+        with open(os.path.join(table_dir, TEXT_FILE), 'rb') as f:
+            # mmap refuses empty files
+            text = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if os.fstat(f.fileno()).st_size else b""
+        return cls(table_dir, arrays, text, meta.get("source_stat"))
+
+    @classmethod
+    def open(cls, csv_path: str, table_dir: Optional[str] = None) -> "PublicationTable":
+        """Load the table for csv_path, rebuilding it if the CSV changed since it was written"""
+        table_dir = table_dir or cls.table_dir_for(csv_path)
+        try:
+            table = cls.load(table_dir)
+            if table.is_current(csv_path):
+                return table
+        except (OSError, ValueError, json.JSONDecodeError):
+            pass
+        return cls.build(csv_path, table_dir)
+
+    def is_current(self, csv_path: str) -> bool:
+        try:
+            stat = os.stat(csv_path)
+        except OSError:
+            return False
+        return self.source_stat == [stat.st_mtime, stat.st_size]
+
+    # ---------------------------Queries---------------------------
+    def row_tokens(self, row: int) -> List[int]:
+        return self.token_ids[self.token_offsets[row]:self.token_offsets[row + 1]].tolist()
+
+    def contains(self, keyword: str) -> np.ndarray:
+        """Boolean mask of rows whose lowercased title contains keyword"""
+        if not keyword or SEPARATOR in keyword:
+            return np.char.find(self.titles_lower, keyword) >= 0
+        mask = np.zeros(len(self), dtype=bool)
+        needle = keyword.encode("utf-8")
+        # Very common keywords hit most titles; past this many hits the per-row scan is cheaper
+        budget = max(1024, len(self) // 16)
+        pos = self.text.find(needle)
+        while pos >= 0:
+            row = int(np.searchsorted(self.text_offsets, pos, side='right')) - 1
+            mask[row] = True
+            budget -= 1
+            if not budget:
+                mask[row + 1:] = np.char.find(self.titles_lower[row + 1:], keyword) >= 0
+                break
+            # One hit per title is enough; resume at the next title
+            pos = self.text.find(needle, int(self.text_offsets[row + 1]))
+        return mask
+
+    def rows_with_tokens(self, vocab_mask: np.ndarray) -> np.ndarray:
+        """Boolean mask of rows containing at least one word selected by vocab_mask"""
+        hits = vocab_mask[self.token_ids]
+        return np.bincount(self.token_rows[hits], minlength=len(self)) > 0
+
+
+_tables: Dict[str, PublicationTable] = {}
+_tables_lock = threading.Lock()
+
+
+def shared_table(csv_path: str) -> PublicationTable:
+    """The process-wide table for csv_path, reopened when the CSV changes"""
+    key = os.path.abspath(csv_path)
+    with _tables_lock:
+        table = _tables.get(key)
+        if table is None or not table.is_current(csv_path):
+            table = PublicationTable.open(csv_path)
+            _tables[key] = table
+        return table
@@ -0,0 +1,105 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Dict, List, Any, Tuple
+
+
+class QueryCache:
+    """
+    TTL cache of OSDR search results
+    Keyed by normalized keyword and search options, with LRU eviction past
+    max_entries. Empty results are cached too, for a shorter negative_ttl.
+    With a store, entries live in a SQLite table shared by every server process.
+    """
+
+    def __init__(self, ttl: float = 900.0, negative_ttl: float = 120.0, max_entries: int = 1024, store=None):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self.store = store
+        self.entries: "OrderedDict[Tuple, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(keyword: str, **options) -> Tuple:
+        keyword = " ".join((keyword or "").lower().split())
+        return (keyword,) + tuple(sorted((k, str(v)) for k, v in options.items() if v is not None))
+
+    def get(self, key: Tuple) -> Optional[List[Dict]]:
+        """Return a copy of the cached studies, or None if missing or expired"""
+        if self.store is not None:
+            studies = self.store.get(repr(key))
+            with self._lock:
+                if studies is None:
+                    self.misses += 1
+                    return None
+                self.hits += 1
+                if not studies:
+                    self.negative_hits += 1
+            return studies
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] < time.monotonic():
+                del self.entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            if not entry[1]:
+                self.negative_hits += 1
+            # Callers annotate and collect the study dicts, so hand out copies
+            return [dict(study) for study in entry[1]]
+
+    def put(self, key: Tuple, studies: List[Dict]):
+        ttl = self.ttl if studies else self.negative_ttl
+        if self.store is not None:
+            self.store.put(repr(key), studies, ttl=ttl)
+            return
+        with self._lock:
+            self.entries[key] = (time.monotonic() + ttl, [dict(study) for study in studies])
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        if self.store is not None:
+            self.store.clear()
+        with self._lock:
+            self.entries.clear()
+
+    def get_metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": self.store.count() if self.store is not None else len(self.entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "negative_hits": self.negative_hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+_shared_cache: Optional[QueryCache] = None
+_shared_lock = threading.Lock()
+
+
+def set_shared_query_cache(cache: QueryCache):
+    """Replace the process-wide cache, e.g. with a SQLite-backed one before any scraper is built"""
+    global _shared_cache
+    with _shared_lock:
+        _shared_cache = cache
+
+
+def shared_query_cache() -> QueryCache:
+    """The process-wide OSDR query cache used by every NASAOSDRSearch instance"""
+    global _shared_cache
+    with _shared_lock:
+        if _shared_cache is None:
+            _shared_cache = QueryCache()
+        return _shared_cache
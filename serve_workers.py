@@ -0,0 +1,170 @@
+"""
+Multi-process serving mode for IBAT.
+
+A preloading parent downloads the publication CSV, builds the title tables,
+loads the OSDR mirror and imports the heavy libraries once, then forks
+worker processes that share those pages copy-on-write and accept
+connections on one listening socket. Whisper runs in a single dedicated
+process that every worker sends audio to, and the article, OSDR query and
+answer caches live in one SQLite file shared by all workers.
+Workers that exit unexpectedly are restarted.
+
+Run with (Linux/macOS, os.fork is required):
+    python serve_workers.py --workers 4 --port 5000
+"""
+import argparse
+import os
+import signal
+import socket
+import sys
+import time
+from typing import Set
+
+from transcription_service import start_transcription_server
+
+
+def preload():
+    """Everything workers only read, done once in the parent before forking"""
+    import nltk
+    from data.sync_csv import save_dat_csv
+    from data.sync_osdr import sync_osdr_mirror
+    from scraper.corpus import CorpusRegistry
+    from scraper.http_transport import HTTPTransport
+    from scraper.osdr_mirror import shared_mirror
+    # Imported here so every worker inherits the loaded modules
+    import flask  # noqa: F401
+    import main as ibat_main  # noqa: F401
+
+    print("[serve_workers] Syncing CSV data...")
+    save_dat_csv()
+    nltk.download('stopwords')
+    nltk.download('punkt_tab')
+
+    # Build the title tables up front so workers only map them
+    corpus = CorpusRegistry()
+    corpus.register("SB_publication_PMC", os.path.join("data", "csv", "SB_publication_PMC.csv"))
+    for path in os.environ.get('IBAT_CORPUS_PATHS', '').split(os.pathsep):
+        if path:
+            corpus.register(os.path.splitext(os.path.basename(path))[0], path)
+    corpus.shards()
+
+    if os.environ.get('IBAT_OSDR_MIRROR', '1') == '1':
+        print("[serve_workers] Loading OSDR mirror...")
+        # Sync over a private transport that is closed before forking, so no worker
+        # inherits (and shares) a keep-alive socket from the shared transport
+        mirror = shared_mirror()
+        shared, transport = mirror.transport, HTTPTransport()
+        mirror.transport = transport
+        try:
+            sync_osdr_mirror(mirror)
+        finally:
+            mirror.transport = shared
+            transport.close()
+
+
+def run_worker(listener: socket.socket, host: str, port: int):
+    from werkzeug.serving import make_server
+    from web_client import app
+
+    server = make_server(host, port, app, threaded=True, fd=listener.fileno())
+    print(f"[serve_workers] Worker {os.getpid()} serving on http://{host}:{port}")
+    server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve IBAT from several forked worker processes")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Server processes to fork")
+    parser.add_argument("--whisper-replicas", type=int, default=1, help="Whisper models in the Whisper process")
+    parser.add_argument("--transcription-queue", type=int, default=8)
+    parser.add_argument("--whisper-idle-minutes", type=float,
+                        default=float(os.environ.get('IBAT_WHISPER_IDLE_MINUTES', '10')),
+                        help="Unload Whisper after this many minutes without voice requests (0 keeps it loaded)")
+    parser.add_argument("--cache-db", default=os.path.join("data", "cache", "shared_cache.sqlite3"),
+                        help="SQLite file for the caches shared by all workers")
+    args = parser.parse_args()
+
+    if not hasattr(os, "fork"):
+        print("serve_workers.py needs os.fork; on Windows run web_client.py instead.")
+        sys.exit(1)
+
+    # Start Whisper first, while this process is still small and has no threads to fork;
+    # text-only servers (IBAT_TEXT_ONLY=1) have no Whisper process at all
+    whisper = None
+    if os.environ.get('IBAT_TEXT_ONLY', '0') != '1':
+        authkey = os.urandom(16)
+        whisper = start_transcription_server(("127.0.0.1", 0), authkey, replicas=args.whisper_replicas,
+                                             max_queue=args.transcription_queue,
+                                             idle_unload=args.whisper_idle_minutes * 60)
+        whisper_host, whisper_port = whisper.address
+
+        # Workers build IBAT from these when they import web_client
+        os.environ['IBAT_TRANSCRIPTION_ADDRESS'] = f"{whisper_host}:{whisper_port}"
+        os.environ['IBAT_TRANSCRIPTION_AUTHKEY'] = authkey.hex()
+    os.environ['IBAT_SHARED_CACHE_DB'] = args.cache_db
+    # Workers transcribe uploads through the Whisper process; none of them opens the microphone
+    os.environ['IBAT_MICROPHONE'] = '0'
+    os.environ['IBAT_SYNC_DATA'] = '0'
+
+    preload()
+
+    listener = socket.create_server((args.host, args.port), backlog=128)
+    listener.set_inheritable(True)
+
+    children: Set[int] = set()
+    stopping = False
+
+    def spawn():
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            code = 0
+            try:
+                run_worker(listener, args.host, args.port)
+            except Exception as e:
+                print(f"[serve_workers] Worker {os.getpid()} failed: {e}")
+                code = 1
+            finally:
+                os._exit(code)
+        children.add(pid)
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    for _ in range(max(1, args.workers)):
+        spawn()
+    print(f"[serve_workers] {len(children)} workers on http://{args.host}:{args.port}")
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        children.discard(pid)
+        if not stopping:
+            print(f"[serve_workers] Worker {pid} exited with status {status}, restarting")
+            # Don't spin if workers crash at startup
+            time.sleep(1)
+            spawn()
+
+    listener.close()
+    if whisper:
+        try:
+            whisper.shutdown()
+        except Exception as e:
+            print(f"[serve_workers] Error stopping the Whisper process: {e}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Dict, Any, List, Tuple
+
+
+class SessionContext:
+    """Ollama's token state after a session's last answer, and what it was generated from"""
+
+    def __init__(self, model: str, sources_key: Tuple[str, ...], context: List[int]):
+        self.model = model
+        self.sources_key = sources_key
+        self.context = context
+        self.turns = 1
+        self.updated_at = time.monotonic()
+
+
+class GenerationSessions:
+    """
+    Generation Sessions Module
+    Keeps the `context` Ollama returns after each answer, per chat session.
+    A follow-up on the same model whose retrieved papers are unchanged sends
+    only the new question with that context instead of re-prefilling the
+    full RAG prompt. Sessions expire after ttl and the least recently used
+    are dropped past max_sessions. After max_turns follow-ups the next turn
+    starts fresh, so the context stays within the model's window.
+    """
+
+    def __init__(self, ttl: float = 1800.0, max_sessions: int = 256, max_turns: int = 6):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self.max_turns = max_turns
+        self.sessions: "OrderedDict[str, SessionContext]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.reused = 0
+        self.fresh = 0
+
+    def lookup(self, session_id: Optional[str], model: str, sources_key: Tuple[str, ...]) -> Optional[SessionContext]:
+        """The session's context if the next turn can continue from it, else None"""
+        with self._lock:
+            session = self.sessions.get(session_id) if session_id else None
+            if session is not None and session.updated_at + self.ttl < time.monotonic():
+                del self.sessions[session_id]
+                session = None
+            if (session is None or session.model != model or session.sources_key != sources_key
+                    or session.turns > self.max_turns):
+                self.fresh += 1
+                return None
+            self.sessions.move_to_end(session_id)
+            self.reused += 1
+            return session
+
+    def store(self, session_id: Optional[str], model: str, sources_key: Tuple[str, ...],
+              context: Optional[List[int]], continued: Optional[SessionContext] = None):
+        """Remember the context after an answer; continued is the session it followed on from"""
+        if not session_id:
+            return
+        with self._lock:
+            if not context:
+                self.sessions.pop(session_id, None)
+                return
+            session = SessionContext(model, sources_key, context)
+            if continued is not None:
+                session.turns = continued.turns + 1
+            self.sessions[session_id] = session
+            self.sessions.move_to_end(session_id)
+            while len(self.sessions) > self.max_sessions:
+                self.sessions.popitem(last=False)
+
+    def discard(self, session_id: Optional[str]):
+        with self._lock:
+            self.sessions.pop(session_id, None)
+
+    def get_metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            turns = self.reused + self.fresh
+            return {
+                "sessions": len(self.sessions),
+                "max_sessions": self.max_sessions,
+                "reused": self.reused,
+                "fresh": self.fresh,
+                "reuse_rate": self.reused / turns if turns else 0.0,
+            }
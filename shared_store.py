@@ -0,0 +1,158 @@
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Optional, Any, Iterable, Set
+
+
+def _connect(path: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(path, timeout=10.0, isolation_level=None)
+    # WAL lets readers in other processes proceed while one process writes
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+class SQLiteStore:
+    """
+    Shared Store Module
+    A key-value table in a SQLite file, so caches can be shared by every
+    server process on the host. Values are stored as JSON, entries expire
+    at their TTL and the least recently used rows are evicted past
+    max_entries.
+    """
+
+    def __init__(self, path: str, table: str, max_entries: int = 1024):
+        if not re.fullmatch(r"[A-Za-z_][A-Za-z0-9_]*", table):
+            raise ValueError(f"Invalid table name: {table}")
+        self.path = path
+        self.table = table
+        self.max_entries = max_entries
+        self._local = threading.local()
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        conn = self._conn()
+        conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {table} ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL, accessed_at REAL NOT NULL)"
+        )
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {table}_accessed ON {table} (accessed_at)")
+
+    def _conn(self) -> sqlite3.Connection:
+        # sqlite3 connections cannot be shared across threads, so each thread opens its own
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = _connect(self.path)
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> Optional[Any]:
+        """Return the stored value, or None if missing or expired"""
+        conn = self._conn()
+        row = conn.execute(f"SELECT value, expires_at FROM {self.table} WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        now = time.time()
+        if row[1] is not None and row[1] < now:
+            conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+            return None
+        conn.execute(f"UPDATE {self.table} SET accessed_at = ? WHERE key = ?", (now, key))
+        return json.loads(row[0])
+
+    def existing(self, keys: Iterable[str]) -> Set[str]:
+        """The subset of keys with a live entry"""
+        keys = list(keys)
+        found: Set[str] = set()
+        # Stay well under SQLite's bound-parameter limit
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            placeholders = ",".join("?" * len(chunk))
+            rows = self._conn().execute(
+                f"SELECT key FROM {self.table} WHERE key IN ({placeholders}) "
+                "AND (expires_at IS NULL OR expires_at >= ?)",
+                (*chunk, time.time())
+            ).fetchall()
+            found.update(row[0] for row in rows)
+        return found
+
+    def put(self, key: str, value: Any, ttl: Optional[float] = None):
+        now = time.time()
+        conn = self._conn()
+        conn.execute(
+            f"INSERT OR REPLACE INTO {self.table} (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+            (key, json.dumps(value), now + ttl if ttl is not None else None, now)
+        )
+        excess = self.count() - self.max_entries
+        if excess > 0:
+            conn.execute(
+                f"DELETE FROM {self.table} WHERE key IN "
+                f"(SELECT key FROM {self.table} ORDER BY accessed_at LIMIT ?)",
+                (excess,)
+            )
+
+    def clear(self):
+        self._conn().execute(f"DELETE FROM {self.table}")
+
+    def count(self) -> int:
+        return self._conn().execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+
+
+class SQLiteTokenBucket:
+    """
+    Token bucket whose state is a row in a SQLite file, so every server
+    process on the host draws from one rate limit. Same interface as
+    scraper.http_transport.TokenBucket.
+    """
+
+    def __init__(self, path: str, name: str, rate: float, capacity: Optional[float] = None):
+        self.path = path
+        self.name = name
+        self.rate = rate
+        self.capacity = capacity or rate
+        self._local = threading.local()
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn().execute(
+            "CREATE TABLE IF NOT EXISTS rate_limits (name TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL)"
+        )
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = _connect(self.path)
+            self._local.conn = conn
+        return conn
+
+    def _take(self) -> float:
+        """Take a token if one is available; otherwise return how long until one is"""
+        conn = self._conn()
+        # IMMEDIATE takes the write lock up front, so the read-modify-write is atomic across processes
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT tokens, updated_at FROM rate_limits WHERE name = ?", (self.name,)).fetchone()
+            now = time.time()
+            tokens = self.capacity if row is None else min(self.capacity, row[0] + max(0.0, now - row[1]) * self.rate)
+            wait = 0.0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                wait = (1 - tokens) / self.rate
+            conn.execute("INSERT OR REPLACE INTO rate_limits (name, tokens, updated_at) VALUES (?, ?, ?)",
+                         (self.name, tokens, now))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return wait
+
+    def acquire(self, token=None):
+        """Block until a request may be sent"""
+        while True:
+            wait = self._take()
+            if wait == 0:
+                return
+            if token:
+                token.check()
+            time.sleep(wait)
@@ -0,0 +1,139 @@
+import asyncio
+import threading
+from typing import Optional, Dict, Any, Hashable, Iterable, List, Tuple, Callable
+
+from cancellation import RequestCancelled
+
+
+class _Call:
+    """One in-progress upstream call that later callers wait on"""
+
+    def __init__(self):
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        self.done = False
+        self._event = threading.Event()
+        self._futures: List[Tuple[asyncio.AbstractEventLoop, asyncio.Future]] = []
+
+    @property
+    def abandoned(self) -> bool:
+        """The leader was cancelled, so waiters should make the call themselves"""
+        return isinstance(self.error, (RequestCancelled, asyncio.CancelledError))
+
+    def finish(self, result: Any = None, error: Optional[BaseException] = None):
+        self.result, self.error, self.done = result, error, True
+        self._event.set()
+        for loop, future in self._futures:
+            loop.call_soon_threadsafe(lambda f=future: f.done() or f.set_result(True))
+
+    def wait(self, token=None):
+        while not self._event.wait(0.25):
+            if token:
+                token.check()
+
+    async def wait_async(self, token=None):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._futures.append((loop, future))
+        if self.done:
+            return
+        while not future.done():
+            await asyncio.wait({future}, timeout=0.25)
+            if token and not future.done():
+                token.check()
+
+
+class SingleFlight:
+    """
+    Single Flight Module
+    Coalesces concurrent identical calls: the first caller for a key makes
+    the upstream call and later callers wait for its result instead of
+    issuing duplicates. If the first caller is cancelled, the next waiter
+    makes the call itself; any other error is raised to every waiter.
+    Only in-progress calls are shared, finished results are left to the caches.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: Dict[Hashable, _Call] = {}
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.coalesced = 0
+
+    def claim(self, keys: Iterable[Hashable]) -> Tuple[List[Hashable], Dict[Hashable, _Call]]:
+        """Split keys into those this caller must fetch and the in-progress calls it can wait on"""
+        led, waiting = [], {}
+        with self._lock:
+            for key in keys:
+                call = self._calls.get(key)
+                if call is None:
+                    self._calls[key] = _Call()
+                    led.append(key)
+                elif key not in waiting:
+                    waiting[key] = call
+            self.leaders += len(led)
+            self.coalesced += len(waiting)
+        return led, waiting
+
+    def complete(self, keys: Iterable[Hashable], results: Optional[Dict[Hashable, Any]] = None,
+                 error: Optional[BaseException] = None):
+        """Publish the outcome of claimed keys and wake their waiters"""
+        with self._lock:
+            calls = [(key, self._calls.pop(key)) for key in keys if key in self._calls]
+        for key, call in calls:
+            call.finish((results or {}).get(key), error)
+
+    def do(self, key: Hashable, fn: Callable[[], Any], token=None, copy: Optional[Callable[[Any], Any]] = None):
+        """
+        Return fn(), or the result of an identical call already in progress
+
+        copy is applied to a shared result so waiters do not alias the leader's objects.
+        """
+        while True:
+            led, waiting = self.claim([key])
+            if led:
+                try:
+                    result = fn()
+                except BaseException as e:
+                    self.complete(led, error=e)
+                    raise
+                self.complete(led, {key: result})
+                return result
+            call = waiting[key]
+            call.wait(token)
+            if call.abandoned:
+                continue
+            if call.error is not None:
+                raise call.error
+            return copy(call.result) if copy else call.result
+
+    async def do_async(self, key: Hashable, factory: Callable[[], Any], token=None,
+                       copy: Optional[Callable[[Any], Any]] = None):
+        """do() for coroutines; factory() returns the awaitable to run when this caller leads"""
+        while True:
+            led, waiting = self.claim([key])
+            if led:
+                try:
+                    result = await factory()
+                except BaseException as e:
+                    self.complete(led, error=e)
+                    raise
+                self.complete(led, {key: result})
+                return result
+            call = waiting[key]
+            await call.wait_async(token)
+            if call.abandoned:
+                continue
+            if call.error is not None:
+                raise call.error
+            return copy(call.result) if copy else call.result
+
+    def get_metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            calls = self.leaders + self.coalesced
+            return {
+                "in_flight": len(self._calls),
+                "upstream_calls": self.leaders,
+                "coalesced": self.coalesced,
+                "coalesced_rate": self.coalesced / calls if calls else 0.0,
+            }
@@ -0,0 +1,51 @@
+import sys
+import time
+from typing import Dict, Any, List
+
+# Import this first so the clock starts before the other imports
+_started = time.perf_counter()
+_last = _started
+_stages: List[Dict[str, Any]] = []
+
+# The voice stack, which a text-only server should never load. scipy and sklearn are
+# not listed: nltk imports them for keyword extraction, so every server loads them.
+HEAVY_MODULES = ("torch", "whisper", "speech_recognition", "pyttsx3")
+
+
+def mark(stage: str):
+    """Record how long the startup stage that just finished took"""
+    global _last
+    now = time.perf_counter()
+    _stages.append({"stage": stage, "seconds": round(now - _last, 3)})
+    _last = now
+
+
+def heavy_modules_loaded() -> List[str]:
+    return [name for name in HEAVY_MODULES if name in sys.modules]
+
+
+def _max_rss_mb() -> float:
+    try:
+        import resource
+    except ImportError:  # Windows
+        return 0.0
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return round(rss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def report() -> Dict[str, Any]:
+    """Startup stage timings, which heavy libraries are loaded now and peak memory"""
+    return {
+        "stages": list(_stages),
+        "startup_seconds": round(_last - _started, 3),
+        "heavy_modules_loaded": heavy_modules_loaded(),
+        "max_rss_mb": _max_rss_mb(),
+    }
+
+
+def print_report():
+    summary = report()
+    stages = ", ".join(f"{s['stage']} {s['seconds']:.2f}s" for s in summary["stages"])
+    print(f"[Startup] Ready in {summary['startup_seconds']:.2f}s ({stages}), peak RSS {summary['max_rss_mb']} MB, "
+          f"heavy modules: {', '.join(summary['heavy_modules_loaded']) or 'none'}")
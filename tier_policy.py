@@ -0,0 +1,63 @@
+import threading
+from typing import Optional, List, Dict, Any
+
+from generation_scheduler import GenerationScheduler
+
+# Heaviest first; a request is only ever moved down this list
+DEFAULT_TIERS = ["deepseek-r1:8b", "llama3.2:3b", "qwen3:1.7b"]
+
+
+class TierPolicy:
+    """
+    Tier Policy Module
+    Picks a lighter model when the requested one would miss the latency SLO.
+    Expected latency per tier comes from the generation scheduler: the queued
+    and running backlog times the recent average generation time.
+    """
+
+    def __init__(self, scheduler: GenerationScheduler, latency_slo: float, tiers: Optional[List[str]] = None):
+        self.scheduler = scheduler
+        self.latency_slo = latency_slo
+        self.tiers = list(tiers or DEFAULT_TIERS)
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.downgrades: Dict[str, int] = {}
+
+    def choose(self, model: str, token=None) -> str:
+        """The requested model, or the heaviest lighter tier expected to answer within the SLO"""
+        slo = self.latency_slo
+        if token is not None and token.remaining() is not None:
+            slo = min(slo, token.remaining())
+
+        candidates = self.tiers[self.tiers.index(model):] if model in self.tiers else [model]
+        expected = {}
+        chosen = None
+        for candidate in candidates:
+            expected[candidate] = self.scheduler.expected_latency(candidate)
+            if expected[candidate] <= slo:
+                chosen = candidate
+                break
+        if chosen is None:
+            # Every tier is over the SLO: take the one expected to finish first
+            chosen = min(expected, key=expected.get)
+
+        with self._lock:
+            self.requests += 1
+            if chosen != model:
+                transition = f"{model}->{chosen}"
+                self.downgrades[transition] = self.downgrades.get(transition, 0) + 1
+        if chosen != model:
+            print(f"[TierPolicy] {model} expected in {expected[model]:.1f}s (SLO {slo:.0f}s), using {chosen}")
+        return chosen
+
+    def get_metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            downgraded = sum(self.downgrades.values())
+            return {
+                "latency_slo_seconds": self.latency_slo,
+                "requests": self.requests,
+                "downgraded": downgraded,
+                "downgrade_rate": downgraded / self.requests if self.requests else 0.0,
+                "downgrades": dict(self.downgrades),
+                "expected_latency_seconds": {tier: self.scheduler.expected_latency(tier) for tier in self.tiers},
+            }
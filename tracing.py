@@ -0,0 +1,155 @@
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional, Dict, List, Any
+
+# Histogram bucket upper bounds in seconds
+LATENCY_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0]
+
+
+class Span:
+    """A timed stage of a request with free-form attributes (bytes, tokens, cache hits)"""
+
+    def __init__(self, name: str, parent: Optional["Span"], start: float, attrs: Dict[str, Any]):
+        self.name = name
+        self.parent = parent
+        self.start = start
+        self.duration: Optional[float] = None
+        self.attrs = dict(attrs)
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def to_dict(self, origin: float) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "parent": self.parent.name if self.parent else None,
+            "start_ms": round((self.start - origin) * 1000, 2),
+            "duration_ms": round(self.duration * 1000, 2) if self.duration is not None else None,
+            **self.attrs,
+        }
+
+
+class Trace:
+    """All spans recorded for one request"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.start = time.perf_counter()
+        self.spans: List[Span] = []
+        self.stack: List[Span] = []
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "total_ms": round((time.perf_counter() - self.start) * 1000, 2),
+            "spans": [span.to_dict(self.start) for span in self.spans],
+        }
+
+
+class LatencyHistograms:
+    """Process-wide latency histograms, one per span name"""
+
+    def __init__(self, buckets: List[float] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.stages: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, name: str, seconds: float):
+        with self._lock:
+            stage = self.stages.get(name)
+            if stage is None:
+                stage = {"count": 0, "sum": 0.0, "max": 0.0, "counts": [0] * (len(self.buckets) + 1)}
+                self.stages[name] = stage
+            stage["count"] += 1
+            stage["sum"] += seconds
+            stage["max"] = max(stage["max"], seconds)
+            index = next((i for i, bound in enumerate(self.buckets) if seconds <= bound), len(self.buckets))
+            stage["counts"][index] += 1
+
+    def _quantile(self, counts: List[int], total: int, q: float) -> Optional[float]:
+        # None means the quantile falls in the overflow bucket
+        target = q * total
+        seen = 0
+        for i, count in enumerate(counts):
+            seen += count
+            if seen >= target:
+                return self.buckets[i] if i < len(self.buckets) else None
+        return None
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Counts, sums and bucket upper-bound p50/p95 per stage"""
+        with self._lock:
+            result = {}
+            for name, stage in self.stages.items():
+                labels = [str(b) for b in self.buckets] + ["+Inf"]
+                result[name] = {
+                    "count": stage["count"],
+                    "sum_seconds": stage["sum"],
+                    "mean_seconds": stage["sum"] / stage["count"],
+                    "max_seconds": stage["max"],
+                    "p50_seconds": self._quantile(stage["counts"], stage["count"], 0.5),
+                    "p95_seconds": self._quantile(stage["counts"], stage["count"], 0.95),
+                    "buckets": dict(zip(labels, stage["counts"])),
+                }
+            return result
+
+
+histograms = LatencyHistograms()
+_local = threading.local()
+
+
+def current_trace() -> Optional[Trace]:
+    return getattr(_local, "trace", None)
+
+
+def start_trace(name: str) -> Trace:
+    """Begin collecting spans for the current thread's request"""
+    trace = Trace(name)
+    _local.trace = trace
+    return trace
+
+
+def end_trace() -> Optional[Trace]:
+    trace = current_trace()
+    _local.trace = None
+    return trace
+
+
+@contextmanager
+def span(name: str, **attrs):
+    """
+    Time a stage of the current request
+
+    The duration always feeds the process-wide histogram; it is also added to
+    the thread's active trace when one was started.
+    """
+    trace = current_trace()
+    parent = trace.stack[-1] if trace and trace.stack else None
+    s = Span(name, parent, time.perf_counter(), attrs)
+    if trace:
+        trace.spans.append(s)
+        trace.stack.append(s)
+    try:
+        yield s
+    finally:
+        s.duration = time.perf_counter() - s.start
+        if trace:
+            trace.stack.pop()
+        histograms.observe(name, s.duration)
+
+
+def record(name: str, seconds: float, trace: Optional[Trace] = None, **attrs):
+    """
+    Record a stage timed elsewhere, such as durations reported by Ollama
+
+    Pass trace explicitly when recording from a different thread than the one
+    that started it (e.g. the ASGI event loop).
+    """
+    trace = trace or current_trace()
+    if trace:
+        parent = trace.stack[-1] if trace.stack else None
+        s = Span(name, parent, time.perf_counter() - seconds, attrs)
+        s.duration = seconds
+        trace.spans.append(s)
+    histograms.observe(name, seconds)
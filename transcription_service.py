@@ -0,0 +1,330 @@
+import gc
+import queue
+import sys
+import threading
+import time
+from multiprocessing.managers import BaseManager
+from typing import Optional, Dict, List, Any, Tuple
+
+
+class TranscriptionQueueFull(Exception):
+    """Raised when the transcription queue cannot accept another job"""
+
+
+def _release_memory():
+    """Hand a dropped Whisper model's memory back to the OS"""
+    gc.collect()
+    torch = sys.modules.get("torch")
+    if torch is not None and torch.cuda.is_available():
+        torch.cuda.empty_cache()
+    if sys.platform.startswith("linux"):
+        # glibc keeps freed heap pages mapped until asked to trim them
+        try:
+            import ctypes
+            ctypes.CDLL("libc.so.6").malloc_trim(0)
+        except (OSError, AttributeError):
+            pass
+
+
+class TranscriptionJob:
+    """A single audio clip waiting to be transcribed by a Whisper worker"""
+
+    def __init__(self, audio: Any, options: Dict[str, Any]):
+        self.audio = audio
+        self.options = options
+        self.submitted_at = time.monotonic()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.result: Optional[dict] = None
+        self.error: Optional[Exception] = None
+        # Set when the caller stopped waiting; a worker that has not started it yet skips it
+        self.abandoned = False
+        self._done = threading.Event()
+
+    def wait(self, timeout: Optional[float] = None) -> Optional[dict]:
+        """Block until the job finishes and return the raw Whisper result"""
+        if not self._done.wait(timeout):
+            self.abandoned = True
+            raise TimeoutError(f"Transcription did not finish in {timeout}s")
+        if self.error:
+            raise self.error
+        return self.result
+
+
+class TranscriptionService:
+    """
+    Transcription Service Module
+    Owns a fixed number of Whisper model replicas, each served by its own
+    worker thread, and feeds them from a bounded job queue.
+    With idle_unload set, a replica frees its model after that many seconds
+    without a job or preload() call, and loads it again in the background on
+    the next one.
+    """
+
+    def __init__(self, whisper_model: str = "tiny", replicas: int = 1, max_queue: int = 8,
+                 idle_unload: float = 0.0):
+        self.whisper_model_name = whisper_model
+        self.replicas = max(1, replicas)
+        self.max_queue = max_queue
+        self.idle_unload = idle_unload
+        self.jobs: "queue.Queue[Optional[TranscriptionJob]]" = queue.Queue(maxsize=max_queue)
+        # Voice activity keeps the replicas loaded; startup counts as activity
+        self._last_activity = time.monotonic()
+
+        self._stats_lock = threading.Lock()
+        self._busy_workers = 0
+        self._completed = 0
+        self._failed = 0
+        self._rejected = 0
+        self._abandoned = 0
+        self._total_wait = 0.0
+        self._total_run = 0.0
+        self._loaded_replicas = 0
+        self._loads = 0
+        self._unloads = 0
+
+        self.workers: List[threading.Thread] = []
+        for i in range(self.replicas):
+            worker = threading.Thread(target=self._worker_loop, args=(i,),
+                                      name=f"whisper-worker-{i}", daemon=True)
+            worker.start()
+            self.workers.append(worker)
+
+    def _load_model(self):
+        import whisper
+        print(f"[TranscriptionService] Loading Whisper model: {self.whisper_model_name}")
+        return whisper.load_model(self.whisper_model_name)
+
+    def _worker_loop(self, index: int):
+        model = None
+        # After a failed load, background loads back off (5s doubling to 5 min); a job always retries
+        failures = 0
+        retry_at = 0.0
+        while True:
+            # Without idle unloading the model is loaded once and workers just block on the queue
+            if model is None and time.monotonic() >= retry_at and self._wants_model():
+                model = self._load_replica(index)
+                failures, retry_at = self._load_backoff(model, failures)
+            try:
+                job = self.jobs.get(timeout=1.0 if self.idle_unload > 0 else None)
+            except queue.Empty:
+                if model is not None and not self._wants_model():
+                    model = None
+                    self._unload_replica(index)
+                continue
+            if job is None:
+                self.jobs.task_done()
+                break
+            if job.abandoned:
+                # Nobody is waiting for it (and its temp file may be gone), so keep the capacity for live jobs
+                with self._stats_lock:
+                    self._abandoned += 1
+                self.jobs.task_done()
+                continue
+
+            if model is None:
+                # Unloaded while idle, or the last load failed: this job waits for the reload
+                model = self._load_replica(index)
+                failures, retry_at = self._load_backoff(model, failures)
+
+            job.started_at = time.monotonic()
+            with self._stats_lock:
+                self._busy_workers += 1
+            try:
+                if model is None:
+                    raise RuntimeError("Whisper model is not available")
+                job.result = model.transcribe(job.audio, **job.options)
+            except Exception as e:
+                job.error = e
+            finally:
+                job.finished_at = time.monotonic()
+                with self._stats_lock:
+                    self._busy_workers -= 1
+                    self._total_wait += job.started_at - job.submitted_at
+                    self._total_run += job.finished_at - job.started_at
+                    self._last_activity = job.finished_at
+                    if job.error:
+                        self._failed += 1
+                    else:
+                        self._completed += 1
+                job._done.set()
+                self.jobs.task_done()
+
+    def _wants_model(self) -> bool:
+        """Whether replicas should be loaded: always, or only after recent voice activity"""
+        if self.idle_unload <= 0:
+            return True
+        with self._stats_lock:
+            return time.monotonic() - self._last_activity < self.idle_unload
+
+    def _load_replica(self, index: int):
+        """One worker's replica, or None if loading failed"""
+        try:
+            model = self._load_model()
+        except Exception as e:
+            print(f"[TranscriptionService] Worker {index} failed to load Whisper: {e}")
+            return None
+        with self._stats_lock:
+            self._loaded_replicas += 1
+            self._loads += 1
+        return model
+
+    @staticmethod
+    def _load_backoff(model, failures: int):
+        """(failures, retry_at) after a load attempt"""
+        if model is not None:
+            return 0, 0.0
+        failures += 1
+        return failures, time.monotonic() + min(300.0, 5.0 * 2 ** (failures - 1))
+
+    def _unload_replica(self, index: int):
+        _release_memory()
+        with self._stats_lock:
+            self._loaded_replicas -= 1
+            self._unloads += 1
+        print(f"[TranscriptionService] Worker {index} unloaded Whisper after {self.idle_unload:.0f}s idle")
+
+    def preload(self) -> int:
+        """
+        Start loading any unloaded replicas in the background, e.g. when a user opens the microphone
+
+        Returns how many replicas are loaded right now.
+        """
+        with self._stats_lock:
+            self._last_activity = time.monotonic()
+            return self._loaded_replicas
+
+    def submit(self, audio: Any, block_timeout: float = 0.0, **options) -> TranscriptionJob:
+        """
+        Queue an audio clip for transcription
+
+        Args:
+            audio: Path to an audio file or a 16kHz float32 array
+            block_timeout: Seconds to wait for queue space before rejecting
+            **options: Keyword arguments forwarded to whisper's transcribe()
+
+        Raises:
+            TranscriptionQueueFull: If the queue is still full after block_timeout
+        """
+        job = TranscriptionJob(audio, options)
+        with self._stats_lock:
+            self._last_activity = job.submitted_at
+        try:
+            if block_timeout > 0:
+                self.jobs.put(job, timeout=block_timeout)
+            else:
+                self.jobs.put_nowait(job)
+        except queue.Full:
+            with self._stats_lock:
+                self._rejected += 1
+            raise TranscriptionQueueFull(
+                f"Transcription queue is full ({self.max_queue} jobs waiting)"
+            )
+        return job
+
+    def transcribe(self, audio: Any, timeout: Optional[float] = 60.0,
+                   block_timeout: float = 0.0, **options) -> Optional[dict]:
+        """Submit a job and wait for its Whisper result"""
+        job = self.submit(audio, block_timeout=block_timeout, **options)
+        return job.wait(timeout)
+
+    def estimated_wait(self) -> float:
+        """Rough seconds a new job would wait before a worker picks it up"""
+        with self._stats_lock:
+            finished = self._completed + self._failed
+            avg_run = self._total_run / finished if finished else 0.0
+        return avg_run * (self.jobs.qsize() / self.replicas)
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Queue depth and throughput counters"""
+        with self._stats_lock:
+            finished = self._completed + self._failed
+            return {
+                "model": self.whisper_model_name,
+                "replicas": self.replicas,
+                "loaded_replicas": self._loaded_replicas,
+                "loads": self._loads,
+                "unloads": self._unloads,
+                "idle_unload_seconds": self.idle_unload,
+                "queue_depth": self.jobs.qsize(),
+                "max_queue": self.max_queue,
+                "busy_workers": self._busy_workers,
+                "completed": self._completed,
+                "failed": self._failed,
+                "rejected": self._rejected,
+                "abandoned": self._abandoned,
+                "avg_wait_seconds": self._total_wait / finished if finished else 0.0,
+                "avg_run_seconds": self._total_run / finished if finished else 0.0,
+            }
+
+    def shutdown(self):
+        """Stop all workers once the queued jobs are drained"""
+        for _ in self.workers:
+            self.jobs.put(None)
+        for worker in self.workers:
+            worker.join()
+
+
+# ----------------------------- Dedicated Whisper process -----------------------------
+
+_hosted_service: Optional[TranscriptionService] = None
+
+
+def _start_hosted_service(whisper_model: str, replicas: int, max_queue: int, idle_unload: float):
+    global _hosted_service
+    _hosted_service = TranscriptionService(whisper_model=whisper_model, replicas=replicas, max_queue=max_queue,
+                                           idle_unload=idle_unload)
+
+
+def _get_hosted_service() -> TranscriptionService:
+    return _hosted_service
+
+
+class TranscriptionManager(BaseManager):
+    """Serves one TranscriptionService from its own process to every server worker"""
+
+
+TranscriptionManager.register(
+    "transcription_service", callable=_get_hosted_service,
+    exposed=("transcribe", "preload", "estimated_wait", "get_metrics")
+)
+
+
+def start_transcription_server(address: Tuple[str, int], authkey: bytes, whisper_model: str = "tiny",
+                               replicas: int = 1, max_queue: int = 8,
+                               idle_unload: float = 0.0) -> TranscriptionManager:
+    """Start the Whisper process; manager.address is the bound address and manager.shutdown() stops it"""
+    manager = TranscriptionManager(address=address, authkey=authkey)
+    manager.start(initializer=_start_hosted_service, initargs=(whisper_model, replicas, max_queue, idle_unload))
+    print(f"[TranscriptionService] Whisper process serving on {manager.address}")
+    return manager
+
+
+class RemoteTranscriptionService:
+    """
+    Client for a TranscriptionService running in the dedicated Whisper process
+    Same calls as TranscriptionService; TranscriptionQueueFull and timeouts are
+    re-raised here from the remote side.
+    """
+
+    def __init__(self, address: Tuple[str, int], authkey: bytes):
+        manager = TranscriptionManager(address=address, authkey=authkey)
+        manager.connect()
+        self._service = manager.transcription_service()
+
+    def transcribe(self, audio: Any, timeout: Optional[float] = 60.0,
+                   block_timeout: float = 0.0, **options) -> Optional[dict]:
+        return self._service.transcribe(audio, timeout, block_timeout, **options)
+
+    def preload(self) -> int:
+        return self._service.preload()
+
+    def estimated_wait(self) -> float:
+        return self._service.estimated_wait()
+
+    def get_metrics(self) -> Dict[str, Any]:
+        return self._service.get_metrics()
+
+    def shutdown(self):
+        # The Whisper process is owned by the launcher that started it
+        pass
@@ -0,0 +1,176 @@
+import hashlib
+import io
+import os
+import queue
+import re
+import tempfile
+import threading
+import wave
+from collections import OrderedDict
+from typing import Optional, Dict, List, Iterator, Any
+
+
+class NothingToSpeak(ValueError):
+    """Raised when text has no words to synthesize, e.g. only punctuation"""
+
+
+# Voice settings a request may override; restored to the engine defaults before every job
+ENGINE_PROPERTIES = ("rate", "volume", "voice")
+
+
+def split_sentences(text: str) -> List[str]:
+    """Split text into sentences so long answers can be spoken incrementally"""
+    sentences = re.split(r'(?<=[.!?])\s+|\n+', text)
+    # Punctuation-only fragments ("...", "-") have nothing to speak
+    return [s.strip() for s in sentences if s and re.search(r'\w', s)]
+
+
+def merge_wavs(chunks: List[bytes]) -> bytes:
+    """Concatenate WAV files that share the same audio parameters"""
+    if len(chunks) == 1:
+        return chunks[0]
+
+    output = io.BytesIO()
+    with wave.open(output, 'wb') as out_wav:
+        for i, chunk in enumerate(chunks):
+            with wave.open(io.BytesIO(chunk), 'rb') as in_wav:
+                if i == 0:
+                    out_wav.setparams(in_wav.getparams())
+                out_wav.writeframes(in_wav.readframes(in_wav.getnframes()))
+    return output.getvalue()
+
+
+class _SynthesisJob:
+    def __init__(self, text: str, settings: Dict[str, Any]):
+        self.text = text
+        self.settings = settings
+        self.audio: Optional[bytes] = None
+        self.error: Optional[Exception] = None
+        self.done = threading.Event()
+
+
+class TTSService:
+    """
+    TTS Service Module
+    Serializes all pyttsx3 access on one worker thread and keeps an LRU
+    cache of synthesized audio keyed by text and voice settings.
+    """
+
+    def __init__(self, cache_size: int = 256, cache_bytes: int = 64 * 1024 * 1024,
+                 synthesis_timeout: float = 60.0):
+        self.cache_size = cache_size
+        self.synthesis_timeout = synthesis_timeout
+        self.cache_bytes = cache_bytes
+        self.cache: "OrderedDict[str, bytes]" = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._cached_bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+        self.jobs: "queue.Queue[Optional[_SynthesisJob]]" = queue.Queue()
+        self.worker = threading.Thread(target=self._worker_loop, name="tts-worker", daemon=True)
+        self.worker.start()
+
+    # ---------------------------Cache---------------------------
+    def _cache_key(self, text: str, settings: Dict[str, Any]) -> str:
+        settings_key = "|".join(f"{k}={settings[k]}" for k in sorted(settings))
+        return hashlib.sha256(f"{settings_key}\n{text}".encode('utf-8')).hexdigest()
+
+    def _cache_get(self, key: str) -> Optional[bytes]:
+        with self._cache_lock:
+            audio = self.cache.get(key)
+            if audio is None:
+                self.misses += 1
+                return None
+            self.cache.move_to_end(key)
+            self.hits += 1
+            return audio
+
+    def _cache_put(self, key: str, audio: bytes):
+        with self._cache_lock:
+            if key in self.cache:
+                self._cached_bytes -= len(self.cache.pop(key))
+            self.cache[key] = audio
+            self._cached_bytes += len(audio)
+            while self.cache and (len(self.cache) > self.cache_size or self._cached_bytes > self.cache_bytes):
+                _, evicted = self.cache.popitem(last=False)
+                self._cached_bytes -= len(evicted)
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Cache usage and hit-rate counters"""
+        with self._cache_lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self.cache),
+                "bytes": self._cached_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "queue_depth": self.jobs.qsize(),
+            }
+
+    # ---------------------------Engine worker---------------------------
+    def _worker_loop(self):
+        # pyttsx3 engines are not thread-safe, so this thread owns the only one
+        engine = None
+        defaults: Dict[str, Any] = {}
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                break
+            temp_path = None
+            try:
+                if engine is None:
+                    # Imported on the first synthesis so text-only servers never load it
+                    import pyttsx3
+                    engine = pyttsx3.init()
+                    defaults = {name: engine.getProperty(name) for name in ENGINE_PROPERTIES}
+                # The engine is shared, so a previous request's voice settings must not carry over
+                for name, value in {**defaults, **job.settings}.items():
+                    engine.setProperty(name, value)
+
+                with tempfile.NamedTemporaryFile(delete=False, suffix='.wav') as temp_audio:
+                    temp_path = temp_audio.name
+                engine.save_to_file(job.text, temp_path)
+                engine.runAndWait()
+
+                with open(temp_path, 'rb') as audio_file:
+                    job.audio = audio_file.read()
+            except Exception as e:
+                job.error = e
+            finally:
+                if temp_path and os.path.exists(temp_path):
+                    os.unlink(temp_path)
+                job.done.set()
+
+    def _synthesize_one(self, text: str, settings: Dict[str, Any]) -> bytes:
+        key = self._cache_key(text, settings)
+        audio = self._cache_get(key)
+        if audio is not None:
+            return audio
+
+        job = _SynthesisJob(text, settings)
+        self.jobs.put(job)
+        if not job.done.wait(self.synthesis_timeout):
+            raise TimeoutError(f"Speech synthesis did not finish in {self.synthesis_timeout}s")
+        if job.error:
+            raise job.error
+        self._cache_put(key, job.audio)
+        return job.audio
+
+    # ---------------------------Public API---------------------------
+    def synthesize_stream(self, text: str, **settings) -> Iterator[bytes]:
+        """Yield one WAV clip per sentence as soon as each is ready"""
+        for sentence in split_sentences(text):
+            yield self._synthesize_one(sentence, settings)
+
+    def synthesize(self, text: str, **settings) -> bytes:
+        """Return a single WAV for the whole text, built from cached sentences"""
+        chunks = list(self.synthesize_stream(text, **settings))
+        if not chunks:
+            raise NothingToSpeak("No speakable text provided")
+        return merge_wavs(chunks)
+
+    def shutdown(self):
+        self.jobs.put(None)
+        self.worker.join()
@@ -1,3 +1,4 @@
+import startup_report  # first, so the startup clock covers every import below
 from flask import Flask, request, jsonify, send_from_directory, Response
 from flask_cors import CORS
 import os
@@ -5,29 +6,61 @@ import sys
 import io
 import re
 import tempfile
-import pyttsx3
-import threading
+import json
+import base64
 
 # Add the parent directory to the Python path to allow importing from other modules
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 from main import IBAT
+from ollama_client import parse_thinking
+from transcription_service import TranscriptionQueueFull
+from generation_scheduler import GenerationQueueFull
+from tts_service import TTSService, NothingToSpeak
+from cancellation import RequestRegistry, RequestCancelled
+import tracing
+
+startup_report.mark("imports")
 
 # --- Initialization ---
+# Set by serve_workers.py when this module is loaded in a forked worker
+transcription_address = os.environ.get('IBAT_TRANSCRIPTION_ADDRESS')
+if transcription_address:
+    whisper_host, whisper_port = transcription_address.rsplit(':', 1)
+    transcription_address = (whisper_host, int(whisper_port))
+
 print("Initializing IBAT...")
-ibat_instance = IBAT(voice=False)  # Initialize with voice=False for web use
+ibat_instance = IBAT(
+    # Text-only servers skip the microphone, Whisper and torch entirely
+    voice=os.environ.get('IBAT_TEXT_ONLY', '0') != '1',
+    # Off in serve_workers.py workers, which send uploaded audio to the shared Whisper process
+    microphone=os.environ.get('IBAT_MICROPHONE', '1') == '1',
+    answer_cache=os.environ.get('IBAT_ANSWER_CACHE', '0') == '1',
+    answer_cache_ttl=float(os.environ.get('IBAT_ANSWER_CACHE_TTL', '3600')),
+    osdr_mirror=os.environ.get('IBAT_OSDR_MIRROR', '1') == '1',
+    extra_corpora=[p for p in os.environ.get('IBAT_CORPUS_PATHS', '').split(os.pathsep) if p],
+    sync_data=os.environ.get('IBAT_SYNC_DATA', '1') == '1',
+    shared_cache_db=os.environ.get('IBAT_SHARED_CACHE_DB') or None,
+    transcription_address=transcription_address,
+    transcription_authkey=bytes.fromhex(os.environ.get('IBAT_TRANSCRIPTION_AUTHKEY', '')),
+    generation_concurrency=int(os.environ.get('IBAT_OLLAMA_CONCURRENCY', '1')),
+    generation_queue=int(os.environ.get('IBAT_OLLAMA_QUEUE', '16')),
+    generation_models=int(os.environ.get('IBAT_OLLAMA_MAX_MODELS', '1')),
+    latency_slo=float(os.environ['IBAT_LATENCY_SLO']) if os.environ.get('IBAT_LATENCY_SLO') else None,
+    session_context=os.environ.get('IBAT_SESSION_CONTEXT', '1') == '1',
+    thinking=parse_thinking(os.environ['IBAT_THINKING']) if os.environ.get('IBAT_THINKING') else None,
+    digest_model=os.environ.get('IBAT_DIGEST_MODEL') or None,
+    prefetch=os.environ.get('IBAT_PREFETCH', '1') == '1',
+    ollama_urls=[u.strip() for u in os.environ.get('IBAT_OLLAMA_URLS', '').split(',') if u.strip()] or None,
+    whisper_idle_unload=float(os.environ.get('IBAT_WHISPER_IDLE_MINUTES', '10')) * 60
+)
 print("IBAT Initialized.")
+startup_report.mark("ibat")
 
-# Create a separate TTS engine for web use
-tts_engine = None
-tts_lock = threading.Lock()
+# Shared TTS worker with a cache of synthesized sentences
+tts_service = TTSService()
 
-def get_tts_engine():
-    """Get or create TTS engine thread-safely"""
-    global tts_engine
-    with tts_lock:
-        if tts_engine is None:
-            tts_engine = pyttsx3.init()
-        return tts_engine
+# One in-flight chat per session; a new question cancels the previous one
+active_requests = RequestRegistry(deadline=float(os.environ.get('IBAT_REQUEST_DEADLINE', '180')))
 
 app = Flask(__name__, static_folder='frontend', static_url_path='')
 CORS(app)
@@ -52,23 +85,31 @@ def chat():
     data = request.get_json()
     user_prompt = data.get('message')
     size = data.get('size', 'medium')
+    session_id = data.get('session_id')
     
     if not user_prompt:
         return jsonify({"error": "No message provided"}), 400
     
     print(f"Received user prompt: {user_prompt}")
     
-    # Set model weight
-    ibat_instance.weight = size
-    
+    token = active_requests.start(session_id)
     try:
-        response_data = ibat_instance.run(user_prompt)
+        response_data = ibat_instance.run(user_prompt, weight=size, token=token, session_id=session_id)
         response_text = response_data.get("response", "")
         sources = response_data.get("sources", [])
+        model = response_data.get("model")
+        requested_model = response_data.get("requested_model")
+        trace = response_data.get("trace")
         print(f"Generated response: {response_text}")
+    except RequestCancelled as e:
+        return cancelled_response(e)
+    except GenerationQueueFull as e:
+        return generation_busy_response(e)
     except Exception as e:
         print(f"Error during processing: {e}")
         return jsonify({"error": "Internal server error"}), 500
+    finally:
+        active_requests.finish(session_id, token)
     
     formatted_response = format_response_text(response_text)
     
@@ -80,11 +121,32 @@ def chat():
     # except Exception as e:
     #     print(f"TTS error: {e}")
     
-    return jsonify({"response": formatted_response, "sources": sources})
+    body = {"response": formatted_response, "sources": sources, "model": model,
+            "downgraded": model != requested_model}
+    if data.get('debug'):
+        body["debug"] = trace
+    return jsonify(body)
+
+def cancelled_response(error):
+    """409 when superseded by a newer question, 504 when the deadline passed"""
+    print(f"Request stopped: {error.reason}")
+    status = 504 if error.reason == "deadline exceeded" else 409
+    return jsonify({"error": f"Request {error.reason}", "reason": error.reason}), status
+
+def generation_busy_response(error):
+    """503 with a Retry-After hint when Ollama's queue is saturated"""
+    print(f"Generation rejected: {error}")
+    response = jsonify({"error": "The model is busy, try again shortly"})
+    response.headers['Retry-After'] = str(int(error.retry_after) + 1)
+    return response, 503
 
 @app.route('/api/listen', methods=['POST'])
 def listen():
     print("Received request to listen for speech...")
+    if not ibat_instance.voice:
+        return voice_disabled_response()
+    if ibat_instance.vad is None:
+        return microphone_unavailable_response()
     try:
         # Check if IBAT has listen_for_speech method
         if hasattr(ibat_instance, 'listen_for_speech'):
@@ -95,10 +157,73 @@ def listen():
                 return jsonify({"error": "No speech detected or understood"}), 400
         else:
             return jsonify({"error": "Speech recognition not available"}), 501
+    except TranscriptionQueueFull as e:
+        return transcription_busy_response(e)
     except Exception as e:
         print(f"Error during speech recognition: {e}")
         return jsonify({"error": "Failed to process audio"}), 500
 
+@app.route('/api/whisper/preload', methods=['POST'])
+def preload_whisper():
+    """Start reloading an idle-unloaded Whisper before the user speaks"""
+    if not ibat_instance.voice:
+        return voice_disabled_response()
+    loaded = ibat_instance.preload_whisper()
+    return jsonify({"loaded_replicas": loaded}), 202
+
+@app.route('/api/transcribe', methods=['POST'])
+def transcribe_upload():
+    """Transcribe an uploaded audio file (multipart field 'audio')"""
+    if not ibat_instance.voice:
+        return voice_disabled_response()
+    audio_file = request.files.get('audio')
+    if audio_file is None:
+        return jsonify({"error": "No audio file provided"}), 400
+
+    suffix = os.path.splitext(audio_file.filename or '')[1] or '.wav'
+    with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as temp_audio:
+        audio_file.save(temp_audio)
+        temp_path = temp_audio.name
+
+    try:
+        transcribed_text = ibat_instance.transcribe_file(temp_path)
+        if transcribed_text:
+            return jsonify({"text": transcribed_text})
+        return jsonify({"error": "No speech detected or understood"}), 400
+    except TranscriptionQueueFull as e:
+        return transcription_busy_response(e)
+    except Exception as e:
+        print(f"Error during audio transcription: {e}")
+        return jsonify({"error": "Failed to process audio"}), 500
+    finally:
+        os.unlink(temp_path)
+
+def voice_disabled_response():
+    """501 from a text-only server (IBAT_TEXT_ONLY=1)"""
+    return jsonify({"error": "Voice input is disabled on this server"}), 501
+
+def microphone_unavailable_response():
+    """501 when this server has no microphone set up (serve_workers.py, or calibration failed)"""
+    return jsonify({"error": "Microphone input is not available on this server, upload audio to /api/transcribe"}), 501
+
+def transcription_busy_response(error):
+    """503 with a Retry-After hint when the Whisper queue is saturated"""
+    print(f"Transcription rejected: {error}")
+    retry_after = max(1, int(ibat_instance.transcription_service.estimated_wait()) + 1)
+    response = jsonify({"error": "Transcription service busy, try again shortly"})
+    response.headers['Retry-After'] = str(retry_after)
+    return response, 503
+
+def clean_tts_text(text):
+    """Strip thinking blocks and HTML tags before speaking"""
+    clean_text = re.sub(r'<think>.*?</think>', '', text, flags=re.DOTALL)
+    clean_text = re.sub(r'<br\s*/?>', '\n', clean_text)
+    return re.sub(r'<.*?>', '', clean_text)
+
+def tts_settings(data):
+    """Optional pyttsx3 voice settings from the request body"""
+    return {key: data[key] for key in ('rate', 'volume', 'voice') if data.get(key) is not None}
+
 @app.route('/api/tts', methods=['POST'])
 def tts():
     data = request.get_json()
@@ -108,31 +233,37 @@ def tts():
         return jsonify({"error": "No text provided"}), 400
     
     try:
-        # Clean text for TTS
-        clean_text = re.sub(r'<.*?>', '', text)  # Remove HTML tags
-        clean_text = re.sub(r'<think>.*?</think>', '', clean_text, flags=re.DOTALL)
-        
-        # Create temporary file for audio
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.wav') as temp_audio:
-            temp_path = temp_audio.name
-        
-        # Generate audio
-        engine = get_tts_engine()
-        engine.save_to_file(clean_text, temp_path)
-        engine.runAndWait()
-        
-        # Read audio file
-        with open(temp_path, 'rb') as audio_file:
-            audio_data = audio_file.read()
-        
-        # Clean up temp file
-        os.unlink(temp_path)
-        
+        audio_data = tts_service.synthesize(clean_tts_text(text), **tts_settings(data))
         return Response(audio_data, mimetype='audio/wav')
+    except NothingToSpeak as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         print(f"TTS error: {e}")
         return jsonify({"error": f"TTS failed: {str(e)}"}), 500
 
+@app.route('/api/tts/stream', methods=['POST'])
+def tts_stream():
+    """Stream one base64 WAV per sentence as newline-delimited JSON"""
+    data = request.get_json()
+    text = data.get('text')
+
+    if not text:
+        return jsonify({"error": "No text provided"}), 400
+
+    clean_text = clean_tts_text(text)
+    settings = tts_settings(data)
+
+    def generate():
+        try:
+            for index, audio_data in enumerate(tts_service.synthesize_stream(clean_text, **settings)):
+                chunk = base64.b64encode(audio_data).decode('ascii')
+                yield json.dumps({"index": index, "audio": chunk}) + "\n"
+        except Exception as e:
+            print(f"TTS error: {e}")
+            yield json.dumps({"error": f"TTS failed: {str(e)}"}) + "\n"
+
+    return Response(generate(), mimetype='application/x-ndjson')
+
 @app.route('/api/get-reports', methods=['GET'])
 def get_reports():
     """Return the current NCBI and OSDR queries"""
@@ -149,6 +280,32 @@ def get_reports():
         print(f"Error getting reports: {e}")
         return jsonify({'ncbi_queries': [], 'osdr_queries': []}), 500
 
+@app.route('/api/metrics', methods=['GET'])
+def metrics():
+    """Return service queue and throughput metrics"""
+    return jsonify({
+        'transcription': (ibat_instance.transcription_service.get_metrics()
+                          if ibat_instance.transcription_service else None),
+        'tts': tts_service.get_metrics(),
+        'answer_cache': ibat_instance.answer_cache.get_metrics() if ibat_instance.answer_cache else None,
+        'article_cache': ibat_instance.rag_processor.ncbi.article_cache.get_metrics(),
+        'osdr_query_cache': ibat_instance.rag_processor.osdr.cache.get_metrics(),
+        'generation': ibat_instance.ollama_client.scheduler.get_metrics(),
+        'ollama_tokens': ibat_instance.ollama_client.get_metrics(),
+        'ollama_backends': ibat_instance.ollama_client.pool.get_metrics(),
+        'prefetch': ibat_instance.prefetcher.get_metrics() if ibat_instance.prefetcher else None,
+        'single_flight': {
+            'ncbi_articles': ibat_instance.rag_processor.ncbi.inflight.get_metrics(),
+            'osdr_search': ibat_instance.rag_processor.osdr.inflight.get_metrics(),
+            'ollama_generate': ibat_instance.ollama_client.inflight.get_metrics()
+        },
+        'tier_policy': ibat_instance.tier_policy.get_metrics() if ibat_instance.tier_policy else None,
+        'generation_sessions': (ibat_instance.generation_sessions.get_metrics()
+                                if ibat_instance.generation_sessions else None),
+        'latency': tracing.histograms.snapshot(),
+        'startup': startup_report.report()
+    })
+
 # --- Frontend Serving ---
 @app.route('/')
 def index():
@@ -159,6 +316,9 @@ def serve_frontend(path):
     # This is to serve static files like CSS, JS
     return send_from_directory('frontend', path)
 
+startup_report.mark("app")
+startup_report.print_report()
+
 # --- Main Execution ---
 if __name__ == '__main__':
     print("Starting web server...")
@@ -1,19 +1,40 @@
-import speech_recognition as sr
-import whisper
 import numpy as np
 import tempfile
 import wave
 import os
 import io
-from typing import Optional
+from typing import Optional, TYPE_CHECKING
 from pathlib import Path
-import scipy.signal
+from transcription_service import TranscriptionQueueFull
+
+# speech_recognition, whisper (and torch with it) and scipy are imported only
+# once voice input is set up, so text-only servers never load them
+if TYPE_CHECKING:
+    import speech_recognition as sr
+
+
+WHISPER_ARTIFACTS = [
+    'thank you', 'thanks for watching', 'subscribe', 'like and subscribe',
+    'you', 'the', 'a', 'an', 'and', 'or', 'but', 'so', 'if', 'then',
+    'uh', 'um', 'ah', 'eh', 'oh', 'wow', 'yeah', 'yes', 'no', 'okay', 'ok'
+]
+
+
+def filter_transcription(text: str) -> Optional[str]:
+    """Drop empty, punctuation-only, very short or hallucinated Whisper output."""
+    text = (text or '').strip()
+    # Whisper punctuates its hallucinations ("Thank you."), so compare without it
+    words = text.lower().strip(' .,!?').strip()
+    if len(words) < 2 or words in WHISPER_ARTIFACTS:
+        return None
+    return text
 
 class WhisperVoiceActivityDetector:
-    def __init__(self, recognizer: sr.Recognizer, microphone: sr.Microphone, 
+    def __init__(self, recognizer: "sr.Recognizer", microphone: "sr.Microphone",
                  whisper_model: str = "tiny", energy_threshold: int = 300, 
                  dynamic_threshold: bool = True, pause_threshold: float = 0.8, 
-                 phrase_threshold: float = 0.3, non_speaking_duration: float = 0.5):
+                 phrase_threshold: float = 0.3, non_speaking_duration: float = 0.5,
+                 transcription_service=None):
         
         self.recognizer = recognizer
         self.microphone = microphone
@@ -30,15 +51,19 @@ class WhisperVoiceActivityDetector:
         self.recognizer.phrase_threshold = phrase_threshold
         self.recognizer.non_speaking_duration = non_speaking_duration
         
-        # Init Whisper
+        # Init Whisper (shared service if provided, otherwise a private model)
         self.whisper_model_name = whisper_model
-        print(f"Loading Whisper model: {whisper_model}")
-        try:
-            self.whisper_model = whisper.load_model(whisper_model)
-            print(f"Whisper model loaded successfully")
-        except Exception as e:
-            print(f"Failed to load Whisper model: {e}")
-            raise
+        self.transcription_service = transcription_service
+        self.whisper_model = None
+        if self.transcription_service is None:
+            print(f"Loading Whisper model: {whisper_model}")
+            try:
+                import whisper
+                self.whisper_model = whisper.load_model(whisper_model)
+                print(f"Whisper model loaded successfully")
+            except Exception as e:
+                print(f"Failed to load Whisper model: {e}")
+                raise
         
         self.is_listening = False
         self.listen_thread = None
@@ -52,8 +77,14 @@ class WhisperVoiceActivityDetector:
             self.recognizer.adjust_for_ambient_noise(source, duration=2)
         
         print(f"Calibration complete. Energy threshold: {self.recognizer.energy_threshold}")
+
+    def _run_whisper(self, audio, **options) -> dict:
+        """Run Whisper on a file path or array, through the shared service when available."""
+        if self.transcription_service is not None:
+            return self.transcription_service.transcribe(audio, **options)
+        return self.whisper_model.transcribe(audio, **options)
     
-    def transcribe_audio_data(self, audio_data: sr.AudioData) -> Optional[str]:
+    def transcribe_audio_data(self, audio_data: "sr.AudioData") -> Optional[str]:
         """Transcribe audio data directly without creating temporary files."""
         try:
             # raw audio data
@@ -75,12 +106,12 @@ class WhisperVoiceActivityDetector:
             
             # Resample to 16kHz if needed
             if audio_data.sample_rate != 16000:
-
+                import scipy.signal
                 num_samples = int(len(np_audio) * 16000 / audio_data.sample_rate)
                 np_audio = scipy.signal.resample(np_audio, num_samples)
             
             # Transcribe with Whisper
-            result = self.whisper_model.transcribe(
+            result = self._run_whisper(
                 np_audio,
                 language='en', 
                 task='transcribe',
@@ -91,35 +122,15 @@ class WhisperVoiceActivityDetector:
                 temperature=0.0
             )
             print(f"[DEBUG] Whisper raw result (direct): {result}")
-            text = result.get('text', '').strip()
-            
-            # Filter out very short or nonsensical transcriptions
-            if len(text) < 2:
-                return None
-            
-            # Filter out common Whisper hallucinations/artifacts
-            whisper_artifacts = [
-                'thank you', 'thanks for watching', 'subscribe', 'like and subscribe',
-                'you', 'the', 'a', 'an', 'and', 'or', 'but', 'so', 'if', 'then',
-                'uh', 'um', 'ah', 'eh', 'oh', 'wow', 'yeah', 'yes', 'no', 'okay', 'ok',
-                '.', ',', '!', '?', ' ', ''
-            ]
-            
-            if text.lower().strip() in whisper_artifacts:
-                return None
-            
-            # Additional filtering for very short common words
-            words = text.split()
-            if len(words) == 1 and words[0].lower() in whisper_artifacts:
-                return None
-            
-            return text
+            return filter_transcription(result.get('text', ''))
             
+        except TranscriptionQueueFull:
+            raise
         except Exception as e:
             print(f"Whisper transcription error: {e}")
             return None
     
-    def transcribe_with_whisper_fallback(self, audio_data: sr.AudioData) -> Optional[str]:
+    def transcribe_with_whisper_fallback(self, audio_data: "sr.AudioData") -> Optional[str]:
         """Fallback method using temporary WAV files with proper Windows path handling."""
         temp_file = None
         try:
@@ -139,7 +150,7 @@ class WhisperVoiceActivityDetector:
                 return None
             
             #Transcribe
-            result = self.whisper_model.transcribe(
+            result = self._run_whisper(
                 temp_file,
                 language='en',
                 task='transcribe',
@@ -150,24 +161,10 @@ class WhisperVoiceActivityDetector:
                 temperature=0.0
             )
             print(f"[DEBUG] Whisper raw result (fallback): {result}")
-            # Extract and filter text
-            text = result.get('text', '').strip()
-            
-            if len(text) < 2:
-                return None
-            
-            # Filter artifacts
-            whisper_artifacts = [
-                'thank you', 'thanks for watching', 'subscribe', 'like and subscribe',
-                'you', 'the', 'a', 'an', 'and', 'or', 'but', 'so', 'if', 'then',
-                'uh', 'um', 'ah', 'eh', 'oh', 'wow', 'yeah', 'yes', 'no', 'okay', 'ok'
-            ]
-            
-            if text.lower().strip() in whisper_artifacts:
-                return None
-            
-            return text
+            return filter_transcription(result.get('text', ''))
             
+        except TranscriptionQueueFull:
+            raise
         except Exception as e:
             print(f"Whisper file transcription error: {e}")
             return None
@@ -181,6 +178,7 @@ class WhisperVoiceActivityDetector:
     
     def listen_for_speech_vad(self, timeout: float = 10.0) -> Optional[str]:
         """Listen for speech with voice activity detection using Whisper."""
+        import speech_recognition as sr
         try:
             print(f"\nWaiting for speech... (timeout: {timeout}s)")
             print("Start speaking when ready...")
@@ -213,6 +211,8 @@ class WhisperVoiceActivityDetector:
         except sr.WaitTimeoutError:
             print(f"No speech detected within {timeout} seconds")
             return None
+        except TranscriptionQueueFull:
+            raise
         except Exception as e:
             print(f"Speech recognition error: {e}")
             return None